@@ -1,79 +1,68 @@
 #!/usr/bin/env python3
+"""
+xray-userctl / entry point backend.
+
+CLI sengaja hanya import modul ringan: jika server backend sedang jalan, perintah
+diteruskan lewat socket (state cache server tetap konsisten); xray_backend.core
+baru di-import untuk eksekusi in-process saat server tidak ada.
+"""
 import argparse
 import json
 import os
 import socket
 import sys
-from typing import Dict, Any
+import time
+
+T0 = time.perf_counter()
 
-from xray_backend.core import handle_action
+from xray_backend.constants import ROOT, SOCK_PATH, MAX_REQUEST_BYTES, MAX_BATCH
 
-SOCK_PATH = "/run/xray-backend.sock"
-SOCK_GROUP = "discordbot"
-SOCK_MODE = 0o660
+BATCH_ACTIONS = ("add_many", "del_many", "block_many", "unblock_many")
 
 def die(msg: str, code: int = 1):
     print(msg, file=sys.stderr)
     sys.exit(code)
 
 def ensure_root():
-    if os.geteuid() != 0:
+    # ROOT selain "/" = deployment test/load di mesin biasa, tidak butuh root
+    if os.geteuid() != 0 and str(ROOT) == "/":
         die("Must run as root (backend service).", 2)
 
-def setup_socket():
-    if os.path.exists(SOCK_PATH):
-        os.remove(SOCK_PATH)
-
-    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    s.bind(SOCK_PATH)
-
-    import grp
-    gid = grp.getgrnam(SOCK_GROUP).gr_gid
-    os.chown(SOCK_PATH, 0, gid)
-    os.chmod(SOCK_PATH, SOCK_MODE)
-
-    s.listen(50)
-    return s
-
-def recv_json_line(conn) -> Dict[str, Any]:
-    buf = b""
-    while b"\n" not in buf:
-        chunk = conn.recv(4096)
-        if not chunk:
-            break
-        buf += chunk
-        if len(buf) > 1024 * 1024:
-            raise ValueError("Request too large")
-    line = buf.split(b"\n", 1)[0].decode("utf-8", errors="strict")
-    return json.loads(line)
-
-def send_json(conn, obj: Dict[str, Any]):
-    data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
-    conn.sendall(data)
-
-def serve():
-    ensure_root()
-    s = setup_socket()
+def read_batch_lines(path: str, with_plan: bool):
+    """
+    Baca daftar user untuk add-many/del-many/block-many/unblock-many dari file atau stdin ("-").
+    Format per baris: "protocol username [days quota_gb]" atau objek JSON.
+    Baris kosong dan komentar (#) diabaikan.
+    """
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    users = []
     try:
-        while True:
-            conn, _ = s.accept()
-            try:
-                req = recv_json_line(conn)
-                resp = handle_action(req)
-            except Exception as ex:
-                resp = {"status": "error", "error": str(ex)}
-            try:
-                send_json(conn, resp)
-            finally:
-                conn.close()
+        for lineno, raw in enumerate(f, 1):
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                users.append(json.loads(line))
+                continue
+            parts = line.split()
+            want = 4 if with_plan else 2
+            if len(parts) != want:
+                die(f"line {lineno}: expected {want} fields, got {len(parts)}")
+            u = {"protocol": parts[0], "username": parts[1]}
+            if with_plan:
+                u["days"] = parts[2]
+                u["quota_gb"] = parts[3]
+            users.append(u)
     finally:
-        s.close()
-        if os.path.exists(SOCK_PATH):
-            os.remove(SOCK_PATH)
+        if f is not sys.stdin:
+            f.close()
+    return users
 
 def cli():
     ensure_root()
     p = argparse.ArgumentParser(prog="xray-userctl", add_help=True)
+    p.add_argument("--timing", action="store_true", help="report startup and execution time on stderr")
+    p.add_argument("--local", action="store_true", help="run in-process even if the backend server is running")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     pa = sub.add_parser("add")
@@ -86,18 +75,297 @@ def cli():
     pd.add_argument("protocol", choices=["vless","vmess","trojan","allproto"])
     pd.add_argument("username")
 
+    pam = sub.add_parser("add-many", help="batch add: 'protocol username days quota_gb' per line")
+    pam.add_argument("file", nargs="?", default="-", help="file path, or - for stdin")
+
+    pdm = sub.add_parser("del-many", help="batch delete: 'protocol username' per line")
+    pdm.add_argument("file", nargs="?", default="-", help="file path, or - for stdin")
+
+    pbm = sub.add_parser("block-many", help="batch block: 'protocol username' per line")
+    pbm.add_argument("file", nargs="?", default="-", help="file path, or - for stdin")
+
+    pum = sub.add_parser("unblock-many", help="batch unblock: 'protocol username' per line")
+    pum.add_argument("file", nargs="?", default="-", help="file path, or - for stdin")
+
+    pe = sub.add_parser("enforce", help="block users over quota or past expiry")
+    pe.add_argument("--dry-run", action="store_true", help="only report violators")
+
+    px = sub.add_parser("expire", help="block or delete accounts past expired_at (+ grace)")
+    px.add_argument("--dry-run", action="store_true", help="only report due accounts")
+    px.add_argument("--mode", choices=["block", "delete"], help="default: EXPIRE_MODE (required while it is off)")
+    px.add_argument("--grace-days", type=int, help="default: EXPIRE_GRACE_DAYS")
+
+    sub.add_parser("import-legacy", help="import /opt/quota + detail files into the account store")
+    sub.add_parser("export-legacy", help="rewrite /opt/quota JSON files from the account store")
+
+    sub.add_parser("summary", help="account counts per protocol/status/expiry bucket, total quota and usage")
+
+    sub.add_parser("backups", help="list config.json backup generations")
+    pr = sub.add_parser("rollback", help="restore config.json from a backup generation")
+    pr.add_argument("generation", nargs="?", type=int, default=None, help="default: newest backup")
+
+    px = sub.add_parser("export", help="stream all accounts (quota, expiry, blocked, usage) as JSONL or CSV")
+    px.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    px.add_argument("--protocol", choices=["all", "vless", "vmess", "trojan", "allproto"], default="all")
+    px.add_argument("--expired-from", metavar="YYYY-MM-DD", help="only accounts expiring on/after this date")
+    px.add_argument("--expired-to", metavar="YYYY-MM-DD", help="only accounts expiring on/before this date")
+    px.add_argument("-o", "--output", default="-", help="file path, or - for stdout")
+
+    prg = sub.add_parser("regen-details", help="re-render all account detail files (after domain/IP/port change)")
+    prg.add_argument("--protocol", choices=["all", "vless", "vmess", "trojan", "allproto"], default="all")
+    prg.add_argument("--refresh", action="store_true", help="re-detect public IP and re-read nginx conf first")
+    prg.add_argument("--workers", type=int, help="render threads (default: REGEN_WORKERS)")
+    prg.add_argument("--dry-run", action="store_true", help="only count files that would change")
+    prg.add_argument("--quiet", action="store_true", help="no progress on stderr")
+
     args = p.parse_args()
-    req = {"action": args.cmd, "protocol": args.protocol, "username": args.username}
-    if args.cmd == "add":
-        req["days"] = args.days
-        req["quota_gb"] = args.quota_gb
+    if args.cmd in ("add-many", "del-many", "block-many", "unblock-many"):
+        users = read_batch_lines(args.file, with_plan=(args.cmd == "add-many"))
+        req = {"action": args.cmd.replace("-", "_"), "users": users}
+    elif args.cmd == "enforce":
+        req = {"action": "enforce", "dry_run": args.dry_run}
+    elif args.cmd == "expire":
+        req = {"action": "expire", "dry_run": args.dry_run}
+        if args.mode:
+            req["mode"] = args.mode
+        if args.grace_days is not None:
+            req["grace_days"] = args.grace_days
+    elif args.cmd in ("import-legacy", "export-legacy"):
+        req = {"action": "store_import" if args.cmd == "import-legacy" else "store_export"}
+    elif args.cmd == "summary":
+        req = {"action": "summary"}
+    elif args.cmd == "backups":
+        req = {"action": "config_backups"}
+    elif args.cmd == "rollback":
+        req = {"action": "config_rollback", "generation": args.generation}
+    elif args.cmd == "export":
+        req = {
+            "action": "export",
+            "format": args.format,
+            "protocol": args.protocol,
+            "expired_from": args.expired_from,
+            "expired_to": args.expired_to,
+        }
+    elif args.cmd == "regen-details":
+        req = {"action": "regen_details", "protocol": args.protocol, "refresh": args.refresh, "dry_run": args.dry_run}
+        if args.workers is not None:
+            req["workers"] = args.workers
+    else:
+        req = {"action": args.cmd, "protocol": args.protocol, "username": args.username}
+        if args.cmd == "add":
+            req["days"] = args.days
+            req["quota_gb"] = args.quota_gb
+
+    t_ready = time.perf_counter()
+    if args.cmd == "export":
+        code, via = run_export(req, args.output, args.local)
+        if args.timing:
+            print(f"[timing] via={via} total_ms={(time.perf_counter() - T0) * 1000:.1f}", file=sys.stderr)
+        return code
+    if args.cmd == "regen-details":
+        code, via = run_regen(req, args.local, args.quiet)
+        if args.timing:
+            print(f"[timing] via={via} total_ms={(time.perf_counter() - T0) * 1000:.1f}", file=sys.stderr)
+        return code
+
+    resp, via = None, "local"
+    if not args.local:
+        resp = forward(req)
+        if resp is not None:
+            via = "socket"
+    if resp is None:
+        from xray_backend.core import handle_action
+        t_ready = time.perf_counter()
+        resp = handle_action(req)
+    t_done = time.perf_counter()
 
-    resp = handle_action(req)
     print(json.dumps(resp, ensure_ascii=False, indent=2))
+    if args.timing:
+        print(
+            f"[timing] via={via} startup_ms={(t_ready - T0) * 1000:.1f} exec_ms={(t_done - t_ready) * 1000:.1f}",
+            file=sys.stderr,
+        )
     return 0
 
+def connect_backend():
+    """Socket ke server backend, atau None jika server tidak jalan."""
+    if not os.path.exists(SOCK_PATH):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(1)
+    try:
+        s.connect(SOCK_PATH)
+    except OSError:
+        s.close()
+        return None
+    # server bisa lama (add-many, enforce, export): tunggu response tanpa batas
+    s.settimeout(None)
+    return s
+
+def send_oneshot(s, data: bytes):
+    """Kirim satu baris request di socket one-shot, baca satu response."""
+    with s:
+        s.sendall(data)
+        line = s.makefile("rb").readline()
+    if not line.strip():
+        die("backend closed connection without response")
+    return json.loads(line.decode("utf-8"))
+
+def forward(req):
+    """
+    Kirim request ke server backend (mode one-shot: satu baris JSON, satu response).
+    Return None jika server tidak jalan -> eksekusi in-process.
+
+    Batch (add-many/del-many/...) yang melebihi MAX_REQUEST_BYTES atau MAX_BATCH dipecah
+    menjadi beberapa request dan response-nya digabung; request lain yang terlalu besar
+    ditolak selama server jalan (eksekusi in-process akan melangkahi cache server),
+    kecuali dengan --local.
+    """
+    data = (json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8")
+    users = req.get("users")
+    if req.get("action") in BATCH_ACTIONS and isinstance(users, list) and len(users) > MAX_BATCH:
+        oversized = True
+    else:
+        oversized = len(data) > MAX_REQUEST_BYTES
+    s = connect_backend()
+    if s is None:
+        return None
+    if not oversized:
+        return send_oneshot(s, data)
+    s.close()
+    if req.get("action") not in BATCH_ACTIONS or not isinstance(users, list):
+        die(f"request too large for the backend socket ({len(data)} > {MAX_REQUEST_BYTES} bytes); "
+            "rerun with --local to execute in-process")
+    return forward_batch(req, users)
+
+def batch_chunks(req, users):
+    """Pecah users jadi potongan yang muat di satu request (<= MAX_REQUEST_BYTES, <= MAX_BATCH)."""
+    base = len((json.dumps({**req, "users": []}, ensure_ascii=False) + "\n").encode("utf-8"))
+    chunk, size = [], base
+    for i, u in enumerate(users, 1):
+        n = len(json.dumps(u, ensure_ascii=False).encode("utf-8")) + 2  # ", " pemisah
+        if base + n > MAX_REQUEST_BYTES:
+            die(f"entry {i}: too large for one backend request")
+        if chunk and (size + n > MAX_REQUEST_BYTES or len(chunk) >= MAX_BATCH):
+            yield chunk
+            chunk, size = [], base
+        chunk.append(u)
+        size += n
+    if chunk:
+        yield chunk
+
+def forward_batch(req, users):
+    """
+    Kirim batch per potongan lewat socket dan gabungkan response-nya seperti satu batch:
+    count/ok/failed dijumlah, results disambung berurutan, backup_generation terakhir,
+    applied "restart" jika ada potongan yang restart. Error di level request (bukan per
+    user) menghentikan pengiriman; results potongan sebelumnya tetap dilaporkan.
+    """
+    merged = {"status": "ok", "count": 0, "ok": 0, "failed": 0, "results": [], "backup_generation": None, "applied": None, "chunks": 0}
+    for chunk in batch_chunks(req, users):
+        s = connect_backend()
+        if s is None:
+            die("backend server went away during batch; results so far: "
+                + json.dumps({k: merged[k] for k in ("count", "ok", "failed")}))
+        resp = send_oneshot(s, (json.dumps({**req, "users": chunk}, ensure_ascii=False) + "\n").encode("utf-8"))
+        if "results" not in resp:
+            merged.update(status="error", error=resp.get("error", "batch request failed"))
+            return merged
+        merged["chunks"] += 1
+        for k in ("count", "ok", "failed"):
+            merged[k] += resp.get(k, 0)
+        merged["results"].extend(resp["results"])
+        if resp.get("backup_generation") is not None:
+            merged["backup_generation"] = resp["backup_generation"]
+        if resp.get("applied") and merged["applied"] != "restart":
+            merged["applied"] = resp["applied"]
+        if resp.get("note"):
+            merged["note"] = resp["note"]
+    if not merged["ok"]:
+        merged.update(status="error", error="no user applied")
+    return merged
+
+def forward_stream(req):
+    """Seperti forward(), untuk STREAM_ACTIONS: generator frame sampai koneksi ditutup server."""
+    s = connect_backend()
+    if s is None:
+        return None
+
+    def frames():
+        with s:
+            s.sendall((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+            for line in s.makefile("rb"):
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+
+    return frames()
+
+def run_export(req, output: str, local: bool):
+    """Tulis chunk export ke file/stdout; ringkasan (atau error) ke stderr. Return (exit code, via)."""
+    frames, via = None, "local"
+    if not local:
+        frames = forward_stream(req)
+        if frames is not None:
+            via = "socket"
+    if frames is None:
+        from xray_backend.export import stream_export
+        frames = stream_export(req)
+
+    out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+    try:
+        for frame in frames:
+            if frame.get("status") != "ok":
+                print(json.dumps(frame, ensure_ascii=False), file=sys.stderr)
+                return 1, via
+            if "chunk" in frame:
+                out.write(frame["chunk"])
+            elif frame.get("done"):
+                print(json.dumps({k: v for k, v in frame.items() if k != "done"}, ensure_ascii=False), file=sys.stderr)
+                return 0, via
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    print(json.dumps({"status": "error", "error": "export stream ended early"}), file=sys.stderr)
+    return 1, via
+
+def run_regen(req, local: bool, quiet: bool):
+    """Progress regen_details ke stderr, ringkasan akhir ke stdout. Return (exit code, via)."""
+    frames, via = None, "local"
+    if not local:
+        frames = forward_stream(req)
+        if frames is not None:
+            via = "socket"
+    if frames is None:
+        from xray_backend.regen import stream_regen
+        frames = stream_regen(req)
+
+    for frame in frames:
+        if frame.get("status") != "ok":
+            print(json.dumps(frame, ensure_ascii=False, indent=2))
+            return 1, via
+        if "progress" in frame:
+            if not quiet:
+                pr = frame["progress"]
+                print(
+                    f"[regen] {pr['done']}/{pr['total']} written={pr['written']} "
+                    f"unchanged={pr['unchanged']} skipped={pr.get('skipped', 0)} failed={pr['failed']}",
+                    file=sys.stderr,
+                )
+        elif frame.get("done"):
+            print(json.dumps({k: v for k, v in frame.items() if k != "done"}, ensure_ascii=False, indent=2))
+            return (1 if frame.get("failed") else 0), via
+    print(json.dumps({"status": "error", "error": "regen stream ended early"}, indent=2))
+    return 1, via
+
 if __name__ == "__main__":
-    if len(sys.argv) >= 2 and sys.argv[1] == "--serve":
-        serve()
+    if len(sys.argv) >= 2 and sys.argv[1] in ("--serve", "--serve-sync"):
+        ensure_root()
+        from xray_backend import server
+        if sys.argv[1] == "--serve":
+            server.serve()
+        else:
+            server.serve_sync()
     else:
         sys.exit(cli())
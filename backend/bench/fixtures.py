@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Generator deployment sintetis untuk benchmark.
+
+Dijalankan sebagai proses terpisah dengan XRAY_BACKEND_ROOT=<root>, karena path di
+xray_backend.constants dibaca saat import. Menulis config.json (inbound ws
+vless/vmess/trojan + routing blocked), nginx conf, file quota per akun, lalu
+import ke account store lewat store.import_legacy() (jalur yang sama dengan node asli).
+
+    XRAY_BACKEND_ROOT=/tmp/x python3 bench/fixtures.py 10000 [--seed 1] [--micro]
+
+Output stdout: satu objek JSON (jumlah akun, durasi generate/import, micro timing).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROTOS = ("vless", "vmess", "trojan", "allproto")
+SECRET_FIELD = {"vless": "id", "vmess": "id", "trojan": "password"}
+
+NGINX_CONF = """server {
+    listen 443 ssl http2;
+    server_name bench.example.com;
+}
+"""
+
+
+def _inbound(proto: str, port: int) -> dict:
+    return {
+        "tag": f"{proto}-ws",
+        "listen": "127.0.0.1",
+        "port": port,
+        "protocol": proto,
+        "settings": {"clients": [], "decryption": "none"} if proto == "vless" else {"clients": []},
+        "streamSettings": {"network": "ws", "wsSettings": {"path": f"/{proto}"}},
+    }
+
+
+def generate(n: int, seed: int) -> dict:
+    from xray_backend import constants as C
+
+    rnd = random.Random(seed)
+    today = date.today()
+    inbounds = {p: _inbound(p, 10001 + i) for i, p in enumerate(("vless", "vmess", "trojan"))}
+    blocked = ["dummy-block-user"]
+
+    (C.QUOTA_DIR / "_blocked").mkdir(parents=True, exist_ok=True)
+    for p in PROTOS:
+        (C.QUOTA_DIR / p).mkdir(parents=True, exist_ok=True)
+        C.DETAIL_BASE[p].mkdir(parents=True, exist_ok=True)
+
+    for i in range(n):
+        proto = PROTOS[i % len(PROTOS)]
+        final_u = f"u{i:06d}@{proto}"
+        secret = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+        for p in (("vless", "vmess", "trojan") if proto == "allproto" else (proto,)):
+            inbounds[p]["settings"]["clients"].append({SECRET_FIELD[p]: secret, "email": final_u})
+        # expiry tersebar 0..90 hari: banyak yang hampir habis, tapi belum ada yang lewat
+        # (auto-expiry server tidak boleh mengubah fixture di tengah pengukuran)
+        expired = today + timedelta(days=rnd.randint(0, 90))
+        obj = {
+            "username": final_u,
+            "protocol": proto,
+            "quota_limit": rnd.choice((0, 10, 50, 100)) * 1073741824,
+            "created_at": (expired - timedelta(days=30)).isoformat(),
+            "expired_at": expired.isoformat(),
+        }
+        (C.QUOTA_DIR / proto / f"{final_u}.json").write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
+        if i % 50 == 7:
+            blocked.append(final_u)
+            bobj = {"username": final_u, "protocol": proto, "secret": secret, "blocked_at": f"{today.isoformat()}T00:00:00Z"}
+            (C.QUOTA_DIR / "_blocked" / f"{final_u}.json").write_text(json.dumps(bobj) + "\n", encoding="utf-8")
+
+    cfg = {
+        "log": {"loglevel": "warning"},
+        "inbounds": list(inbounds.values()),
+        "outbounds": [{"protocol": "freedom", "tag": "direct"}, {"protocol": "blackhole", "tag": "blocked"}],
+        "routing": {"rules": [{"type": "field", "outboundTag": "blocked", "user": blocked}]},
+    }
+    C.CONFIG.parent.mkdir(parents=True, exist_ok=True)
+    C.CONFIG.write_text(json.dumps(cfg, indent=2) + "\n", encoding="utf-8")
+    C.NGINX_CONF.parent.mkdir(parents=True, exist_ok=True)
+    C.NGINX_CONF.write_text(NGINX_CONF, encoding="utf-8")
+    return {"accounts": n, "blocked": len(blocked) - 1}
+
+
+def _timeit(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return round(best * 1000, 2)
+
+
+def micro() -> dict:
+    """Timing in-process (tanpa socket) untuk hot path yang tidak punya action sendiri."""
+    from xray_backend.quota import scan_quota_items
+    from xray_backend.registry import AccountRegistry
+    from xray_backend.xray_config import load_config
+    from xray_backend.detail import write_detail_txt
+    from xray_backend.facts import get_facts
+
+    get_facts()
+    cfg = load_config()
+    return {
+        "scan_quota_items_ms": _timeit(lambda: scan_quota_items("all")),
+        "registry_cold_refresh_ms": _timeit(lambda: AccountRegistry().refresh()),
+        "config_parse_ms": _timeit(lambda: json.loads(Path(os.environ["XRAY_BACKEND_ROOT"], "usr/local/etc/xray/config.json").read_text())),
+        "write_detail_txt_ms": _timeit(lambda: write_detail_txt(cfg, "allproto", "u000003@allproto", "x", 30, 10), repeat=20),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("accounts", type=int)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--micro", action="store_true", help="also time scan/registry/detail in-process")
+    args = ap.parse_args()
+    if not os.environ.get("XRAY_BACKEND_ROOT"):
+        print("XRAY_BACKEND_ROOT must point to a scratch directory", file=sys.stderr)
+        return 2
+
+    out = {}
+    t0 = time.perf_counter()
+    out.update(generate(args.accounts, args.seed))
+    out["generate_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    from xray_backend import store
+    t0 = time.perf_counter()
+    out["import"] = store.import_legacy()
+    out["import_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    if args.micro:
+        out["micro"] = micro()
+    print(json.dumps(out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end backend lewat Unix socket asli, di atas deployment sintetis.
+
+Per ukuran (default 1k/10k/50k akun):
+  1. root temp baru + stub systemctl/curl/journalctl di PATH (tidak menyentuh node);
+     --adapters fake memakai adapter in-process (xray_backend/fakes.py) sebagai gantinya
+  2. bench/fixtures.py mengisi config.json, file quota dan account store
+  3. server backend dijalankan sebagai proses terpisah dengan XRAY_BACKEND_ROOT=<root>
+  4. setiap skenario dikirim N kali (koneksi one-shot seperti CLI), latency dicatat
+  5. snapshot action "metrics" server (span per tahap) ikut masuk report
+
+    python3 bench/run.py --sizes 1000,10000 --iterations 30 -o bench_report.json
+    python3 bench/run.py --sizes 1000 --baseline old_report.json
+
+Report JSON bisa dibandingkan antar commit dengan --baseline (rasio p50/p99).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+BACKEND_DIR = HERE.parent
+
+STUBS = {
+    # `systemctl show` -> satu blok per unit; restart memakan BENCH_RESTART_MS (default 0)
+    "systemctl": r"""#!/bin/sh
+case "$1" in
+  show)
+    first=1
+    for a in "$@"; do
+      case "$a" in show|--*|-*) continue;; esac
+      [ $first -eq 1 ] || echo
+      first=0
+      printf 'Id=%s.service\nLoadState=loaded\nActiveState=active\nSubState=running\nMainPID=4242\nActiveEnterTimestampMonotonic=1000000\nMemoryCurrent=41943040\nNRestarts=0\n' "$a"
+    done ;;
+  restart)
+    ms=${BENCH_RESTART_MS:-0}
+    [ "$ms" -gt 0 ] && sleep "$(awk "BEGIN{print $ms/1000}")" ;;
+  is-active) echo active ;;
+esac
+exit 0
+""",
+    "curl": "#!/bin/sh\necho 203.0.113.10\n",
+    "journalctl": r"""#!/bin/sh
+i=0
+while [ $i -lt 30 ]; do
+  printf '{"__CURSOR":"s=bench;i=%d","__REALTIME_TIMESTAMP":"1700000000%06d","MESSAGE":"bench line %d","PRIORITY":"6","SYSLOG_IDENTIFIER":"xray","_PID":"1"}\n' $i $i $i
+  i=$((i+1))
+done
+""",
+}
+
+
+class Client:
+    def __init__(self, sock_path: str):
+        self.sock_path = sock_path
+
+    def call(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(self.sock_path)
+            s.sendall((json.dumps(req) + "\n").encode("utf-8"))
+            f = s.makefile("rb")
+            last = None
+            # stream action: baca sampai frame done / koneksi ditutup
+            for line in f:
+                last = json.loads(line)
+                if req.get("action") != "export" or last.get("done") or last.get("status") != "ok":
+                    break
+            return last or {"status": "error", "error": "no response"}
+
+
+def _stats(samples: List[float], errors: int) -> Dict[str, Any]:
+    xs = sorted(samples)
+
+    def pct(q: float) -> float:
+        return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1000, 3)
+
+    return {
+        "n": len(xs),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(xs) * 1000, 3),
+        "min_ms": round(xs[0] * 1000, 3),
+        "p50_ms": pct(0.5),
+        "p90_ms": pct(0.9),
+        "p99_ms": pct(0.99),
+        "max_ms": round(xs[-1] * 1000, 3),
+    }
+
+
+def scenarios() -> Dict[str, Callable[[int], List[Dict[str, Any]]]]:
+    """
+    Nama skenario -> fungsi(iterasi) yang menghasilkan request berurutan.
+    Waktu yang dicatat = total semua request dalam satu iterasi (mis. add lalu del).
+    """
+    # fixtures.py: akun ke-i memakai PROTOS[i % 4] -> u000003 adalah allproto
+    probe = "u000003"
+    return {
+        "ping": lambda i: [{"action": "ping"}],
+        "status": lambda i: [{"action": "status"}],
+        "list_first_page": lambda i: [{"action": "list", "protocol": "all", "limit": 25}],
+        "list_search": lambda i: [{"action": "list", "protocol": "all", "q": f"u00{i % 10}", "limit": 25}],
+        "list_expiring": lambda i: [{"action": "list", "filter": "expiring", "days": 3, "limit": 25}],
+        "quota_get": lambda i: [{"action": "quota_get", "protocol": "allproto", "username": probe}],
+        "facts": lambda i: [{"action": "facts"}],
+        "summary": lambda i: [{"action": "summary"}],
+        "logs": lambda i: [{"action": "logs", "unit": "xray", "page_size": 25}],
+        "detail": lambda i: [{"action": "detail", "protocol": "allproto", "username": probe}],
+        "render_detail": lambda i: [{"action": "render_detail", "protocol": "allproto", "username": probe}],
+        "add": lambda i: [{"action": "add", "protocol": "vless", "username": f"bench{i}", "days": 30, "quota_gb": 10}],
+        "renew": lambda i: [{"action": "renew", "protocol": "vless", "username": f"bench{i}", "add_days": 1}],
+        "quota_set": lambda i: [{"action": "quota_set", "protocol": "vless", "username": f"bench{i}", "quota_gb": 20}],
+        "block_unblock": lambda i: [
+            {"action": "block", "protocol": "vless", "username": f"bench{i}", "op": "block"},
+            {"action": "block", "protocol": "vless", "username": f"bench{i}", "op": "unblock"},
+        ],
+        "del": lambda i: [{"action": "del", "protocol": "vless", "username": f"bench{i}"}],
+        "add_many_100": lambda i: [{
+            "action": "add_many",
+            "users": [{"protocol": "trojan", "username": f"bm{i}x{j}", "days": 30, "quota_gb": 1} for j in range(100)],
+        }],
+        "del_many_100": lambda i: [{
+            "action": "del_many",
+            "users": [{"protocol": "trojan", "username": f"bm{i}x{j}"} for j in range(100)],
+        }],
+        # fixture: akun trojan (indeks 4k+2) tidak pernah di-block
+        "block_unblock_many_100": lambda i: [
+            {"action": "block_many", "users": [{"protocol": "trojan", "username": f"u{4 * k + 2:06d}"} for k in range(100)]},
+            {"action": "unblock_many", "users": [{"protocol": "trojan", "username": f"u{4 * k + 2:06d}"} for k in range(100)]},
+        ],
+        "enforce_dry_run": lambda i: [{"action": "enforce", "dry_run": True}],
+        "expire_dry_run": lambda i: [{"action": "expire", "dry_run": True}],
+        "export_jsonl": lambda i: [{"action": "export", "format": "jsonl"}],
+    }
+
+
+# skenario berat diulang lebih sedikit
+HEAVY = {"add_many_100": 0.2, "del_many_100": 0.2, "block_unblock_many_100": 0.2, "enforce_dry_run": 0.3, "expire_dry_run": 0.3, "export_jsonl": 0.2}
+
+
+def wait_socket(path: str, proc: subprocess.Popen, timeout: float = 120) -> float:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            if Client(path).call({"action": "ping"}).get("status") == "ok":
+                return time.perf_counter() - t0
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("server did not come up")
+
+
+def run_size(n: int, iterations: int, restart_ms: int, only: Optional[List[str]], keep: bool, adapters: str) -> Dict[str, Any]:
+    root = Path(tempfile.mkdtemp(prefix=f"xray-bench-{n}-"))
+    bindir = root / "bin"
+    bindir.mkdir()
+    for name, body in STUBS.items():
+        p = bindir / name
+        p.write_text(body, encoding="utf-8")
+        p.chmod(0o755)
+    env = dict(os.environ)
+    env.update({
+        "XRAY_BACKEND_ROOT": str(root),
+        "PATH": f"{bindir}:{env.get('PATH', '')}",
+        "BENCH_RESTART_MS": str(restart_ms),
+        "PYTHONPATH": str(BACKEND_DIR),
+    })
+    if adapters == "fake":
+        # adapter in-process (xray_backend/fakes.py): apply lewat API fake, tanpa fork systemctl/curl
+        env.update({
+            "XRAY_BACKEND_SERVICE_ADAPTER": "fake",
+            "XRAY_BACKEND_IP_ADAPTER": "fake",
+            "XRAY_BACKEND_XRAY_API_ADAPTER": "fake",
+            "XRAY_BACKEND_FAKE_RESTART_MS": str(restart_ms),
+        })
+    out: Dict[str, Any] = {"accounts": n, "root": str(root)}
+    server = None
+    try:
+        fx = subprocess.run(
+            [sys.executable, str(HERE / "fixtures.py"), str(n), "--micro"],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        out["fixture"] = json.loads(fx.stdout)
+
+        sock_path = str(root / "run" / "xray-backend.sock")
+        log = open(root / "server.log", "w", encoding="utf-8")
+        server = subprocess.Popen(
+            [sys.executable, "-c", "from xray_backend import server; server.serve()"],
+            env=env, cwd=str(BACKEND_DIR), stdout=subprocess.DEVNULL, stderr=log,
+        )
+        out["server_ready_ms"] = round(wait_socket(sock_path, server) * 1000, 1)
+        client = Client(sock_path)
+        # request pertama membangun registry/cache config; dicatat terpisah dari skenario
+        t0 = time.perf_counter()
+        client.call({"action": "list", "protocol": "all", "limit": 1})
+        out["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        results: Dict[str, Any] = {}
+        for name, make in scenarios().items():
+            if only and name not in only:
+                continue
+            iters = max(3, int(iterations * HEAVY.get(name, 1)))
+            samples, errors, last_err = [], 0, None
+            for i in range(iters):
+                t0 = time.perf_counter()
+                for req in make(i):
+                    resp = client.call(req)
+                    if resp.get("status") != "ok":
+                        errors += 1
+                        last_err = resp.get("error")
+                samples.append(time.perf_counter() - t0)
+            results[name] = _stats(samples, errors)
+            if last_err:
+                results[name]["last_error"] = str(last_err)[:200]
+            print(f"  {n:>6} {name:<18} p50={results[name]['p50_ms']:>9.2f}ms p99={results[name]['p99_ms']:>9.2f}ms", file=sys.stderr)
+        out["actions"] = results
+
+        m = client.call({"action": "metrics"})
+        out["server_stages"] = m.get("stages", {})
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+            log.close()
+            err = (root / "server.log").read_text(encoding="utf-8", errors="replace").strip()
+            if err:
+                out["server_stderr_tail"] = [ln[:300] for ln in err.splitlines()[-5:]]
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return out
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=str(BACKEND_DIR), text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"{'size':>6} {'scenario':<18} {'p50 base':>10} {'p50 new':>10} {'ratio':>6} {'p99 base':>10} {'p99 new':>10} {'ratio':>6}")
+    for size, cur in report["sizes"].items():
+        old = (baseline.get("sizes") or {}).get(size)
+        if not old:
+            continue
+        for name, st in cur.get("actions", {}).items():
+            ob = (old.get("actions") or {}).get(name)
+            if not ob:
+                continue
+            r50 = st["p50_ms"] / ob["p50_ms"] if ob["p50_ms"] else float("nan")
+            r99 = st["p99_ms"] / ob["p99_ms"] if ob["p99_ms"] else float("nan")
+            print(
+                f"{size:>6} {name:<18} {ob['p50_ms']:>10.2f} {st['p50_ms']:>10.2f} {r50:>6.2f} "
+                f"{ob['p99_ms']:>10.2f} {st['p99_ms']:>10.2f} {r99:>6.2f}"
+            )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="xray backend benchmark (synthetic deployments over a real Unix socket)")
+    ap.add_argument("--sizes", default="1000,10000,50000", help="comma-separated account counts")
+    ap.add_argument("--iterations", type=int, default=30, help="iterations per scenario (heavy ones run fewer)")
+    ap.add_argument("--restart-ms", type=int, default=0, help="simulated `systemctl restart xray` duration")
+    ap.add_argument("--only", help="comma-separated scenario names")
+    ap.add_argument(
+        "--adapters", choices=["stub", "fake"], default="stub",
+        help="stub: stub systemctl/curl binaries (restart path); fake: in-process adapters (API path)",
+    )
+    ap.add_argument("--keep", action="store_true", help="keep temp roots for inspection")
+    ap.add_argument("-o", "--output", default="-", help="report path, or - for stdout")
+    ap.add_argument("--baseline", help="previous report to compare against (p50/p99 ratio table on stderr)")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    only = [x.strip() for x in args.only.split(",")] if args.only else None
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "iterations": args.iterations,
+            "restart_ms": args.restart_ms,
+            "adapters": args.adapters,
+        },
+        "sizes": {},
+    }
+    for n in sizes:
+        print(f"[bench] {n} accounts", file=sys.stderr)
+        report["sizes"][str(n)] = run_size(n, args.iterations, args.restart_ms, only, args.keep, args.adapters)
+
+    data = json.dumps(report, indent=2) + "\n"
+    if args.output == "-":
+        sys.stdout.write(data)
+    else:
+        Path(args.output).write_text(data, encoding="utf-8")
+
+    if args.baseline:
+        old = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            compare(report, old)
+        finally:
+            sys.stdout = stdout
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
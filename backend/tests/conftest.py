@@ -0,0 +1,165 @@
+"""
+Fixture test backend: deployment sintetis di root temp + adapter fake (fakes.py).
+
+Path di xray_backend.constants dibaca saat import, jadi env di-set di sini sebelum
+modul backend mana pun di-import. Tiap test mendapat root yang dikosongkan ulang dan
+state modul (cache config, koneksi store, registry, facts, cache detail) yang di-reset.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ROOT = Path(tempfile.mkdtemp(prefix="xray-backend-test-"))
+
+os.environ.update({
+    "XRAY_BACKEND_ROOT": str(ROOT),
+    "XRAY_BACKEND_SETTINGS": str(ROOT / "no-settings.json"),
+    "XRAY_BACKEND_SERVICE_ADAPTER": "fake",
+    "XRAY_BACKEND_IP_ADAPTER": "fake",
+    "XRAY_BACKEND_XRAY_API_ADAPTER": "fake",
+    "XRAY_BACKEND_ENFORCE_INTERVAL": "0",
+    "XRAY_BACKEND_EXPIRE_MODE": "off",
+    "XRAY_BACKEND_CONFIG_WRITE_COALESCE": "0",
+})
+sys.path.insert(0, str(BACKEND_DIR))
+
+import pytest  # noqa: E402
+
+from xray_backend import adapters, constants as C, detail, facts, links, store, system, usage, xray_config  # noqa: E402
+from xray_backend.fakes import FakeIpDiscovery, FakeServiceControl, FakeXrayApi  # noqa: E402
+from xray_backend.registry import REGISTRY  # noqa: E402
+
+NGINX_CONF = """server {
+    listen 443 ssl http2;
+    server_name test.example.com;
+}
+"""
+
+
+def base_config() -> dict:
+    inbounds = []
+    for i, proto in enumerate(("vless", "vmess", "trojan")):
+        inbounds.append({
+            "tag": f"{proto}-ws",
+            "listen": "127.0.0.1",
+            "port": 10001 + i,
+            "protocol": proto,
+            "settings": {"clients": []},
+            "streamSettings": {"network": "ws", "wsSettings": {"path": f"/{proto}"}},
+        })
+    return {
+        "inbounds": inbounds,
+        "outbounds": [{"protocol": "freedom", "tag": "direct"}, {"protocol": "blackhole", "tag": "blocked"}],
+        "routing": {"rules": [{"type": "field", "outboundTag": "blocked", "user": ["dummy-block-user"]}]},
+    }
+
+
+def write_config(cfg: dict) -> None:
+    C.CONFIG.parent.mkdir(parents=True, exist_ok=True)
+    C.CONFIG.write_text(json.dumps(cfg, indent=2) + "\n", encoding="utf-8")
+
+
+def read_config() -> dict:
+    return json.loads(C.CONFIG.read_text(encoding="utf-8"))
+
+
+def write_quota_file(final_u: str, proto: str, expired_at: str, quota_limit: int = 0, created_at: str = "") -> None:
+    obj = {
+        "username": final_u,
+        "protocol": proto,
+        "quota_limit": quota_limit,
+        "created_at": created_at or date.today().isoformat(),
+        "expired_at": expired_at,
+    }
+    d = C.QUOTA_DIR / proto
+    d.mkdir(parents=True, exist_ok=True)
+    (d / f"{final_u}.json").write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
+
+
+def days_from_today(n: int) -> str:
+    return (date.today() + timedelta(days=n)).isoformat()
+
+
+def _reset_state() -> None:
+    conn = getattr(store._local, "conn", None)
+    if conn is not None:
+        conn.close()
+    store._local = threading.local()
+    store._initialized = False
+
+    with xray_config._lock:
+        timer = xray_config._pending["timer"]
+        if timer is not None:
+            timer.cancel()
+        xray_config._pending.update({"data": None, "gen": None, "timer": None, "inflight": None})
+        xray_config._state.update({"sig": None, "cfg": None, "index": None, "dirty": False})
+        xray_config._foreign["entry"] = None
+        xray_config._snap.update({"key": None, "entry": None})
+    xray_config.set_write_coalesce(0)
+
+    REGISTRY.__init__()
+    facts._nginx.update({"sig": None, "domain": "unknown", "public_port": 443})
+    facts._ip.update({"value": None, "fetched_at": 0.0})
+    system.invalidate_units()
+    detail._cache.clear()
+    usage._unsaved.clear()
+    links._cache["tpl"] = None
+
+
+class Deployment:
+    """Handle test ke deployment sintetis + adapter fake yang terpasang."""
+
+    def __init__(self):
+        self.root = ROOT
+        self.service = FakeServiceControl(restart_ms=0)
+        self.ip = FakeIpDiscovery()
+        self.api = FakeXrayApi()
+        adapters.set_adapters(service=self.service, ip=self.ip, xray_api=self.api)
+
+    def call(self, action: str, **req):
+        from xray_backend.core import handle_action
+        return handle_action({"action": action, **req})
+
+    def config(self) -> dict:
+        return read_config()
+
+    def blocked_rule_users(self) -> list:
+        return read_config()["routing"]["rules"][0]["user"]
+
+    def client_emails(self, proto: str) -> list:
+        for ib in read_config()["inbounds"]:
+            if ib["protocol"] == proto:
+                return [c["email"] for c in ib["settings"]["clients"]]
+        return []
+
+
+@pytest.fixture
+def deploy():
+    _reset_state()
+    for p in ROOT.iterdir():
+        if p.is_dir():
+            shutil.rmtree(p)
+        else:
+            p.unlink()
+    for proto in ("vless", "vmess", "trojan", "allproto"):
+        (C.QUOTA_DIR / proto).mkdir(parents=True, exist_ok=True)
+    write_config(base_config())
+    C.NGINX_CONF.parent.mkdir(parents=True, exist_ok=True)
+    C.NGINX_CONF.write_text(NGINX_CONF, encoding="utf-8")
+    d = Deployment()
+    try:
+        yield d
+    finally:
+        xray_config.flush_config()
+        adapters.reset_adapters()
+        _reset_state()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(ROOT, ignore_errors=True)
@@ -0,0 +1,112 @@
+from conftest import base_config, write_config
+from xray_backend import store
+from xray_backend.xray_config import list_backups
+
+
+def _plan(proto, username, days=30, quota_gb=5):
+    return {"protocol": proto, "username": username, "days": days, "quota_gb": quota_gb}
+
+
+def test_add_many_partial_failure(deploy):
+    assert deploy.call("add", protocol="vless", username="taken", days=30, quota_gb=1)["status"] == "ok"
+    deploy.api.calls.clear()
+    backups = len(list_backups())
+
+    resp = deploy.call("add_many", users=[
+        _plan("vless", "a1"),
+        _plan("nope", "a2"),
+        _plan("vmess", "bad name"),
+        _plan("vless", "taken"),
+        _plan("trojan", "a3", days=0),
+        _plan("allproto", "a4"),
+        _plan("allproto", "a4"),
+        "not an object",
+    ])
+
+    assert resp["status"] == "ok"
+    assert (resp["count"], resp["ok"], resp["failed"]) == (8, 2, 6)
+    assert [r["status"] for r in resp["results"]] == ["ok", "error", "error", "error", "error", "ok", "error", "error"]
+    assert [r.get("error") for r in resp["results"] if r["status"] == "error"] == [
+        "invalid protocol", "invalid username", "duplicate email", "days out of range (1..3650)",
+        "duplicate email", "entry must be an object",
+    ]
+    # satu save + satu apply untuk seluruh batch
+    assert len(list_backups()) == backups + 1
+    assert deploy.api.calls == ["adu"]
+    assert resp["applied"] == "api"
+
+    assert deploy.client_emails("vless") == ["taken@vless", "a1@vless", "a4@allproto"]
+    assert deploy.client_emails("trojan") == ["a4@allproto"]
+    assert set(store.get_many(["a1@vless", "a4@allproto", "a3@trojan"])) == {"a1@vless", "a4@allproto"}
+    ok = [r for r in resp["results"] if r["status"] == "ok"]
+    assert all(r["uuid"] and r["expired_at"] for r in ok)
+    assert store.get("a1@vless")["secret"] == ok[0]["uuid"]
+
+
+def test_add_many_allproto_missing_inbound_rolls_back(deploy):
+    cfg = base_config()
+    cfg["inbounds"] = [ib for ib in cfg["inbounds"] if ib["protocol"] != "trojan"]
+    write_config(cfg)
+
+    resp = deploy.call("add_many", users=[_plan("allproto", "x1"), _plan("vless", "x2")])
+
+    assert (resp["ok"], resp["failed"]) == (1, 1)
+    assert resp["results"][0]["error"] == "missing inbound for one of vless/vmess/trojan"
+    # client allproto yang sempat ditambah ke vless/vmess dibuang lagi
+    assert deploy.client_emails("vless") == ["x2@vless"]
+    assert deploy.client_emails("vmess") == []
+    assert store.get("x1@allproto") is None
+
+
+def test_add_many_all_invalid_writes_nothing(deploy):
+    before = deploy.config()
+    resp = deploy.call("add_many", users=[_plan("nope", "z"), _plan("vless", "z", quota_gb=-1)])
+
+    assert resp["status"] == "error" and resp["error"] == "no user applied"
+    assert resp["ok"] == 0 and resp["failed"] == 2
+    assert deploy.config() == before
+    assert list_backups() == []
+    assert deploy.api.calls == []
+
+
+def test_add_many_rejects_bad_batch(deploy):
+    assert deploy.call("add_many", users=[])["error"] == "users must be a non-empty list"
+    assert deploy.call("del_many", users="x")["error"] == "users must be a non-empty list"
+
+
+def test_del_many_partial_failure(deploy):
+    deploy.call("add_many", users=[_plan("vless", "d1"), _plan("trojan", "d2"), _plan("allproto", "d3")])
+    assert deploy.call("block", protocol="trojan", username="d2", op="block")["status"] == "ok"
+    assert "d2@trojan" in deploy.blocked_rule_users()
+    deploy.api.calls.clear()
+    backups = len(list_backups())
+
+    resp = deploy.call("del_many", users=[
+        {"protocol": "vless", "username": "d1"},
+        {"protocol": "vless", "username": "ghost"},
+        {"protocol": "trojan", "username": "d2"},
+        {"protocol": "vmess", "username": "d3"},  # protocol salah: user allproto tidak tersentuh
+        {"protocol": "allproto", "username": "d3"},
+    ])
+
+    assert (resp["ok"], resp["failed"]) == (3, 2)
+    assert [r.get("error") for r in resp["results"]] == [None, "user not found", None, "user not found", None]
+    assert resp["results"][4]["removed"] == 3
+    assert len(list_backups()) == backups + 1
+    # rmu per tag + satu push routing karena d2 keluar dari rule blocked
+    assert sorted(deploy.api.calls) == ["adrules", "rmu", "rmu", "rmu"]
+    assert deploy.blocked_rule_users() == ["dummy-block-user"]
+    assert deploy.client_emails("vless") == deploy.client_emails("vmess") == deploy.client_emails("trojan") == []
+    assert store.count() == 0
+    assert store.summary()["total"] == 0
+
+
+def test_del_many_without_blocked_users_skips_routing(deploy):
+    deploy.call("add_many", users=[_plan("vless", "e1"), _plan("vless", "e2")])
+    deploy.api.calls.clear()
+
+    resp = deploy.call("del_many", users=[{"protocol": "vless", "username": "e1"}])
+
+    assert resp["ok"] == 1
+    assert deploy.api.calls == ["rmu"]
+    assert deploy.client_emails("vless") == ["e2@vless"]
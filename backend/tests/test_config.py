@@ -0,0 +1,203 @@
+import threading
+import time
+
+import pytest
+
+from conftest import base_config, read_config, write_config
+from xray_backend import xray_config
+from xray_backend.xray_config import (
+    append_client,
+    config_snapshot,
+    email_exists,
+    find_secret,
+    list_backups,
+    load_config,
+    read_backup,
+    save_config_with_backup,
+    set_write_coalesce,
+)
+
+
+def _emails(cfg, proto="vless"):
+    ib = next(ib for ib in cfg["inbounds"] if ib["protocol"] == proto)
+    return [c["email"] for c in ib["settings"]["clients"]]
+
+
+def test_snapshot_isolated_from_writer(deploy):
+    cfg = load_config()
+    snap = config_snapshot()
+    assert snap is not cfg and snap == cfg
+    assert config_snapshot() is snap
+
+    # mutasi writer yang belum disimpan tidak terlihat di snapshot
+    append_client(cfg, "vless", "w@vless", "sec-w")
+    assert _emails(snap) == [] and not email_exists(snap, "w@vless")
+    assert config_snapshot() is snap
+
+    save_config_with_backup(cfg)
+    snap2 = config_snapshot()
+    assert snap2 is not cfg and _emails(snap2) == ["w@vless"]
+    assert find_secret(snap2, "vless", "w@vless") == "sec-w"
+    assert _emails(snap) == []
+
+
+def test_snapshot_follows_pending_save_and_flush(deploy):
+    set_write_coalesce(60)
+    cfg = load_config()
+    append_client(cfg, "trojan", "t@trojan", "sec-t")
+    save_config_with_backup(cfg)
+
+    # save masih tertunda: snapshot dari data save, bukan dari disk
+    snap = config_snapshot()
+    assert _emails(snap, "trojan") == ["t@trojan"]
+    assert _emails(read_config(), "trojan") == []
+
+    xray_config.flush_config()
+    assert _emails(read_config(), "trojan") == ["t@trojan"]
+    assert config_snapshot() is snap
+
+    # edit dari luar backend: snapshot (dan load_config) membaca ulang
+    ext = base_config()
+    ext["inbounds"][1]["settings"]["clients"].append({"id": "sec-x", "email": "x@vmess"})
+    write_config(ext)
+    assert _emails(config_snapshot(), "vmess") == ["x@vmess"]
+    assert _emails(load_config(), "vmess") == ["x@vmess"]
+
+
+def test_readers_never_see_writer_mutations(deploy):
+    set_write_coalesce(0.02)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                snap = config_snapshot()
+                emails = _emails(snap)
+                # satu snapshot konsisten: list client == index, tidak berubah selama dibaca
+                assert all(email_exists(snap, e) for e in emails)
+                assert _emails(snap) == emails
+            except Exception as ex:  # pragma: no cover - dilaporkan lewat assert di bawah
+                errors.append(repr(ex))
+                return
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(150):
+            resp = deploy.call("add", protocol="vless", username=f"r{i}", days=30, quota_gb=0)
+            assert resp["status"] == "ok"
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert errors == []
+    xray_config.flush_config()
+    assert len(_emails(config_snapshot())) == 150
+
+
+# --- save tergabung (coalesce), ring backup, rollback ---
+
+def test_coalesced_saves_share_one_backup(deploy):
+    set_write_coalesce(60)
+    original = read_config()
+    gens = [deploy.call("add", protocol="vless", username=f"c{i}", days=30, quota_gb=0)["backup_generation"] for i in range(3)]
+
+    assert gens == [1, 1, 1]
+    # belum ada yang ditulis: disk = state sebelum jendela, generasi belum punya file
+    assert read_config() == original
+    assert list_backups() == []
+
+    xray_config.flush_config()
+    assert _emails(read_config()) == ["c0@vless", "c1@vless", "c2@vless"]
+    assert [b["generation"] for b in list_backups()] == [1]
+    assert read_backup(1) == (1, original)
+
+    # jendela berikutnya memakai generasi baru
+    assert deploy.call("del", protocol="vless", username="c0")["backup_generation"] == 2
+
+
+def test_coalesce_timer_flushes(deploy):
+    set_write_coalesce(0.05)
+    gen = deploy.call("add", protocol="trojan", username="tm", days=30, quota_gb=0)["backup_generation"]
+    # backup ditulis sebelum config.json: tunggu config.json, bukan list_backups()
+    deadline = time.monotonic() + 5
+    while _emails(read_config(), "trojan") != ["tm@trojan"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _emails(read_config(), "trojan") == ["tm@trojan"]
+    assert [b["generation"] for b in list_backups()] == [gen]
+
+
+def test_save_during_flush_gets_new_generation(deploy, monkeypatch):
+    set_write_coalesce(60)
+    original = read_config()
+    writing, release = threading.Event(), threading.Event()
+    real_write = xray_config.atomic_write
+
+    def slow_write(path, data, *args):
+        if path == xray_config.CONFIG and not release.is_set():
+            writing.set()
+            release.wait(5)
+        return real_write(path, data, *args)
+
+    monkeypatch.setattr(xray_config, "atomic_write", slow_write)
+
+    cfg = load_config()
+    cfg["marker"] = 1
+    g1 = save_config_with_backup(cfg)
+    flusher = threading.Thread(target=xray_config.flush_config)
+    flusher.start()
+    assert writing.wait(5)
+
+    # flush save 1 sedang menulis config.json: save 2 membuka generasi baru
+    cfg = load_config()
+    assert cfg["marker"] == 1
+    cfg["marker"] = 2
+    g2 = save_config_with_backup(cfg)
+    assert g2 == g1 + 1
+    assert load_config()["marker"] == 2 and config_snapshot()["marker"] == 2
+
+    release.set()
+    flusher.join(5)
+    assert read_config()["marker"] == 1
+    xray_config.flush_config()
+
+    assert read_config()["marker"] == 2
+    assert read_backup(g1) == (g1, original)
+    assert read_backup(g2)[1]["marker"] == 1
+    assert [b["generation"] for b in list_backups()] == [g2, g1]
+
+
+def test_backup_ring_keeps_newest(deploy, monkeypatch):
+    monkeypatch.setattr(xray_config, "CONFIG_BACKUP_KEEP", 3)
+    cfg = load_config()
+    for i in range(5):
+        append_client(cfg, "vmess", f"k{i}@vmess", f"sec-{i}")
+        assert save_config_with_backup(cfg) == i + 1
+
+    assert [b["generation"] for b in list_backups()] == [5, 4, 3]
+    # backup generasi N = config sebelum save ke-N
+    assert _emails(read_backup()[1], "vmess") == ["k0@vmess", "k1@vmess", "k2@vmess", "k3@vmess"]
+    with pytest.raises(FileNotFoundError):
+        read_backup(1)
+
+
+def test_rollback_restores_backup(deploy):
+    deploy.call("add", protocol="vless", username="rb1", days=30, quota_gb=0)
+    before_second = read_config()
+    gen = deploy.call("add", protocol="vless", username="rb2", days=30, quota_gb=0)["backup_generation"]
+
+    resp = deploy.call("config_rollback", generation=gen)
+
+    assert resp["status"] == "ok" and resp["generation"] == gen
+    assert resp["backup_generation"] == gen + 1
+    assert read_config() == before_second
+    assert _emails(config_snapshot()) == ["rb1@vless"]
+    # rollback sendiri bisa di-rollback: backup terbaru = state sebelum rollback
+    assert _emails(read_backup()[1]) == ["rb1@vless", "rb2@vless"]
+    assert deploy.service.calls == ["restart xray"]
+
+    assert deploy.call("config_rollback", generation=999)["error"] == "config backup 999 not found"
+    assert deploy.call("config_rollback", generation="x")["status"] == "error"
+    assert [b["generation"] for b in deploy.call("config_backups")["backups"]] == [gen + 1, gen, 1]
@@ -0,0 +1,58 @@
+import pytest
+
+from xray_backend import store
+
+
+def _render(deploy, fmt="text"):
+    resp = deploy.call("render_detail", protocol="vless", username="reuse", format=fmt)
+    assert resp["status"] == "ok", resp
+    return resp
+
+
+def test_recreated_account_does_not_hit_old_cache(deploy):
+    first = deploy.call("add", protocol="vless", username="reuse", days=30, quota_gb=1)
+    old = _render(deploy)
+    old_links = _render(deploy, "links")
+    assert f"UUID/Pass  : {first['uuid']}" in old["detail_text"]
+    assert deploy.call("del", protocol="vless", username="reuse")["status"] == "ok"
+
+    # nama + plan sama: version akun baru mulai lagi dari 1, tapi secret baru
+    second = deploy.call("add", protocol="vless", username="reuse", days=30, quota_gb=1)
+    assert second["uuid"] != first["uuid"]
+    assert store.get("reuse@vless")["version"] == old["version"]
+
+    new = _render(deploy)
+    assert f"UUID/Pass  : {second['uuid']}" in new["detail_text"]
+    assert first["uuid"] not in new["detail_text"]
+    assert all(second["uuid"] in link["url"] for link in _render(deploy, "links")["links"])
+    assert all(first["uuid"] in link["url"] for link in old_links["links"])
+
+
+def test_render_detail_cached_per_version(deploy):
+    deploy.call("add", protocol="trojan", username="cache", days=10, quota_gb=2)
+    a = deploy.call("render_detail", protocol="trojan", username="cache")
+    b = deploy.call("render_detail", protocol="trojan", username="cache")
+    assert a["detail_text"] is b["detail_text"]
+
+    deploy.call("quota_set", protocol="trojan", username="cache", quota_gb=5)
+    c = deploy.call("render_detail", protocol="trojan", username="cache")
+    assert c["version"] > a["version"]
+    assert "QuotaLimit : 5 GB" in c["detail_text"]
+
+
+def test_write_detail_file_is_atomic(deploy, monkeypatch):
+    from xray_backend import constants as C, io_utils
+    from xray_backend.detail import write_detail_file
+
+    path = write_detail_file("vless", "w@vless", "old\n")
+
+    def crash(src, dst):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(io_utils.os, "replace", crash)
+    with pytest.raises(OSError):
+        write_detail_file("vless", "w@vless", "new\n" * 1000)
+    monkeypatch.undo()
+
+    assert open(path, encoding="utf-8").read() == "old\n"
+    assert [p.name for p in C.DETAIL_BASE["vless"].iterdir()] == ["w@vless.txt"]
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import days_from_today, write_quota_file
+from xray_backend import store
+from xray_backend.registry import REGISTRY
+
+GB = 1073741824
+
+
+def _seed(deploy, proto: str, name: str, expiry_days: int, quota_limit: int, used: int) -> str:
+    """Buat akun lewat action add, lalu set expiry, quota dan usage-nya di store."""
+    assert deploy.call("add", protocol=proto, username=name, days=30, quota_gb=1)["status"] == "ok"
+    final_u = f"{name}@{proto}"
+    exp = days_from_today(expiry_days)
+    write_quota_file(final_u, proto, exp, quota_limit=quota_limit)
+    store.upsert(final_u, expired_at=exp, quota_limit=quota_limit)
+    if used:
+        store.add_usage({final_u: (used // 2, used - used // 2)})
+    REGISTRY.invalidate(proto)
+    return final_u
+
+
+@pytest.fixture
+def accounts(deploy):
+    return {
+        "over": _seed(deploy, "vless", "over", 10, GB, GB + 5),
+        "exact": _seed(deploy, "vmess", "exact", 10, GB, GB),
+        "expired": _seed(deploy, "trojan", "expired", -1, GB, 10),
+        "both": _seed(deploy, "vless", "both", -3, GB, 2 * GB),
+        "ok": _seed(deploy, "trojan", "ok", 10, GB, GB - 1),
+        "unlimited": _seed(deploy, "allproto", "unlimited", 10, 0, 5 * GB),
+    }
+
+
+def _by_user(resp):
+    return {v["username"]: v for v in resp["users"]}
+
+
+def test_enforce_dry_run_reports_without_blocking(deploy, accounts):
+    before = deploy.config()
+    deploy.api.calls.clear()
+
+    resp = deploy.call("enforce", dry_run=True)
+
+    assert (resp["status"], resp["dry_run"], resp["scanned"]) == ("ok", True, 6)
+    assert (resp["violators"], resp["blocked"], resp["already_blocked"]) == (4, 0, 0)
+    users = _by_user(resp)
+    assert set(users) == {accounts["over"], accounts["exact"], accounts["expired"], accounts["both"]}
+    assert users[accounts["over"]]["reasons"] == ["quota"]
+    assert users[accounts["over"]]["used"] == GB + 5
+    assert users[accounts["expired"]]["reasons"] == ["expired"]
+    assert users[accounts["both"]]["reasons"] == ["quota", "expired"]
+    assert not any(v.get("blocked") for v in resp["users"])
+
+    assert deploy.config() == before
+    assert store.blocked_usernames() == set()
+    assert deploy.api.calls == []
+    assert "backup_generation" not in resp
+
+
+def test_enforce_blocks_violators_in_one_transaction(deploy, accounts):
+    deploy.api.calls.clear()
+
+    resp = deploy.call("enforce")
+
+    violators = {accounts["over"], accounts["exact"], accounts["expired"], accounts["both"]}
+    assert (resp["dry_run"], resp["violators"], resp["blocked"]) == (False, 4, 4)
+    assert all(v["blocked"] for v in resp["users"])
+    assert resp["backup_generation"] is not None
+    assert set(deploy.blocked_rule_users()) == violators | {"dummy-block-user"}
+    assert store.blocked_usernames() == violators
+    assert deploy.api.calls == ["adrules"]
+
+    again = deploy.call("enforce")
+    assert (again["violators"], again["already_blocked"], again["blocked"]) == (0, 4, 0)
+    assert deploy.api.calls == ["adrules"]
+
+
+def test_enforce_nothing_to_do(deploy):
+    _seed(deploy, "vless", "fine", 10, GB, 0)
+    resp = deploy.call("enforce")
+    assert (resp["scanned"], resp["violators"], resp["blocked"], resp["users"]) == (1, 0, 0, [])
+    assert deploy.blocked_rule_users() == ["dummy-block-user"]
@@ -0,0 +1,139 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from conftest import days_from_today, write_quota_file
+from xray_backend import constants as C, server, store
+from xray_backend.registry import REGISTRY
+
+
+def _midnight_after(iso: str, days: int = 1) -> float:
+    return datetime.combine(date.fromisoformat(iso) + timedelta(days=days), datetime.min.time()).timestamp()
+
+
+def _add_with_expiry(deploy, proto: str, name: str, days: int) -> str:
+    """Buat akun lewat action add, lalu geser expired_at-nya (bisa ke masa lalu)."""
+    assert deploy.call("add", protocol=proto, username=name, days=30, quota_gb=1)["status"] == "ok"
+    final_u = f"{name}@{proto}"
+    exp = days_from_today(days)
+    write_quota_file(final_u, proto, exp, quota_limit=1073741824)
+    store.upsert(final_u, expired_at=exp)
+    REGISTRY.invalidate(proto)
+    return final_u
+
+
+@pytest.fixture
+def accounts(deploy):
+    return {
+        "old": _add_with_expiry(deploy, "vless", "old", -2),
+        "yday": _add_with_expiry(deploy, "trojan", "yday", -1),
+        "today": _add_with_expiry(deploy, "vmess", "today", 0),
+        "later": _add_with_expiry(deploy, "allproto", "later", 5),
+    }
+
+
+def test_expire_block_mode(deploy, accounts):
+    deploy.api.calls.clear()
+    resp = deploy.call("expire", mode="block")
+
+    assert (resp["status"], resp["mode"], resp["due"], resp["blocked"], resp["deleted"]) == ("ok", "block", 2, 2, 0)
+    assert resp["cutoff"] == date.today().isoformat()
+    assert [v["username"] for v in resp["users"]] == [accounts["old"], accounts["yday"]]
+    assert deploy.blocked_rule_users() == ["dummy-block-user", accounts["old"], accounts["yday"]]
+    assert store.blocked_usernames() == {accounts["old"], accounts["yday"]}
+    assert deploy.api.calls == ["adrules"]
+    # akun yang habis hari ini masih aktif sampai tengah malam
+    assert resp["next_at"] == _midnight_after(days_from_today(0))
+
+    again = deploy.call("expire", mode="block")
+    assert (again["due"], again["already_blocked"], again["blocked"]) == (0, 2, 0)
+    assert deploy.api.calls == ["adrules"]
+
+
+def test_expire_grace_days(deploy, accounts):
+    resp = deploy.call("expire", mode="block", grace_days=1)
+
+    assert resp["cutoff"] == days_from_today(-1)
+    assert [v["username"] for v in resp["users"]] == [accounts["old"]]
+    # berikutnya: "yday" jatuh tempo setelah expired_at + 1 hari grace
+    assert resp["next_at"] == _midnight_after(days_from_today(-1), 2)
+
+
+def test_expire_delete_dry_run_then_delete(deploy, accounts):
+    before = deploy.config()
+    dry = deploy.call("expire", mode="delete", dry_run=True)
+    assert (dry["due"], dry["deleted"], dry["dry_run"]) == (2, 0, True)
+    assert deploy.config() == before
+    assert store.get(accounts["old"]) is not None
+
+    resp = deploy.call("expire", mode="delete")
+
+    assert (resp["due"], resp["deleted"], resp["blocked"]) == (2, 2, 0)
+    assert all(v.get("deleted") for v in resp["users"])
+    assert resp["backup_generation"] is not None
+    assert deploy.client_emails("vless") == [accounts["later"]]
+    assert deploy.client_emails("trojan") == [accounts["later"]]
+    assert store.get(accounts["old"]) is None and store.get(accounts["yday"]) is None
+    assert not (C.QUOTA_DIR / "vless" / f"{accounts['old']}.json").exists()
+    assert resp["next_at"] == _midnight_after(days_from_today(0))
+
+
+def test_expire_nothing_left(deploy):
+    resp = deploy.call("expire", mode="block")
+    assert (resp["due"], resp["next_at"]) == (0, None)
+
+
+def test_expire_rejects_bad_params(deploy):
+    assert deploy.call("expire", mode="purge")["error"] == "mode must be block or delete"
+    # EXPIRE_MODE default "off": expire manual wajib menyebut mode
+    assert deploy.call("expire")["error"] == "mode required (EXPIRE_MODE is off)"
+    assert deploy.call("expire", mode="block", grace_days="x")["error"] == "grace_days must be integer"
+    assert deploy.call("expire", mode="block", grace_days=-1)["error"] == "grace_days out of range (0..3650)"
+
+
+# --- expire_loop: delay tidur dihitung dari next_at ---
+
+class FakeDispatcher:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def dispatch(self, req):
+        self.requests.append(req)
+        return self.responses.pop(0)
+
+
+def _run_loop(monkeypatch, responses):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == len(responses):
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(server.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(server.time, "time", lambda: 1_000_000.0)
+    dispatcher = FakeDispatcher(responses)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(server.expire_loop(dispatcher))
+    assert dispatcher.requests == [{"action": "expire"}] * len(responses)
+    return sleeps
+
+
+def test_expire_loop_sleeps_until_next_boundary(monkeypatch, capsys):
+    monkeypatch.setattr(server, "EXPIRE_RECHECK", 3600)
+    ok = {"status": "ok", "mode": "block", "blocked": 0, "deleted": 0, "elapsed_ms": 1, "users": []}
+    sleeps = _run_loop(monkeypatch, [
+        {**ok, "next_at": None},
+        {**ok, "next_at": 1_000_000.0 + 100},
+        {**ok, "next_at": 1_000_000.0 + 86400},
+        {**ok, "next_at": 1_000_000.0 - 50},
+        {"status": "error", "error": "boom"},
+        {**ok, "blocked": 1, "users": [{"username": "x@vless", "blocked": True}], "next_at": None},
+    ])
+
+    assert sleeps == [3600, 101.0, 3600, 1.0, 3600, 3600]
+    err = capsys.readouterr().err
+    assert "[expire] boom" in err
+    assert "[expire] mode=block blocked=1 deleted=0" in err and "x@vless" in err
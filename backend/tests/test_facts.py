@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from conftest import NGINX_CONF
+from xray_backend import constants as C, facts
+from xray_backend.facts import get_facts
+
+
+@pytest.fixture
+def nginx_reads(deploy, monkeypatch):
+    """Hitung berapa kali nginx conf benar-benar di-parse."""
+    reads = []
+    real = facts.parse_domain
+
+    def parse_domain(txt):
+        reads.append(1)
+        return real(txt)
+
+    monkeypatch.setattr(facts, "parse_domain", parse_domain)
+    return reads
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_cache_hit_does_not_refetch(deploy, nginx_reads):
+    first = get_facts()
+    assert (first["domain"], first["public_ip"], first["public_port"]) == ("test.example.com", "203.0.113.1", 443)
+
+    for _ in range(3):
+        assert get_facts()["public_ip"] == "203.0.113.1"
+    assert deploy.ip.calls == 1
+    assert len(nginx_reads) == 1
+
+
+def test_nginx_change_reparsed(deploy, nginx_reads):
+    get_facts()
+    C.NGINX_CONF.write_text(NGINX_CONF.replace("test.example.com", "new.example.org").replace("443", "8443"), encoding="utf-8")
+
+    f = get_facts()
+
+    assert (f["domain"], f["public_port"]) == ("new.example.org", 8443)
+    assert len(nginx_reads) == 2
+    assert deploy.ip.calls == 1
+
+
+def test_missing_nginx_conf_defaults(deploy):
+    C.NGINX_CONF.unlink()
+    f = get_facts()
+    assert (f["domain"], f["public_port"]) == ("unknown", 443)
+
+
+def test_expired_ip_refreshed_in_background(deploy, monkeypatch):
+    get_facts()
+    deploy.ip.ip = "198.51.100.7"
+    monkeypatch.setattr(facts, "FACTS_IP_TTL", 0)
+
+    # nilai lama tetap dipakai; refresh jalan di thread background
+    assert get_facts()["public_ip"] == "203.0.113.1"
+    assert _wait_for(lambda: facts._ip["value"] == "198.51.100.7")
+    assert _wait_for(lambda: not facts._refreshing.is_set())
+    monkeypatch.setattr(facts, "FACTS_IP_TTL", 3600)
+    assert get_facts()["public_ip"] == "198.51.100.7"
+    assert deploy.ip.calls >= 2
+
+
+def test_refresh_refetches_and_rereads(deploy, nginx_reads):
+    get_facts()
+    deploy.ip.ip = "198.51.100.8"
+
+    f = get_facts(refresh=True)
+
+    assert f["public_ip"] == "198.51.100.8" and f["ip_age_s"] == 0
+    assert deploy.ip.calls == 2
+    assert len(nginx_reads) == 2
+
+
+def test_failed_lookup_keeps_last_ip(deploy):
+    get_facts()
+    deploy.ip.ip = "unknown"
+    assert get_facts(refresh=True)["public_ip"] == "203.0.113.1"
+
+    # cache kosong: "unknown" tetap disimpan sampai lookup berhasil
+    facts._ip.update({"value": None, "fetched_at": 0.0})
+    assert get_facts()["public_ip"] == "unknown"
@@ -0,0 +1,194 @@
+"""
+Paging journal lewat journalctl stub: FakeJournal meniru -n, -r, --after-cursor dan -p
+di atas daftar entry in-memory dan mengeluarkan JSON per baris seperti `-o json`.
+"""
+import json
+import subprocess
+
+import pytest
+
+from xray_backend import journal
+from xray_backend.journal import journal_page, parse_priority
+
+
+class FakeJournal:
+    def __init__(self, n: int = 0):
+        self.entries = []
+        self.calls = []
+        self.add(n)
+
+    def add(self, n: int, priority: int = 6) -> None:
+        for _ in range(n):
+            i = len(self.entries)
+            self.entries.append({
+                "__CURSOR": f"s=1;i={i}",
+                "__REALTIME_TIMESTAMP": str(1_700_000_000_000_000 + i * 1_000_000),
+                "MESSAGE": f"m{i}",
+                "PRIORITY": str(priority),
+                "SYSLOG_IDENTIFIER": "xray",
+                "_PID": "42",
+            })
+
+    def __call__(self, cmd, **kwargs):
+        assert cmd[:3] == ["journalctl", "-u", "xray"]
+        args = cmd[3:]
+        self.calls.append(args)
+        opts, reverse, i = {}, False, 0
+        while i < len(args):
+            if args[i] == "-r":
+                reverse = True
+            elif args[i] in ("-n", "-p", "--after-cursor"):
+                opts[args[i]] = args[i + 1]
+                i += 1
+            i += 1
+
+        rows = self.entries
+        if "-p" in opts:
+            level = journal.PRIORITIES.index(opts["-p"])
+            rows = [e for e in rows if int(e["PRIORITY"]) <= level]
+        n = int(opts["-n"])
+        cursor = opts.get("--after-cursor")
+        if cursor is None:
+            rows = rows[-n:]
+            if reverse:
+                rows = rows[::-1]
+        else:
+            pos = [k for k, e in enumerate(rows) if e["__CURSOR"] == cursor]
+            if not pos:
+                raise subprocess.CalledProcessError(1, cmd, "", "Failed to seek to cursor: Invalid argument")
+            rows = rows[:pos[0]][::-1][:n] if reverse else rows[pos[0] + 1:][:n]
+        return "".join(json.dumps(e) + "\n" for e in rows)
+
+
+@pytest.fixture
+def jrnl(monkeypatch):
+    fake = FakeJournal(12)
+    monkeypatch.setattr(journal.subprocess, "check_output", fake)
+    return fake
+
+
+def _msgs(resp):
+    return [e["message"] for e in resp["entries"]]
+
+
+def _page(direction="latest", cursor="", page_size=5, priority=None):
+    return journal_page("xray", direction, cursor, page_size, priority)
+
+
+def test_latest_page(jrnl):
+    resp = _page()
+
+    assert resp["status"] == "ok" and resp["count"] == 5
+    assert _msgs(resp) == ["m7", "m8", "m9", "m10", "m11"]
+    assert (resp["first_cursor"], resp["last_cursor"]) == ("s=1;i=7", "s=1;i=11")
+    assert (resp["has_older"], resp["has_newer"]) == (True, False)
+    assert "new_count" not in resp
+    assert resp["entries"][0]["ident"] == "xray[42]" and resp["entries"][0]["priority"] == 6
+    assert resp["text"].splitlines()[0].endswith(" xray[42]: m7")
+    # hanya page_size + 1 entry yang dibaca
+    assert jrnl.calls[-1][-2:] == ["-n", "6"]
+
+
+def test_older_pages_walk_back_to_start(jrnl):
+    first = _page()["first_cursor"]
+
+    resp = _page("older", first)
+    assert _msgs(resp) == ["m2", "m3", "m4", "m5", "m6"]
+    assert (resp["has_older"], resp["has_newer"]) == (True, True)
+    assert jrnl.calls[-1][-5:] == ["--after-cursor", first, "-r", "-n", "6"]
+
+    # halaman paling awal: sisa < page_size, tidak ada yang lebih lama
+    resp = _page("older", resp["first_cursor"])
+    assert _msgs(resp) == ["m0", "m1"]
+    assert (resp["has_older"], resp["has_newer"]) == (False, True)
+
+    resp = _page("older", resp["first_cursor"])
+    assert resp["count"] == 0 and resp["first_cursor"] is None
+    assert resp["has_older"] is False
+
+
+def test_older_page_exactly_page_size_left(jrnl):
+    resp = _page("older", "s=1;i=5")
+    assert _msgs(resp) == ["m0", "m1", "m2", "m3", "m4"]
+    assert resp["has_older"] is False
+
+
+def test_newer_pages(jrnl):
+    resp = _page("newer", "s=1;i=1")
+    assert _msgs(resp) == ["m2", "m3", "m4", "m5", "m6"]
+    assert (resp["has_older"], resp["has_newer"]) == (True, True)
+
+    # tepat page_size entry tersisa: tidak ada yang lebih baru lagi
+    resp = _page("newer", resp["last_cursor"])
+    assert _msgs(resp) == ["m7", "m8", "m9", "m10", "m11"]
+    assert resp["has_newer"] is False
+
+
+def test_newer_at_end_falls_back_to_latest(jrnl):
+    resp = _page("newer", "s=1;i=11")
+
+    assert _msgs(resp) == ["m7", "m8", "m9", "m10", "m11"]
+    assert (resp["has_older"], resp["has_newer"]) == (True, False)
+    assert jrnl.calls[-1][-2:] == ["-n", "6"]
+
+
+def test_tail_new_count(jrnl):
+    last = _page("tail")["last_cursor"]
+    assert _page("tail")["new_count"] == 5
+    assert _page("tail", last)["new_count"] == 0
+
+    jrnl.add(2)
+    resp = _page("tail", last)
+    assert _msgs(resp) == ["m9", "m10", "m11", "m12", "m13"]
+    assert resp["new_count"] == 2 and resp["has_newer"] is False
+
+    # cursor sudah keluar dari halaman terbaru: semua entry dihitung baru
+    jrnl.add(6)
+    assert _page("tail", last)["new_count"] == 5
+
+
+def test_priority_filter(jrnl):
+    jrnl.add(2, priority=3)
+
+    resp = _page(priority="err")
+
+    assert _msgs(resp) == ["m12", "m13"]
+    assert resp["has_older"] is False and resp["priority"] == "err"
+    assert jrnl.calls[-1][jrnl.calls[-1].index("-p") + 1] == "err"
+
+
+def test_page_size_clamped(jrnl):
+    assert _page(page_size=1)["page_size"] == journal.PAGE_SIZE_MIN
+    assert _page(page_size=1000)["page_size"] == journal.PAGE_SIZE_MAX
+    assert _page(page_size=1000)["count"] == 12
+
+
+def test_cursor_validation(jrnl):
+    assert _page("sideways")["status"] == "error"
+    assert _page("older")["error"] == "cursor required for direction=older"
+    assert _page("newer")["error"] == "cursor required for direction=newer"
+    assert _page("older", "s=1\ni=2")["error"] == "invalid cursor"
+    assert _page("older", "x" * (journal.MAX_CURSOR_LEN + 1))["error"] == "invalid cursor"
+    assert jrnl.calls == []
+
+
+def test_unknown_cursor_reports_journalctl_error(jrnl):
+    resp = _page("older", "s=9;i=999")
+    assert resp["status"] == "error"
+    assert resp["error"] == "journalctl failed: Failed to seek to cursor: Invalid argument"
+
+
+def test_journalctl_missing(monkeypatch):
+    def missing(cmd, **kwargs):
+        raise FileNotFoundError(cmd[0])
+
+    monkeypatch.setattr(journal.subprocess, "check_output", missing)
+    assert _page()["error"] == "journalctl not found"
+
+
+def test_parse_priority():
+    assert parse_priority(None) is None and parse_priority("all") is None
+    assert parse_priority("3") == "err" and parse_priority("error") == "err"
+    assert parse_priority("WARNING") == "warning"
+    with pytest.raises(ValueError):
+        parse_priority("8")
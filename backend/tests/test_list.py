@@ -0,0 +1,120 @@
+import base64
+import os
+
+import pytest
+
+from conftest import days_from_today, write_quota_file
+from xray_backend import constants as C
+from xray_backend.registry import REGISTRY, decode_cursor, encode_cursor
+
+PROTOS = ("vless", "vmess", "trojan")
+
+
+@pytest.fixture
+def accounts(deploy):
+    """13 akun, expired_at kembar per tiga: urutan ditentukan (expired_at, username)."""
+    names = []
+    for i in range(13):
+        proto = PROTOS[i % 3]
+        final_u = f"u{i:02d}@{proto}"
+        write_quota_file(final_u, proto, days_from_today(10 + i // 3))
+        names.append(final_u)
+    REGISTRY.invalidate()
+    return names
+
+
+def _list(deploy, **req):
+    resp = deploy.call("list", **req)
+    assert resp["status"] == "ok", resp
+    return resp
+
+
+def _names(resp):
+    return [it["username"] for it in resp["items"]]
+
+
+def test_next_cursor_walks_all_pages(deploy, accounts):
+    seen, cursor, pages = [], None, 0
+    while True:
+        resp = _list(deploy, limit=5, cursor=cursor)
+        seen += _names(resp)
+        pages += 1
+        if not resp["has_more"]:
+            assert resp["next_cursor"] is None
+            break
+        cursor = resp["next_cursor"]
+        # cursor menunjuk ke item terakhir halaman, termasuk saat expired_at kembar
+        assert decode_cursor(cursor)[1] == resp["items"][-1]["username"]
+    assert pages == 3
+    assert seen == accounts
+
+
+def test_prev_cursor_walks_back(deploy, accounts):
+    first = _list(deploy, limit=5)
+    assert first["prev_cursor"] is None and first["start_cursor"] is None
+    second = _list(deploy, limit=5, cursor=first["next_cursor"])
+    last = _list(deploy, limit=5, cursor=second["next_cursor"])
+    assert _names(last) == accounts[10:] and not last["has_more"]
+
+    back = _list(deploy, limit=5, before=last["prev_cursor"])
+    assert _names(back) == _names(second) and back["has_more"]
+    back = _list(deploy, limit=5, before=back["prev_cursor"])
+    assert _names(back) == _names(first) and back["prev_cursor"] is None
+
+
+def test_before_near_start_stops_at_key(deploy, accounts):
+    # kurang dari satu halaman di depan key: hanya item sebelum key, tanpa key itu sendiri
+    resp = _list(deploy, limit=5, before=encode_cursor((days_from_today(11), accounts[3])))
+    assert _names(resp) == accounts[:3]
+    assert resp["offset"] == 0 and resp["has_more"]
+
+    resp = _list(deploy, limit=5, before=encode_cursor((days_from_today(10), accounts[0])))
+    assert _names(resp) == [] and resp["has_more"]
+
+
+def test_start_cursor_reloads_same_page(deploy, accounts):
+    first = _list(deploy, limit=4)
+    second = _list(deploy, limit=4, cursor=first["next_cursor"])
+    assert second["start_cursor"] == first["next_cursor"]
+    again = _list(deploy, limit=4, cursor=second["start_cursor"])
+    assert _names(again) == _names(second) == accounts[4:8]
+
+
+def test_cursor_survives_changes_around_it(deploy, accounts):
+    first = _list(deploy, limit=5)
+    cursor = first["next_cursor"]
+    assert decode_cursor(cursor)[1] == accounts[4]
+
+    # hapus akun di cursor + sisipkan akun sebelum cursor: halaman berikut tidak bergeser
+    os.remove(C.QUOTA_DIR / PROTOS[4 % 3] / f"{accounts[4]}.json")
+    write_quota_file("a00@vless", "vless", days_from_today(10))
+    REGISTRY.invalidate()
+
+    resp = _list(deploy, limit=5, cursor=cursor)
+    assert _names(resp) == accounts[5:10]
+    assert resp["total"] == 13
+
+
+def test_cursor_at_end_and_offset_past_end(deploy, accounts):
+    resp = _list(deploy, limit=5, cursor=encode_cursor((days_from_today(14), accounts[-1])))
+    assert resp["items"] == [] and not resp["has_more"] and resp["next_cursor"] is None
+    resp = _list(deploy, limit=5, offset=100)
+    assert resp["items"] == [] and resp["offset"] == 13 and resp["prev_cursor"] is None
+
+
+def test_cursor_with_protocol_and_query(deploy, accounts):
+    trojan = [u for u in accounts if u.endswith("@trojan")]
+    first = _list(deploy, protocol="trojan", limit=2)
+    rest = _list(deploy, protocol="trojan", limit=2, cursor=first["next_cursor"])
+    assert _names(first) + _names(rest) == trojan[:4]
+
+    first = _list(deploy, q="u1", match="prefix", limit=2)
+    rest = _list(deploy, q="u1", match="prefix", limit=2, cursor=first["next_cursor"])
+    assert _names(first) + _names(rest) == accounts[10:13]
+    assert not rest["has_more"]
+
+
+def test_invalid_cursor(deploy, accounts):
+    assert deploy.call("list", cursor="!!!not-base64")["error"] == "invalid cursor"
+    # base64 valid tapi tanpa pemisah "|"
+    assert deploy.call("list", before=base64.urlsafe_b64encode(b"no-separator").decode())["error"] == "invalid cursor"
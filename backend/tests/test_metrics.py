@@ -0,0 +1,126 @@
+import re
+
+import pytest
+
+from xray_backend import metrics
+from xray_backend.metrics import BUCKETS, Histogram, observe_action, observe_stage, render_prometheus, snapshot, timed
+
+SAMPLE_RE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,le="[^"]+")?\})? -?[0-9.e+]+$')
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "_actions", {})
+    monkeypatch.setattr(metrics, "_stages", {})
+
+
+def _hist(*values):
+    h = Histogram()
+    for v in values:
+        h.observe(v)
+    return h
+
+
+def test_bucket_counts_upper_bound_inclusive():
+    h = _hist(0.001, 0.0011, 0.0005, 30.0, 31.0)
+
+    assert h.counts[BUCKETS.index(0.001)] == 2  # 0.0005 dan 0.001 (le inklusif)
+    assert h.counts[BUCKETS.index(0.0025)] == 1
+    assert h.counts[BUCKETS.index(30.0)] == 1
+    assert h.counts[-1] == 1  # +Inf
+    assert (h.count, h.max) == (5, 31.0)
+    assert h.sum == pytest.approx(61.0026)
+
+
+def test_quantile_interpolates_within_bucket():
+    h = _hist(*([0.0005] * 5 + [0.02] * 5))
+
+    assert h.quantile(0.5) == pytest.approx(0.001)
+    assert h.quantile(0.6) == pytest.approx(0.013)
+    # tidak pernah melewati nilai maksimum yang teramati
+    assert h.quantile(0.99) == pytest.approx(0.02)
+    assert Histogram().quantile(0.5) is None
+
+
+def test_quantile_in_inf_bucket_uses_max():
+    h = _hist(40.0, 50.0)
+    assert h.quantile(1.0) == 50.0
+    assert BUCKETS[-1] <= h.quantile(0.5) <= 50.0
+
+
+def test_timed_counts_errors_and_snapshot():
+    @timed("boom")
+    def boom(fail):
+        if fail:
+            raise ValueError("x")
+        return 1
+
+    assert boom(False) == 1
+    with pytest.raises(ValueError):
+        boom(True)
+    observe_action("add", 0.004, True)
+
+    snap = snapshot()
+    assert snap["stages"]["boom"]["count"] == 2 and snap["stages"]["boom"]["errors"] == 1
+    add = snap["actions"]["add"]
+    assert (add["count"], add["errors"], add["avg_ms"], add["max_ms"]) == (1, 0, 4.0, 4.0)
+    assert add["p50_ms"] is not None
+
+
+def test_render_prometheus_format():
+    observe_action("add", 0.0005, True)
+    observe_action("add", 0.02, False)
+    observe_action("list", 40.0, True)
+    observe_stage("config_save", 0.001)
+
+    text = render_prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+
+    # setiap metric: HELP lalu TYPE sebelum sampelnya
+    for name, kind in (
+        ("xray_backend_uptime_seconds", "gauge"),
+        ("xray_backend_requests_total", "counter"),
+        ("xray_backend_request_errors_total", "counter"),
+        ("xray_backend_request_duration_seconds", "histogram"),
+        ("xray_backend_stage_errors_total", "counter"),
+        ("xray_backend_stage_duration_seconds", "histogram"),
+    ):
+        i = lines.index(f"# TYPE {name} {kind}")
+        assert lines[i - 1].startswith(f"# HELP {name} ")
+        assert lines[i + 1].startswith(name)
+    for line in lines:
+        assert line.startswith("# ") or SAMPLE_RE.match(line), line
+
+    assert 'xray_backend_requests_total{action="add"} 2' in lines
+    assert 'xray_backend_requests_total{action="list"} 1' in lines
+    assert 'xray_backend_request_errors_total{action="add"} 1' in lines
+    assert 'xray_backend_request_errors_total{action="list"} 0' in lines
+
+    m = "xray_backend_request_duration_seconds"
+    assert f'{m}_bucket{{action="add",le="0.001"}} 1' in lines
+    assert f'{m}_bucket{{action="add",le="0.01"}} 1' in lines
+    assert f'{m}_bucket{{action="add",le="0.025"}} 2' in lines
+    assert f'{m}_bucket{{action="add",le="+Inf"}} 2' in lines
+    assert f'{m}_sum{{action="add"}} 0.020500' in lines
+    assert f'{m}_count{{action="add"}} 2' in lines
+    assert f'{m}_bucket{{action="list",le="30.0"}} 0' in lines
+    assert f'{m}_bucket{{action="list",le="+Inf"}} 1' in lines
+
+    # bucket kumulatif: satu baris per batas + +Inf, tidak pernah turun
+    add_buckets = [int(l.rsplit(" ", 1)[1]) for l in lines if l.startswith(f'{m}_bucket{{action="add"')]
+    assert len(add_buckets) == len(BUCKETS) + 1
+    assert add_buckets == sorted(add_buckets)
+
+    s = "xray_backend_stage_duration_seconds"
+    assert f'{s}_bucket{{stage="config_save",le="0.001"}} 1' in lines
+    assert f'{s}_count{{stage="config_save"}} 1' in lines
+    assert 'xray_backend_stage_errors_total{stage="config_save"} 0' in lines
+
+
+def test_write_textfile(tmp_path):
+    observe_action("ping", 0.0001, True)
+    path = tmp_path / "xray_backend.prom"
+    metrics.write_textfile(str(path))
+    assert 'xray_backend_requests_total{action="ping"} 1' in path.read_text(encoding="utf-8")
+    assert not (tmp_path / "xray_backend.prom.tmp").exists()
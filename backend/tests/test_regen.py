@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from xray_backend import constants as C, regen, store
+from xray_backend.detail import detail_lock, detail_locks
+from xray_backend.regen import stream_regen
+
+
+@pytest.fixture
+def users(deploy, monkeypatch):
+    monkeypatch.setattr(regen, "REGEN_BATCH", 1)
+    for name in ("a", "b", "c"):
+        assert deploy.call("add", protocol="vless", username=name, days=30, quota_gb=1)["status"] == "ok"
+    return [f"{n}@vless" for n in ("a", "b", "c")]
+
+
+def _txt(final_u):
+    return C.DETAIL_BASE["vless"] / f"{final_u}.txt"
+
+
+def test_regen_pages_all_accounts(users):
+    frames = list(stream_regen({"protocol": "vless"}))
+
+    assert [f["progress"]["done"] for f in frames[:-1]] == [1, 2, 3]
+    assert frames[-1]["done"] and frames[-1]["written"] == 3
+    assert all(_txt(u).exists() for u in users)
+
+
+def test_regen_waits_only_for_locked_account(users):
+    done = threading.Event()
+
+    def run():
+        list(stream_regen({"protocol": "vless"}))
+        done.set()
+
+    # writer sedang memegang lock akun "b": akun lain tetap di-regen
+    with detail_lock("b@vless"):
+        t = threading.Thread(target=run)
+        t.start()
+        assert not done.wait(0.2)
+        assert _txt("a@vless").exists()
+        assert not _txt("b@vless").exists()
+    t.join(5)
+    assert done.is_set() and all(_txt(u).exists() for u in users)
+
+
+def test_account_deleted_while_regen_waits(deploy, users):
+    result = {}
+
+    def run():
+        result["frames"] = list(stream_regen({"protocol": "vless"}))
+
+    # del memegang lock akun; regen menunggu lalu melihat akun sudah hilang
+    with detail_lock("b@vless"):
+        t = threading.Thread(target=run)
+        t.start()
+        time.sleep(0.1)
+        store.delete("b@vless")
+    t.join(5)
+
+    last = result["frames"][-1]
+    assert (last["written"], last["skipped"], last["failed"]) == (2, 1, 0)
+    assert not _txt("b@vless").exists()
+
+
+def test_detail_locks_many(users):
+    with detail_locks(["a@vless", "b@vless", "a@vless"]):
+        assert detail_lock("a@vless").locked() and detail_lock("b@vless").locked()
+    assert not detail_lock("a@vless").locked()
+
+
+def test_regen_sees_writes_between_batches(deploy, users):
+    frames = stream_regen({"protocol": "vless"})
+    assert next(frames)["progress"]["written"] == 1
+
+    # writer jalan di antara batch: batch berikutnya membaca baris terbaru
+    assert deploy.call("del", protocol="vless", username="b")["status"] == "ok"
+    assert deploy.call("quota_set", protocol="vless", username="c", quota_gb=7)["status"] == "ok"
+    rest = list(frames)
+
+    assert (rest[-1]["written"], rest[-1]["skipped"], rest[-1]["failed"]) == (2, 0, 0)
+    assert not _txt("b@vless").exists()
+    assert "QuotaLimit : 7 GB" in _txt("c@vless").read_text(encoding="utf-8")
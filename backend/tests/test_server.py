@@ -0,0 +1,277 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import BACKEND_DIR, ROOT
+from xray_backend import constants as C, server
+
+
+def _start_server(flag: str) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "backend.py"), flag],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    # file socket muncul saat bind, sebelum listen: tunggu sampai connect berhasil
+    deadline = time.monotonic() + 10
+    while True:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(C.SOCK_PATH)
+                break
+            except OSError:
+                pass
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError(f"server did not start: {proc.stderr.read().decode()}")
+        time.sleep(0.02)
+    return proc
+
+
+@pytest.fixture
+def sync_server(deploy):
+    proc = _start_server("--serve-sync")
+    try:
+        yield proc
+    finally:
+        proc.kill()
+        proc.wait()
+        if os.path.exists(C.SOCK_PATH):
+            os.remove(C.SOCK_PATH)
+
+
+def _oneshot(req: dict) -> list:
+    """Kirim satu request one-shot, baca semua frame sampai server menutup koneksi."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(10)
+        s.connect(C.SOCK_PATH)
+        s.sendall((json.dumps(req) + "\n").encode("utf-8"))
+        return [json.loads(line) for line in s.makefile("rb") if line.strip()]
+
+
+def test_sync_server_streams_export(deploy, sync_server):
+    # akun dibuat setelah server jalan: lewat socket, seperti CLI
+    for name in ("alice", "bob", "carol"):
+        (resp,) = _oneshot({"action": "add", "protocol": "vless", "username": name, "days": 30, "quota_gb": 1})
+        assert resp["status"] == "ok", resp
+
+    frames = _oneshot({"action": "export", "format": "jsonl"})
+    assert frames[-1]["status"] == "ok" and frames[-1]["done"] and frames[-1]["count"] == 3
+    rows = [json.loads(line) for f in frames[:-1] for line in f["chunk"].splitlines()]
+    assert sorted(r["username"] for r in rows) == ["alice@vless", "bob@vless", "carol@vless"]
+
+
+def test_sync_server_streams_regen_progress(deploy, sync_server):
+    (resp,) = _oneshot({"action": "add", "protocol": "trojan", "username": "dave", "days": 30, "quota_gb": 0})
+    assert resp["status"] == "ok"
+
+    frames = _oneshot({"action": "regen_details", "protocol": "all"})
+    assert [f for f in frames if "progress" in f], frames
+    assert frames[-1]["done"] and frames[-1]["written"] == 1
+    assert (C.DETAIL_BASE["trojan"] / "dave@trojan.txt").exists()
+
+
+def test_sync_server_stream_error_and_bad_request(deploy, sync_server):
+    (err,) = _oneshot({"action": "export", "protocol": "nope"})
+    assert err == {"status": "error", "error": "invalid protocol"}
+    (err,) = _oneshot([1, 2])
+    assert err["status"] == "error"
+    (ok,) = _oneshot({"action": "ping"})
+    assert ok == {"status": "ok"}
+
+
+# --- Dispatcher: reader pool vs writer queue (in-process, handle_action diganti) ---
+
+class Recorder:
+    """handle_action palsu: catat thread + concurrency per jenis action."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.active = {"read": 0, "write": 0}
+        self.peak = {"read": 0, "write": 0}
+
+    def __call__(self, req):
+        kind = "read" if req["action"] in C.READ_ACTIONS else "write"
+        with self.lock:
+            self.threads.setdefault(req["action"], set()).add(threading.current_thread().name)
+            self.active[kind] += 1
+            self.peak[kind] = max(self.peak[kind], self.active[kind])
+        try:
+            time.sleep(self.delay)
+            return {"status": "ok", "action": req["action"], "n": req.get("n")}
+        finally:
+            with self.lock:
+                self.active[kind] -= 1
+
+
+async def _with_server(path, fn):
+    dispatcher = server.Dispatcher()
+    writer_task = asyncio.create_task(dispatcher.run_writer())
+    srv = await asyncio.start_unix_server(lambda r, w: server.handle_conn(dispatcher, r, w), path=path)
+    try:
+        return await fn()
+    finally:
+        srv.close()
+        await srv.wait_closed()
+        writer_task.cancel()
+        dispatcher.shutdown()
+
+
+async def _oneshot_async(path, req):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write((json.dumps(req) + "\n").encode("utf-8"))
+    await writer.drain()
+    line = await reader.readline()
+    writer.close()
+    return json.loads(line)
+
+
+def test_dispatcher_reads_parallel_writes_serialized(monkeypatch):
+    rec = Recorder()
+    monkeypatch.setattr(server, "handle_action", rec)
+    path = str(ROOT / "dispatch.sock")
+
+    async def scenario():
+        reqs = [{"action": "list", "n": i} for i in range(6)] + [{"action": "add", "n": i} for i in range(4)]
+        return await asyncio.gather(*(_oneshot_async(path, r) for r in reqs))
+
+    resps = asyncio.run(_with_server(path, scenario))
+    assert [r["n"] for r in resps] == [0, 1, 2, 3, 4, 5, 0, 1, 2, 3]
+    assert all(t.startswith("backend-read") for t in rec.threads["list"])
+    assert rec.threads["add"] == {"backend-write_0"}
+    assert rec.peak["read"] > 1
+    assert rec.peak["write"] == 1
+
+
+# --- koneksi multiplexed (request dengan "id") ---
+
+async def _mux(path, lines, expect):
+    """Kirim semua baris di satu koneksi, kumpulkan `expect` response (urutan kedatangan)."""
+    reader, writer = await asyncio.open_unix_connection(path)
+    for line in lines:
+        writer.write((line if isinstance(line, str) else json.dumps(line)).encode("utf-8") + b"\n")
+    await writer.drain()
+    out = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(expect)]
+    writer.close()
+    return out
+
+
+def test_mux_responses_out_of_order_with_ids(monkeypatch):
+    rec = Recorder(delay=0.2)
+    fast = {"ping"}
+    monkeypatch.setattr(server, "handle_action", lambda req: {"status": "ok", "action": req["action"]} if req["action"] in fast else rec(req))
+    path = str(ROOT / "mux.sock")
+
+    async def scenario():
+        return await _mux(path, [{"id": "w1", "action": "add"}, {"id": 7, "action": "ping"}, {"id": "w2", "action": "del"}], 3)
+
+    resps = asyncio.run(_with_server(path, scenario))
+    # ping tidak menunggu writer; dua write tetap berurutan
+    assert [r["id"] for r in resps] == [7, "w1", "w2"]
+    assert [r["action"] for r in resps] == ["ping", "add", "del"]
+    assert rec.peak["write"] == 1
+
+
+def test_mux_invalid_line_keeps_connection(monkeypatch):
+    monkeypatch.setattr(server, "handle_action", lambda req: {"status": "ok", "n": req.get("n")})
+    path = str(ROOT / "mux-bad.sock")
+
+    async def scenario():
+        return await _mux(path, [{"id": 1, "action": "ping", "n": 1}, "not json", {"action": "ping"}, {"id": 2, "action": "ping", "n": 2}], 4)
+
+    resps = asyncio.run(_with_server(path, scenario))
+    errors = [r for r in resps if r["status"] == "error"]
+    assert len(errors) == 2 and all(r["id"] is None for r in errors)
+    assert sorted(r["n"] for r in resps if r["status"] == "ok") == [1, 2]
+    assert {r["id"] for r in resps if r["status"] == "ok"} == {1, 2}
+
+
+def test_mux_stream_frames_carry_id(monkeypatch):
+    def fake_stream(req):
+        for i in range(3):
+            yield {"status": "ok", "chunk": f"{i}\n"}
+        yield {"status": "ok", "done": True, "count": 3}
+
+    monkeypatch.setitem(server.STREAMERS, "export", fake_stream)
+    monkeypatch.setattr(server, "handle_action", lambda req: {"status": "ok"})
+    path = str(ROOT / "mux-stream.sock")
+
+    async def scenario():
+        return await _mux(path, [{"id": "e", "action": "export"}, {"id": "p", "action": "ping"}], 5)
+
+    resps = asyncio.run(_with_server(path, scenario))
+    stream = [r for r in resps if r["id"] == "e"]
+    assert [r.get("chunk") for r in stream[:3]] == ["0\n", "1\n", "2\n"]
+    assert stream[-1]["done"] and stream[-1]["count"] == 3
+    assert [r for r in resps if r["id"] == "p"] == [{"status": "ok", "id": "p"}]
+
+
+# --- CLI forward: batch besar dipecah, request besar lain ditolak ---
+
+def _load_cli():
+    spec = importlib.util.spec_from_file_location("backend_cli", BACKEND_DIR / "backend.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_cli_forward_chunks_large_batch(deploy, sync_server, monkeypatch):
+    cli = _load_cli()
+    monkeypatch.setattr(cli, "MAX_REQUEST_BYTES", 400)
+    users = [{"protocol": "vless", "username": f"bulk{i:02d}", "days": 30, "quota_gb": 1} for i in range(12)]
+    users[5]["protocol"] = "nope"
+    users[9]["username"] = "bulk00"  # duplikat lintas potongan: ditolak oleh potongan berikutnya
+    req = {"action": "add_many", "users": users}
+    chunks = list(cli.batch_chunks(req, users))
+    assert len(chunks) > 1 and sum(len(c) for c in chunks) == 12
+    assert all(len(json.dumps({**req, "users": c}).encode()) + 1 <= 400 for c in chunks)
+
+    resp = cli.forward(req)
+
+    assert resp["chunks"] == len(chunks)
+    assert (resp["status"], resp["count"], resp["ok"], resp["failed"]) == ("ok", 12, 10, 2)
+    assert [r["status"] for r in resp["results"]].count("error") == 2
+    assert resp["results"][5]["error"] == "invalid protocol"
+    assert resp["results"][9]["error"] == "duplicate email"
+    assert resp["backup_generation"] == len(chunks)
+    (listing,) = _oneshot({"action": "list", "protocol": "vless"})
+    assert listing["total"] == 10
+
+
+def test_cli_forward_batch_over_max_batch(deploy, sync_server, monkeypatch):
+    cli = _load_cli()
+    monkeypatch.setattr(cli, "MAX_BATCH", 2)
+    users = [{"protocol": "trojan", "username": f"t{i}", "days": 30, "quota_gb": 0} for i in range(5)]
+    resp = cli.forward({"action": "add_many", "users": users})
+    assert (resp["chunks"], resp["ok"], resp["failed"]) == (3, 5, 0)
+
+    resp = cli.forward({"action": "del_many", "users": [{"protocol": "trojan", "username": f"t{i}"} for i in range(5)]})
+    assert (resp["chunks"], resp["ok"]) == (3, 5)
+
+
+def test_cli_forward_refuses_oversized_request(deploy, sync_server, monkeypatch, capsys):
+    cli = _load_cli()
+    monkeypatch.setattr(cli, "MAX_REQUEST_BYTES", 64)
+    with pytest.raises(SystemExit):
+        cli.forward({"action": "list", "protocol": "vless", "search": "x" * 100})
+    assert "--local" in capsys.readouterr().err
+    # satu entry batch yang sendirian melebihi batas juga ditolak, bukan dijalankan in-process
+    with pytest.raises(SystemExit):
+        cli.forward({"action": "del_many", "users": [{"protocol": "vless", "username": "y" * 100}]})
+    assert "entry 1" in capsys.readouterr().err
+
+
+def test_cli_forward_without_server_runs_local(deploy, monkeypatch):
+    cli = _load_cli()
+    monkeypatch.setattr(cli, "MAX_REQUEST_BYTES", 64)
+    assert cli.forward({"action": "list", "search": "x" * 100}) is None
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+
+from xray_backend import constants as C
+
+
+@pytest.mark.parametrize("raw,default,expected", [
+    # string dari env
+    ("30", 60, 30),
+    ("0.25", 0.5, 0.25),
+    ("yes", False, True),
+    ("off", True, False),
+    ("", None, None),
+    ("/srv/xray", None, "/srv/xray"),
+    # nilai dari file settings JSON: dikonversi sama seperti env
+    ("30", 0.5, 30.0),
+    (30, 0.5, 30.0),
+    (2.0, 60, 2),
+    (1, False, True),
+    (True, False, True),
+    (None, None, None),
+    (443, "block", "443"),
+    ("127.0.0.1:10085", None, "127.0.0.1:10085"),
+])
+def test_coerce_to_default_type(raw, default, expected):
+    value = C._coerce("X", raw, default)
+    assert value == expected and type(value) is type(expected)
+
+
+def test_coerce_rejects_bad_number():
+    with pytest.raises(RuntimeError, match="invalid setting ENFORCE_INTERVAL"):
+        C._coerce("ENFORCE_INTERVAL", "soon", 300)
+
+
+def test_setting_file_values_are_typed(monkeypatch):
+    monkeypatch.setattr(C, "_FILE", {"ENFORCE_INTERVAL": "30", "HOT_APPLY": "false", "XRAY_BIN": "/opt/xray"})
+    monkeypatch.delenv("XRAY_BACKEND_ENFORCE_INTERVAL", raising=False)
+    monkeypatch.delenv("XRAY_BACKEND_HOT_APPLY", raising=False)
+    assert C._setting("ENFORCE_INTERVAL", 300) == 30
+    assert C._setting("HOT_APPLY", True) is False
+    assert C._setting("XRAY_BIN", None) == "/opt/xray"
+    # env tetap lebih dulu dari file
+    monkeypatch.setenv("XRAY_BACKEND_ENFORCE_INTERVAL", "45")
+    assert C._setting("ENFORCE_INTERVAL", 300) == 45
+
+
+def test_path_setting(monkeypatch):
+    monkeypatch.setattr(C, "_FILE", {})
+    monkeypatch.delenv("XRAY_BACKEND_ACCOUNT_DB", raising=False)
+    assert C._path_setting("ACCOUNT_DB", C.QUOTA_DIR / "accounts.db") == C.QUOTA_DIR / "accounts.db"
+    assert C._path_setting("ACCOUNT_DB", "/opt/quota/accounts.db") == C.ROOT / "opt/quota/accounts.db"
+    monkeypatch.setattr(C, "_FILE", {"ACCOUNT_DB": "/var/lib/xray/accounts.db"})
+    assert C._path_setting("ACCOUNT_DB", C.QUOTA_DIR / "accounts.db") == Path("/var/lib/xray/accounts.db")
+    assert C.ACCOUNT_DB == C.QUOTA_DIR / "accounts.db"
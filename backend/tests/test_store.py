@@ -0,0 +1,311 @@
+import json
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+
+from conftest import base_config, days_from_today, write_config, write_quota_file
+from xray_backend import constants as C, store, usage
+
+
+def _account(proto="vless", **kw):
+    row = {"protocol": proto, "secret": "s-1", "quota_limit": 100, "created_at": "2026-01-01", "expired_at": days_from_today(10)}
+    row.update(kw)
+    return row
+
+
+def test_upsert_get_version(deploy):
+    store.upsert("a@vless", **_account())
+    row = store.get("a@vless")
+    assert (row["secret"], row["quota_limit"], row["blocked"], row["used"], row["version"]) == ("s-1", 100, False, 0, 1)
+
+    store.upsert("a@vless", quota_limit=200, not_a_field="ignored")
+    assert store.get("a@vless")["quota_limit"] == 200
+    assert store.get("a@vless")["version"] == 2
+
+    store.set_blocked_many(["a@vless", "ghost@vless"], True, "2026-01-02T00:00:00Z")
+    row = store.get("a@vless")
+    assert row["blocked"] and row["blocked_at"] == "2026-01-02T00:00:00Z" and row["version"] == 3
+    assert store.blocked_usernames() == {"a@vless"}
+
+    store.set_blocked("a@vless", False, "ignored")
+    assert store.get("a@vless")["blocked_at"] is None
+    store.delete_many(["a@vless", "ghost@vless"])
+    assert store.get("a@vless") is None and store.count() == 0
+
+
+def test_get_many_and_batches(deploy):
+    store.upsert_many([(f"u{i:04d}@trojan", _account("trojan", expired_at=days_from_today(i % 7))) for i in range(1203)])
+    assert store.count() == 1203 and store.count("vless") == 0
+    assert len(store.get_many(f"u{i:04d}@trojan" for i in range(0, 1300, 2))) == 602
+
+    batches = list(store.iter_batches(protocol="trojan", batch=500))
+    assert [len(b) for b in batches] == [500, 500, 203]
+    keys = [(r["expired_at"], r["username"]) for b in batches for r in b]
+    assert keys == sorted(keys)
+    lo, hi = days_from_today(2), days_from_today(3)
+    assert all(lo <= r["expired_at"] <= hi for b in store.iter_batches(expired_from=lo, expired_to=hi) for r in b)
+
+
+def test_add_usage_known_and_unknown(deploy):
+    store.upsert("a@vless", **_account())
+    res = store.add_usage({"a@vless": (10, 20), "late@vmess": (5, 7)})
+    assert res == {"pending": ["late@vmess"], "dropped": []}
+    assert store.get_usage("a@vless") == (10, 20)
+    assert store.pending_usage() == {"late@vmess": (5, 7)}
+
+    # poll berikutnya sebelum akun ada: ditambahkan ke tahanan, tidak dilaporkan ulang
+    assert store.add_usage({"late@vmess": (1, 1)}) == {"pending": [], "dropped": []}
+    assert store.pending_usage() == {"late@vmess": (6, 8)}
+
+    # akun muncul (import/add): tahanan diterapkan walau poll tidak membawa delta baru
+    store.upsert("late@vmess", **_account("vmess"))
+    store.add_usage({})
+    assert store.get_usage("late@vmess") == (6, 8)
+    assert store.pending_usage() == {}
+    assert store.summary()["used_total"] == 30 + 14
+
+
+def test_add_usage_pending_expires(deploy, monkeypatch, capsys):
+    assert usage.add_deltas({"user>>>gone@vless>>>traffic>>>uplink": 9, "user>>>gone@vless>>>traffic>>>downlink": 0}) == 1
+    assert "holding usage for 1 unknown user(s): gone@vless" in capsys.readouterr().err
+
+    monkeypatch.setattr(store, "USAGE_PENDING_TTL", -1)
+    usage.add_deltas({})
+    assert "dropped held usage for 1 user(s): gone@vless" in capsys.readouterr().err
+    assert store.pending_usage() == {}
+
+
+def test_import_legacy(deploy):
+    cfg = base_config()
+    cfg["inbounds"][0]["settings"]["clients"].append({"id": "cfg-secret-0001", "email": "a@vless"})
+    write_config(cfg)
+    write_quota_file("a@vless", "vless", days_from_today(5), quota_limit=1073741824, created_at="2026-01-01")
+    write_quota_file("b@trojan", "trojan", days_from_today(9))
+    write_quota_file("broken@vless", "vmess", days_from_today(9))  # protocol tidak cocok: diabaikan
+    (C.DETAIL_BASE["trojan"]).mkdir(parents=True, exist_ok=True)
+    (C.DETAIL_BASE["trojan"] / "b@trojan.txt").write_text("UUID/Pass  : txt-secret-0002\n", encoding="utf-8")
+    (C.QUOTA_DIR / "_blocked").mkdir(parents=True, exist_ok=True)
+    (C.QUOTA_DIR / "_blocked" / "b@trojan.json").write_text(
+        json.dumps({"username": "b@trojan", "protocol": "trojan", "blocked_at": "2026-02-02T00:00:00Z"}), encoding="utf-8"
+    )
+    C.USAGE_FILE.write_text(json.dumps({"users": {"a@vless": [100, 200], "zz@vless": [1, 1]}}), encoding="utf-8")
+
+    # DB baru: import otomatis saat koneksi pertama
+    a, b = store.get("a@vless"), store.get("b@trojan")
+    assert (a["secret"], a["quota_limit"], a["created_at"], a["used_up"], a["used_down"]) == ("cfg-secret-0001", 1073741824, "2026-01-01", 100, 200)
+    assert (b["secret"], b["blocked"], b["blocked_at"]) == ("txt-secret-0002", True, "2026-02-02T00:00:00Z")
+    assert store.count() == 2
+
+    # import ulang: metadata dari file ditimpa, usage di DB (lebih baru) dipertahankan
+    store.add_usage({"a@vless": (1, 1)})
+    write_quota_file("a@vless", "vless", days_from_today(40), quota_limit=5)
+    res = store.import_legacy()
+    assert res == {"accounts": 2, "blocked": 1, "usage": 0}
+    a = store.get("a@vless")
+    assert (a["quota_limit"], a["expired_at"], a["used"]) == (5, days_from_today(40), 302)
+    assert store.summary()["total"] == 2
+
+
+def test_export_legacy_roundtrip(deploy):
+    store.upsert("c@vmess", **_account("vmess", blocked=True, blocked_at="2026-03-03T00:00:00Z", secret="sec-c"))
+    store.upsert("d@allproto", **_account("allproto"))
+
+    assert store.export_legacy() == {"quota_files": 2, "blocked_files": 1}
+    q = json.loads((C.QUOTA_DIR / "vmess" / "c@vmess.json").read_text(encoding="utf-8"))
+    assert (q["username"], q["quota_limit"], q["expired_at"]) == ("c@vmess", 100, days_from_today(10))
+    bl = json.loads((C.QUOTA_DIR / "_blocked" / "c@vmess.json").read_text(encoding="utf-8"))
+    assert (bl["secret"], bl["blocked_at"]) == ("sec-c", "2026-03-03T00:00:00Z")
+    assert not (C.QUOTA_DIR / "_blocked" / "d@allproto.json").exists()
+
+
+def _recount(ratio: float) -> dict:
+    """Hitung ulang summary dengan scan penuh tabel accounts (pembanding tabel ringkasan)."""
+    keys = ("total", "active", "blocked", "expired", "near_limit", "over_quota", "unlimited", "quota_total", "used_total")
+    protos = {p: dict.fromkeys(keys, 0) for p in store.SUMMARY_PROTOS}
+    expiry = dict.fromkeys([b[0] for b in store.EXPIRY_BUCKETS] + ["none"], 0)
+    today = date.today()
+    for row in store.iter_accounts():
+        d = protos[row["protocol"]]
+        d["total"] += 1
+        d["quota_total"] += row["quota_limit"]
+        d["used_total"] += row["used"]
+        if row["quota_limit"] <= 0:
+            d["unlimited"] += 1
+        if row["blocked"]:
+            d["blocked"] += 1
+            continue
+        if row["quota_limit"] > 0 and row["used"] >= row["quota_limit"]:
+            d["over_quota"] += 1
+        elif row["quota_limit"] > 0 and row["used"] >= row["quota_limit"] * ratio:
+            d["near_limit"] += 1
+        bucket = store._expiry_bucket(row["expired_at"], today)
+        expiry[bucket] += 1
+        if bucket == "expired":
+            d["expired"] += 1
+    totals = dict.fromkeys(keys, 0)
+    for d in protos.values():
+        d["active"] = d["total"] - d["blocked"] - d["expired"]
+        for k in keys:
+            totals[k] += d[k]
+    return {"as_of": today.isoformat(), **totals, "protocols": protos, "expiry": expiry}
+
+
+def test_summary_matches_recount_after_mixed_ops(deploy, monkeypatch):
+    gb = 1073741824
+    plans = [(p, f"m{i:02d}", 1 + (i * 7) % 60, i % 4) for i, p in enumerate(("vless", "vmess", "trojan", "allproto") * 6)]
+    resp = deploy.call("add_many", users=[{"protocol": p, "username": n, "days": d, "quota_gb": q} for p, n, d, q in plans])
+    assert resp["ok"] == len(plans)
+    assert store.summary() == _recount(C.NEAR_LIMIT_RATIO)
+
+    deploy.call("del", protocol="vless", username="m00")
+    deploy.call("del_many", users=[{"protocol": "trojan", "username": "m02"}, {"protocol": "allproto", "username": "m03"}])
+    deploy.call("block", protocol="vmess", username="m01", op="block")
+    deploy.call("block_many", users=[{"protocol": "trojan", "username": "m06"}, {"protocol": "vless", "username": "m08"}])
+    deploy.call("block", protocol="trojan", username="m06", op="unblock")
+    deploy.call("quota_set", protocol="vmess", username="m05", quota_gb=0)
+    deploy.call("quota_set", protocol="vless", username="m04", quota_gb=2)
+    deploy.call("renew", protocol="allproto", username="m07", add_days=40)
+    # usage melewati batas near / over, termasuk akun yang di-block
+    store.add_usage({"m04@vless": (gb, int(0.7 * gb)), "m09@vmess": (gb, 0), "m10@trojan": (3 * gb, 0),
+                     "m01@vmess": (5, 5), "m13@vmess": (1, 2), "m17@vmess": (int(0.2 * gb), 0)})
+    # expiry digeser ke masa lalu langsung di store (seperti import)
+    store.upsert("m12@vless", expired_at=days_from_today(-3))
+    store.upsert("m14@trojan", expired_at=days_from_today(-1), blocked=True, blocked_at="2026-01-01T00:00:00Z")
+    store.upsert("m16@vless", expired_at="")
+    deploy.call("add", protocol="vless", username="m00", days=3, quota_gb=1)
+
+    got = store.summary()
+    assert got == _recount(C.NEAR_LIMIT_RATIO)
+    assert got["total"] == len(plans) - 2 and got["blocked"] >= 3 and got["expired"] >= 1
+    assert got["near_limit"] >= 1 and got["over_quota"] >= 1 and got["expiry"]["none"] == 1
+    assert deploy.call("summary")["total"] == got["total"]
+
+    # rasio near-limit berubah (proses baru): tabel ringkasan dihitung ulang sekali saat init
+    monkeypatch.setattr(store, "NEAR_LIMIT_RATIO", 0.1)
+    store._local.conn.close()
+    store._local = threading.local()
+    store._initialized = False
+    assert store.summary() == _recount(0.1)
+    assert store.summary()["near_limit"] > got["near_limit"]
+
+
+def test_write_quota_is_atomic(deploy, monkeypatch):
+    from xray_backend import io_utils
+    from xray_backend.quota import write_quota
+
+    p = write_quota("vless", "q@vless", 1, 30, "2026-01-01", "2026-01-31")
+    before = json.loads(open(p, encoding="utf-8").read())
+    assert before["quota_limit"] == 1073741824
+
+    def crash(src, dst):
+        raise OSError("disk gone")
+
+    # crash sebelum rename: file lama utuh, tidak ada file tmp tertinggal
+    monkeypatch.setattr(io_utils.os, "replace", crash)
+    with pytest.raises(OSError):
+        write_quota("vless", "q@vless", 5, 30, "2026-01-01", "2026-03-01")
+    monkeypatch.undo()
+    assert json.loads(open(p, encoding="utf-8").read()) == before
+    assert [f.name for f in (C.QUOTA_DIR / "vless").iterdir()] == ["q@vless.json"]
+
+
+def test_renew_and_quota_set_fill_missing_store_row(deploy):
+    # akun lama: ada di config + /opt/quota, belum punya baris di store
+    resp = deploy.call("add", protocol="vmess", username="old", days=30, quota_gb=2)
+    created = store.get("old@vmess")["created_at"]
+    store.delete("old@vmess")
+
+    assert deploy.call("renew", protocol="vmess", username="old", add_days=5)["status"] == "ok"
+    row = store.get("old@vmess")
+    assert (row["secret"], row["created_at"], row["quota_limit"]) == (resp["uuid"], created, 2 * 1073741824)
+    assert row["expired_at"] == days_from_today(35) and row["version"] == 1
+
+    store.delete("old@vmess")
+    assert deploy.call("quota_set", protocol="vmess", username="old", quota_gb=3)["status"] == "ok"
+    row = store.get("old@vmess")
+    assert (row["secret"], row["quota_limit"], row["expired_at"]) == (resp["uuid"], 3 * 1073741824, days_from_today(35))
+    assert store.summary()["unlimited"] == 0
+
+    # baris yang sudah ada: hanya kolom yang berubah
+    assert deploy.call("quota_set", protocol="vmess", username="old", quota_gb=0)["status"] == "ok"
+    row = store.get("old@vmess")
+    assert (row["quota_limit"], row["secret"], row["version"]) == (0, resp["uuid"], 2)
+
+
+def test_update_does_not_insert(deploy):
+    assert store.update("ghost@vless", quota_limit=5) is False
+    assert store.get("ghost@vless") is None
+    store.upsert("g@vless", **_account())
+    assert store.update("g@vless", quota_limit=5) is True
+    assert store.get("g@vless")["quota_limit"] == 5
+
+
+def _reopen():
+    from conftest import _reset_state
+    _reset_state()
+
+
+def test_failed_legacy_import_retried_on_next_open(deploy, monkeypatch, capsys):
+    _reopen()
+    C.ACCOUNT_DB.unlink(missing_ok=True)
+    write_quota_file("a@vless", "vless", days_from_today(5))
+
+    real = store._upsert
+
+    def boom(conn, username, fields):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "_upsert", boom)
+    assert store.count() == 0
+    assert "legacy import failed, will retry: database is locked" in capsys.readouterr().err
+    assert store.db().execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()[0] == "pending"
+
+    # file DB sudah ada, tapi import belum selesai: dicoba lagi saat dibuka ulang
+    monkeypatch.setattr(store, "_upsert", real)
+    _reopen()
+    assert store.get("a@vless") is not None
+    assert store.db().execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()[0] == "done"
+
+    # sudah selesai: tidak di-import lagi saat dibuka ulang
+    write_quota_file("b@vless", "vless", days_from_today(5))
+    _reopen()
+    assert store.get("b@vless") is None
+
+
+def test_db_without_import_marker(deploy):
+    store.upsert("x@vless", **_account())
+    store.db().execute("DELETE FROM meta WHERE key = 'legacy_import'")
+    write_quota_file("y@vless", "vless", days_from_today(5))
+
+    # DB lama berisi akun: dianggap sudah di-import
+    _reopen()
+    assert store.get("y@vless") is None
+    assert store.db().execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()[0] == "done"
+
+
+def test_usage_kept_when_store_write_fails(deploy, monkeypatch):
+    store.upsert("u@vless", **_account())
+    real = store.add_usage
+    calls = []
+
+    def locked(deltas):
+        calls.append(dict(deltas))
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "add_usage", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        usage.add_deltas({"user>>>u@vless>>>traffic>>>uplink": 10, "user>>>u@vless>>>traffic>>>downlink": 20})
+    assert usage.unsaved_usage() == {"u@vless": (10, 20)}
+    assert store.get_usage("u@vless") == (0, 0)
+
+    # tick berikutnya: delta yang tertahan digabung dengan delta baru
+    with pytest.raises(sqlite3.OperationalError):
+        usage.add_deltas({"user>>>u@vless>>>traffic>>>uplink": 1})
+    assert calls[-1] == {"u@vless": (11, 20)}
+
+    monkeypatch.setattr(store, "add_usage", real)
+    assert usage.add_deltas({"user>>>u@vless>>>traffic>>>downlink": 5}) == 1
+    assert store.get_usage("u@vless") == (11, 25)
+    assert usage.unsaved_usage() == {}
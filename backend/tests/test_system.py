@@ -0,0 +1,133 @@
+import subprocess
+import time
+
+import pytest
+
+from xray_backend import system
+from xray_backend.system import SHOW_PROPS, SystemdControl, restart_xray, svc_state, units_state
+
+
+@pytest.fixture
+def shows(deploy, monkeypatch):
+    """Catat setiap show() ke adapter fake: satu entry = satu `systemctl show`."""
+    calls = []
+    real = deploy.service.show
+
+    def show(names, props):
+        calls.append(tuple(names))
+        return real(names, props)
+
+    monkeypatch.setattr(deploy.service, "show", show)
+    return calls
+
+
+# --- parsing `systemctl show` di adapter produksi ---
+
+SHOW_OUTPUT = """Id=xray.service
+LoadState=loaded
+ActiveState=active
+SubState=running
+MainPID=812
+ExecMainStatus=status=0/SUCCESS
+
+Id=nginx.service
+LoadState=not-found
+ActiveState=inactive
+SubState=dead
+MainPID=0
+"""
+
+
+def test_systemd_show_splits_units_and_parses_key_values(monkeypatch):
+    seen = []
+
+    def run(cmd, **kwargs):
+        seen.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, SHOW_OUTPUT, "")
+
+    monkeypatch.setattr(system.subprocess, "run", run)
+
+    props = SystemdControl().show(("xray", "nginx"), ("Id", "ActiveState"))
+
+    assert seen == [["systemctl", "show", "--no-pager", "--property=Id,ActiveState", "--", "xray", "nginx"]]
+    assert set(props) == {"xray", "nginx"}
+    assert props["xray"]["ActiveState"] == "active" and props["xray"]["MainPID"] == "812"
+    # value yang mengandung "=" dipotong di "=" pertama saja
+    assert props["xray"]["ExecMainStatus"] == "status=0/SUCCESS"
+    assert props["nginx"]["LoadState"] == "not-found"
+
+
+def test_systemd_show_without_output_raises(monkeypatch):
+    monkeypatch.setattr(
+        system.subprocess, "run",
+        lambda cmd, **kw: subprocess.CompletedProcess(cmd, 1, "", "Failed to connect to bus\n"),
+    )
+    with pytest.raises(RuntimeError, match="Failed to connect to bus"):
+        SystemdControl().show(("xray",), SHOW_PROPS)
+
+
+# --- units_state: satu query, cache TTL, invalidasi ---
+
+def test_units_state_one_query_for_all_units(deploy, shows):
+    deploy.service.units["nginx"] = {**deploy.service._unit("nginx"), "MemoryCurrent": 2 ** 64 - 1}
+
+    st = units_state(("xray", "nginx", "xray"))
+
+    assert shows == [("xray", "nginx")]
+    assert list(st) == ["xray", "nginx"]
+    x = st["xray"]
+    assert (x["active"], x["state"], x["sub_state"], x["restarts"]) == (True, "active", "running", 0)
+    assert x["pid"] and x["memory_bytes"] == 32 * 1024 * 1024
+    assert 0 <= x["uptime_s"] <= 5
+    # UINT64_MAX = tidak diketahui
+    assert st["nginx"]["memory_bytes"] is None
+
+
+def test_units_state_cached_within_ttl(deploy, shows, monkeypatch):
+    monkeypatch.setattr(system, "STATUS_CACHE_TTL", 60)
+    first = units_state(("xray", "nginx"))
+    first["xray"]["state"] = "mutated"
+
+    again = units_state(("nginx", "xray"))
+    assert shows == [("xray", "nginx")]
+    assert again["xray"]["state"] == "active"
+
+    # hanya unit yang belum ada di cache yang di-query
+    units_state(("xray", "sshd"))
+    assert shows == [("xray", "nginx"), ("sshd",)]
+
+
+def test_units_state_refetched_after_ttl(deploy, shows, monkeypatch):
+    monkeypatch.setattr(system, "STATUS_CACHE_TTL", 0.05)
+    units_state(("xray",))
+    units_state(("xray",))
+    assert shows == [("xray",)]
+    time.sleep(0.06)
+    units_state(("xray",))
+    assert shows == [("xray",), ("xray",)]
+
+
+def test_restart_invalidates_cache(deploy, shows, monkeypatch):
+    monkeypatch.setattr(system, "STATUS_CACHE_TTL", 60)
+    assert svc_state("xray")["restarts"] == 0
+
+    restart_xray()
+
+    assert svc_state("xray")["restarts"] == 1
+    assert shows == [("xray",), ("xray",)]
+
+
+def test_units_state_reports_query_errors(deploy, monkeypatch):
+    def broken(names, props):
+        raise RuntimeError("no systemctl output")
+
+    monkeypatch.setattr(deploy.service, "show", broken)
+    st = svc_state("xray")
+    assert (st["active"], st["state"], st["error"]) == (False, "unknown", "no systemctl output")
+
+
+def test_unit_not_found(deploy):
+    deploy.service.units["ghost"] = {**deploy.service._unit("ghost"), "LoadState": "not-found", "ActiveState": "inactive"}
+    st = svc_state("ghost")
+    assert st["error"] == "unit ghost not found"
+    assert (st["active"], st["uptime_s"]) == (False, None)
@@ -0,0 +1,155 @@
+"""
+Hot-apply lewat adapter produksi (XrayCliApi) dengan binary `xray` stub: stub mencatat
+argv + payload JSON setiap `xray api <cmd>` dan bisa dibuat gagal per perintah.
+"""
+import json
+import stat
+import sys
+
+import pytest
+
+from conftest import ROOT, read_config
+from xray_backend import adapters, store, xray_api, xray_config
+from xray_backend.usage import collect_usage
+from xray_backend.xray_api import XrayCliApi
+
+STUB = r'''#!{python}
+import json, os, sys
+argv = sys.argv[1:]
+cmd = argv[1] if len(argv) > 1 else ""
+entry = {{"cmd": cmd, "argv": argv}}
+if cmd in ("adu", "adrules"):
+    with open(argv[-1], encoding="utf-8") as f:
+        entry["payload"] = json.load(f)
+with open(os.environ["XRAY_STUB_LOG"], "a", encoding="utf-8") as f:
+    f.write(json.dumps(entry) + "\n")
+if cmd in os.environ.get("XRAY_STUB_FAIL", "").split(","):
+    print("rpc error: code = Unavailable", file=sys.stderr)
+    sys.exit(1)
+if cmd == "statsquery":
+    print(os.environ.get("XRAY_STUB_STATS", "{{}}"))
+'''
+
+
+@pytest.fixture
+def xray_cli(deploy, monkeypatch):
+    stub = ROOT / "bin" / "xray"
+    stub.parent.mkdir(parents=True, exist_ok=True)
+    stub.write_text(STUB.format(python=sys.executable), encoding="utf-8")
+    stub.chmod(stub.stat().st_mode | stat.S_IXUSR)
+    log = ROOT / "xray-api.log"
+    monkeypatch.setattr(xray_api, "XRAY_BIN", str(stub))
+    monkeypatch.setenv("XRAY_STUB_LOG", str(log))
+    monkeypatch.setattr(xray_api, "XRAY_API_SERVER", "127.0.0.1:10085")
+    adapters.set_adapters(xray_api=XrayCliApi())
+
+    def calls():
+        if not log.exists():
+            return []
+        return [json.loads(line) for line in log.read_text(encoding="utf-8").splitlines()]
+
+    return calls
+
+
+def test_add_and_del_via_api(deploy, xray_cli):
+    resp = deploy.call("add", protocol="allproto", username="alice", days=30, quota_gb=1)
+    assert resp["applied"] == "api"
+
+    (adu,) = xray_cli()
+    assert adu["cmd"] == "adu" and "--server=127.0.0.1:10085" in adu["argv"]
+    inbounds = adu["payload"]["inbounds"]
+    assert [ib["tag"] for ib in inbounds] == ["vless-ws", "vmess-ws", "trojan-ws"]
+    assert [ib["settings"]["clients"] for ib in inbounds] == [
+        [{"id": resp["uuid"], "email": "alice@allproto"}],
+        [{"id": resp["uuid"], "email": "alice@allproto"}],
+        [{"password": resp["uuid"], "email": "alice@allproto"}],
+    ]
+    assert inbounds[0]["streamSettings"] == {"network": "ws", "wsSettings": {"path": "/vless"}}
+
+    resp = deploy.call("del", protocol="allproto", username="alice")
+    assert resp["applied"] == "api"
+    rmu = [c["argv"][2:] for c in xray_cli()[1:]]
+    assert rmu == [["--server=127.0.0.1:10085", f"-tag={t}-ws", "alice@allproto"] for t in ("vless", "vmess", "trojan")]
+    assert deploy.service.calls == []
+
+
+def test_api_failure_flushes_config_then_restarts(deploy, xray_cli, monkeypatch):
+    monkeypatch.setenv("XRAY_STUB_FAIL", "adu")
+    # save tertunda di jendela coalesce: restart harus didahului flush ke disk
+    xray_config.set_write_coalesce(60)
+    seen = []
+    restart = deploy.service.restart
+    monkeypatch.setattr(deploy.service, "restart", lambda unit: (seen.append(read_config()), restart(unit)))
+
+    resp = deploy.call("add", protocol="vless", username="bob", days=30, quota_gb=0)
+
+    assert resp["applied"] == "restart"
+    assert [c["cmd"] for c in xray_cli()] == ["adu"]
+    assert deploy.service.calls == ["restart xray"]
+    assert [c["email"] for c in seen[0]["inbounds"][0]["settings"]["clients"]] == ["bob@vless"]
+    assert store.get("bob@vless")["secret"] == resp["uuid"]
+
+
+def test_api_not_configured_restarts(deploy, xray_cli, monkeypatch):
+    monkeypatch.setattr(xray_api, "XRAY_API_SERVER", None)
+    resp = deploy.call("add", protocol="vmess", username="carol", days=30, quota_gb=0)
+    assert resp["applied"] == "restart"
+    assert xray_cli() == []
+    assert deploy.service.calls == ["restart xray"]
+
+
+def test_block_pushes_routing_rules(deploy, xray_cli):
+    deploy.call("add", protocol="trojan", username="dave", days=30, quota_gb=0)
+
+    resp = deploy.call("block", protocol="trojan", username="dave", op="block")
+    assert resp["applied"] == "api"
+    adrules = xray_cli()[-1]
+    assert adrules["cmd"] == "adrules"
+    (rule,) = adrules["payload"]["routing"]["rules"]
+    assert rule["outboundTag"] == "blocked" and rule["user"] == ["dummy-block-user", "dave@trojan"]
+
+    resp = deploy.call("block", protocol="trojan", username="dave", op="unblock")
+    assert resp["applied"] == "api"
+    (rule,) = xray_cli()[-1]["payload"]["routing"]["rules"]
+    assert rule["user"] == ["dummy-block-user"]
+    assert deploy.service.calls == []
+
+
+def test_routing_failure_restarts(deploy, xray_cli, monkeypatch):
+    deploy.call("add", protocol="vless", username="erin", days=30, quota_gb=0)
+    monkeypatch.setenv("XRAY_STUB_FAIL", "adrules")
+
+    resp = deploy.call("block", protocol="vless", username="erin", op="block")
+
+    assert resp["applied"] == "restart"
+    assert deploy.service.calls == ["restart xray"]
+    assert "erin@vless" in deploy.blocked_rule_users()
+
+
+def test_statsquery_usage(deploy, xray_cli, monkeypatch):
+    deploy.call("add", protocol="vless", username="fred", days=30, quota_gb=1)
+    stats = {"stat": [
+        {"name": "user>>>fred@vless>>>traffic>>>uplink", "value": "100"},
+        {"name": "user>>>fred@vless>>>traffic>>>downlink", "value": 250},
+        {"name": "inbound>>>vless-ws>>>traffic>>>uplink", "value": 9},
+    ]}
+    monkeypatch.setenv("XRAY_STUB_STATS", json.dumps(stats))
+
+    res = collect_usage()
+
+    assert res["users_changed"] == 1
+    assert xray_cli()[-1]["argv"][2:] == ["--server=127.0.0.1:10085", "-pattern=user>>>", "-reset"]
+    assert store.get_usage("fred@vless") == (100, 250)
+
+
+def test_api_server_from_config(monkeypatch):
+    monkeypatch.setattr(xray_api, "XRAY_API_SERVER", None)
+    api = XrayCliApi()
+    cfg = {
+        "api": {"tag": "api", "services": ["HandlerService", "StatsService"]},
+        "inbounds": [{"tag": "api", "listen": "0.0.0.0", "port": 10085, "protocol": "dokodemo-door"}],
+    }
+    assert api.server(cfg, "HandlerService") == "127.0.0.1:10085"
+    assert api.server(cfg, "RoutingService") is None
+    assert api.server({"api": {"listen": "127.0.0.1:8080", "services": ["RoutingService"]}}, "RoutingService") == "127.0.0.1:8080"
+    assert api.server({}, "HandlerService") is None
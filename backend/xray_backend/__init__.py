@@ -1 +1,6 @@
-from .core import handle_action
+def __getattr__(name):
+    # lazy: `import xray_backend.constants` (CLI) tidak ikut memuat core
+    if name == "handle_action":
+        from .core import handle_action
+        return handle_action
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
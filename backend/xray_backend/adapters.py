@@ -0,0 +1,101 @@
+"""
+Adapter sistem yang bisa diganti: service control, IP discovery, Xray API.
+
+Produksi memakai systemctl (system.SystemdControl), curl (network.CurlIpDiscovery)
+dan CLI `xray api` (xray_api.XrayCliApi). Dengan SERVICE_ADAPTER / IP_ADAPTER /
+XRAY_API_ADAPTER = "fake" (lihat constants) dipakai implementasi in-process dari
+fakes.py, jadi seluruh backend bisa di-load test tanpa root dan tanpa menyentuh
+service asli. Test in-process juga bisa memasang instance sendiri lewat set_adapters().
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    from typing import Protocol
+except ImportError:  # Python < 3.8
+    Protocol = object  # type: ignore
+
+from .constants import SERVICE_ADAPTER, IP_ADAPTER, XRAY_API_ADAPTER
+
+
+class ServiceControl(Protocol):
+    def restart(self, unit: str) -> None:
+        """Restart unit; exception jika gagal."""
+
+    def show(self, names: Sequence[str], props: Sequence[str]) -> Dict[str, Dict[str, str]]:
+        """Property systemd (`Key` -> string) per unit; unit yang tidak diketahui boleh tidak ada."""
+
+
+class IpDiscovery(Protocol):
+    def public_ip(self) -> str:
+        """IP publik node, atau "unknown"."""
+
+
+class XrayApi(Protocol):
+    def server(self, cfg: Dict[str, Any], service: str) -> Optional[str]:
+        """Alamat gRPC untuk service Xray (HandlerService, RoutingService, StatsService) atau None."""
+
+    def call(self, cmd: str, server: str, args: List[str], payload: Optional[Dict[str, Any]] = None) -> str:
+        """Satu perintah `xray api <cmd>`; payload JSON (adu/adrules) dikirim sebagai file. Error -> XrayApiError."""
+
+
+_lock = threading.Lock()
+_current: Dict[str, Any] = {"service": None, "ip": None, "xray_api": None}
+
+
+def _build(kind: str) -> Any:
+    if kind == "service":
+        if SERVICE_ADAPTER == "fake":
+            from .fakes import FakeServiceControl
+            return FakeServiceControl()
+        from .system import SystemdControl
+        return SystemdControl()
+    if kind == "ip":
+        if IP_ADAPTER == "fake":
+            from .fakes import FakeIpDiscovery
+            return FakeIpDiscovery()
+        from .network import CurlIpDiscovery
+        return CurlIpDiscovery()
+    if XRAY_API_ADAPTER == "fake":
+        from .fakes import FakeXrayApi
+        return FakeXrayApi()
+    from .xray_api import XrayCliApi
+    return XrayCliApi()
+
+
+def _get(kind: str) -> Any:
+    a = _current[kind]
+    if a is None:
+        with _lock:
+            a = _current[kind]
+            if a is None:
+                a = _current[kind] = _build(kind)
+    return a
+
+
+def service() -> ServiceControl:
+    return _get("service")
+
+
+def ip_discovery() -> IpDiscovery:
+    return _get("ip")
+
+
+def xray_api() -> XrayApi:
+    return _get("xray_api")
+
+
+def set_adapters(service: Any = None, ip: Any = None, xray_api: Any = None) -> None:
+    """Pasang adapter (test in-process). Argumen None = tidak diubah."""
+    with _lock:
+        for kind, a in (("service", service), ("ip", ip), ("xray_api", xray_api)):
+            if a is not None:
+                _current[kind] = a
+
+
+def reset_adapters() -> None:
+    """Kembali ke adapter dari setting (dibangun ulang saat dipakai berikutnya)."""
+    with _lock:
+        for kind in _current:
+            _current[kind] = None
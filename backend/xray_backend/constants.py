@@ -1,16 +1,185 @@
+"""
+Setting backend. Setiap nilai di modul ini bisa di-override (prioritas menurun):
+
+  1. env  XRAY_BACKEND_<NAMA>, mis. XRAY_BACKEND_ENFORCE_INTERVAL=300
+  2. file JSON XRAY_BACKEND_SETTINGS (default /etc/xray-backend/settings.json),
+     objek {"<NAMA>": nilai}, mis. {"ROOT": "/srv/xray-test", "SERVICE_ADAPTER": "fake"}
+  3. default di bawah
+
+Path default berada di bawah ROOT ("/" di node produksi); path yang di-set eksplisit
+dipakai apa adanya (relatif -> terhadap ROOT). Nilai dibaca sekali saat import.
+"""
+import json
+import os
 import re
 from pathlib import Path
+from typing import Any, Dict, Union
+
+SETTINGS_FILE = os.environ.get("XRAY_BACKEND_SETTINGS") or "/etc/xray-backend/settings.json"
+
+
+def _load_settings_file() -> Dict[str, Any]:
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"invalid settings file {SETTINGS_FILE}: {e}")
+    if not isinstance(obj, dict):
+        raise RuntimeError(f"invalid settings file {SETTINGS_FILE}: JSON object expected")
+    return {str(k).upper(): v for k, v in obj.items()}
+
+
+_FILE = _load_settings_file()
+
+
+def _coerce(name: str, raw: Any, default: Any) -> Any:
+    """Konversi nilai mentah (string env atau nilai JSON) ke tipe default (bool/int/float/str)."""
+    if raw is None or default is None:
+        if isinstance(raw, str) and raw.strip() == "":
+            return None
+        return raw
+    try:
+        if isinstance(default, bool):
+            if isinstance(raw, str):
+                return raw.strip().lower() in ("1", "true", "yes", "on")
+            return bool(raw)
+        if isinstance(default, int):
+            return int(raw)
+        if isinstance(default, float):
+            return float(raw)
+    except (TypeError, ValueError):
+        raise RuntimeError(f"invalid setting {name}: {raw!r} is not {type(default).__name__}")
+    if isinstance(default, str) and not isinstance(raw, str):
+        return str(raw)
+    return raw
+
+
+def _setting(name: str, default: Any) -> Any:
+    """Nilai setting `name` dari env atau file settings, dikonversi ke tipe default (bool/int/float)."""
+    raw = os.environ.get(f"XRAY_BACKEND_{name}")
+    if raw is None:
+        raw = _FILE.get(name, default)
+    return _coerce(name, raw, default)
+
+
+# semua path default berada di bawah root ini. Benchmark/test memakai
+# XRAY_BACKEND_ROOT=<dir temp> supaya deployment sintetis tidak menyentuh node asli.
+ROOT = Path(_setting("ROOT", "/") or "/")
+
+
+def _path(p: str) -> Path:
+    return ROOT / p.lstrip("/")
+
+
+def _path_setting(name: str, default: Union[str, Path]) -> Path:
+    """Path dari setting `name` (absolut apa adanya, relatif terhadap ROOT); default str = di bawah ROOT, Path = apa adanya."""
+    v = _setting(name, None)
+    if v:
+        return ROOT / str(v)
+    return default if isinstance(default, Path) else _path(default)
+
 
-CONFIG = Path("/usr/local/etc/xray/config.json")
-ROLLING_BACKUP = Path("/usr/local/etc/xray/config.json.backup")
+CONFIG = _path_setting("CONFIG", "/usr/local/etc/xray/config.json")
+# riwayat config.json: ring backup gzip bernomor (config.json.<gen>.gz)
+CONFIG_BACKUP_DIR = _path_setting("CONFIG_BACKUP_DIR", "/usr/local/etc/xray/backups")
+CONFIG_BACKUP_KEEP = _setting("CONFIG_BACKUP_KEEP", 20)
 
-QUOTA_DIR = Path("/opt/quota")
-DETAIL_BASE = {
-    "vless": Path("/opt/vless"),
-    "vmess": Path("/opt/vmess"),
-    "trojan": Path("/opt/trojan"),
-    "allproto": Path("/opt/allproto"),
-}
+QUOTA_DIR = _path_setting("QUOTA_DIR", "/opt/quota")
+# file detail akun: <DETAIL_DIR>/<proto>/<user>.txt
+DETAIL_DIR = _path_setting("DETAIL_DIR", "/opt")
+DETAIL_BASE = {p: DETAIL_DIR / p for p in ("vless", "vmess", "trojan", "allproto")}
+# detail dirender on-demand dari account store (render_detail); file .txt hanya ekspor
+# kompatibilitas untuk tool lama: DETAIL_FILES=true -> add/renew/quota_set/get_detail ikut menulis
+DETAIL_FILES = _setting("DETAIL_FILES", False)
+DETAIL_CACHE_SIZE = _setting("DETAIL_CACHE_SIZE", 1024)
+
+SOCK_PATH = str(_path_setting("SOCK_PATH", "/run/xray-backend.sock"))
+MAX_REQUEST_BYTES = 1024 * 1024
 
 VALID_PROTO = {"vless","vmess","trojan","allproto"}
 USERNAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
+
+# action yang tidak mengubah state: boleh jalan paralel di server
+READ_ACTIONS = frozenset({
+    "ping", "status", "list", "quota_get", "block_get", "logs", "facts", "config_backups", "metrics",
+    "render_detail", "summary",
+})
+
+# action yang response-nya di-stream bertahap (beberapa frame per request)
+STREAM_ACTIONS = frozenset({"export", "regen_details"})
+EXPORT_CHUNK_ROWS = 500
+
+# regen_details: jumlah thread render+tulis file detail, dan ukuran batch per frame progress
+REGEN_WORKERS = _setting("REGEN_WORKERS", 8)
+REGEN_BATCH = _setting("REGEN_BATCH", 500)
+
+# batas jumlah user per request add_many/del_many
+MAX_BATCH = _setting("MAX_BATCH", 5000)
+
+# Xray gRPC API (HandlerService/RoutingService) untuk apply perubahan tanpa restart
+# XRAY_BIN None = `xray` di PATH, lalu /usr/local/bin/xray
+XRAY_BIN = _setting("XRAY_BIN", None)
+# alamat gRPC API ("host:port"); None = dari section "api" config.json
+XRAY_API_SERVER = _setting("XRAY_API_SERVER", None)
+XRAY_API_TIMEOUT = _setting("XRAY_API_TIMEOUT", 5)
+HOT_APPLY = _setting("HOT_APPLY", True)
+
+# file usage lama (sebelum account store); hanya dibaca oleh import_legacy
+USAGE_FILE = QUOTA_DIR / "_usage.json"
+USAGE_POLL_INTERVAL = _setting("USAGE_POLL_INTERVAL", 60)
+# delta usage untuk email yang belum punya baris di account store ditahan (usage_pending)
+# dan diterapkan begitu akunnya ada; dibuang (tercatat di log) setelah sekian detik
+USAGE_PENDING_TTL = _setting("USAGE_PENDING_TTL", 7 * 86400)
+
+# enforcement berkala quota + expired (detik, 0 = nonaktif). Default nonaktif supaya
+# upgrade node tidak tiba-tiba mem-block akun; aktifkan eksplisit, mis.
+# XRAY_BACKEND_ENFORCE_INTERVAL=300 atau {"ENFORCE_INTERVAL": 300} di file settings.
+ENFORCE_INTERVAL = _setting("ENFORCE_INTERVAL", 0)
+
+# auto-expiry: server bangun tepat di batas hari expiry berikutnya lalu memproses semua
+# akun jatuh tempo dalam satu perubahan config. mode: "block", "delete", atau "off".
+# Akun jatuh tempo jika expired_at < hari ini - EXPIRE_GRACE_DAYS.
+# Default "off" (expired_at hanya informasi); aktifkan eksplisit, mis.
+# XRAY_BACKEND_EXPIRE_MODE=block atau {"EXPIRE_MODE": "block"} di file settings.
+EXPIRE_MODE = _setting("EXPIRE_MODE", "off")
+EXPIRE_GRACE_DAYS = _setting("EXPIRE_GRACE_DAYS", 0)
+# tidur maksimum scheduler (detik) supaya perubahan expiry dari luar tetap terlihat
+EXPIRE_RECHECK = _setting("EXPIRE_RECHECK", 3600)
+
+# filter list "near_limit": pemakaian >= rasio ini dari quota (sama dengan indikator bot)
+NEAR_LIMIT_RATIO = _setting("NEAR_LIMIT_RATIO", 0.8)
+
+# registry akun in-memory: interval stat ulang semua file quota (edit in-place dari luar)
+REGISTRY_FULL_SWEEP = _setting("REGISTRY_FULL_SWEEP", 30)
+
+# account store SQLite (WAL): secret, quota, expiry, blocked, usage
+ACCOUNT_DB = _path_setting("ACCOUNT_DB", QUOTA_DIR / "accounts.db")
+
+NGINX_CONF = _path_setting("NGINX_CONF", "/etc/nginx/conf.d/xray.conf")
+
+# cache host facts: public IP di-refresh di background tiap FACTS_IP_TTL detik
+FACTS_IP_TTL = _setting("FACTS_IP_TTL", 3600)
+
+# server: beberapa save config dalam jendela ini digabung jadi satu tulis ke disk (detik)
+CONFIG_WRITE_COALESCE = _setting("CONFIG_WRITE_COALESCE", 0.5)
+
+# status: hasil `systemctl show` (xray + nginx) di-cache sebentar; notify tick + /status berbagi satu query
+STATUS_CACHE_TTL = _setting("STATUS_CACHE_TTL", 5)
+
+# metrics Prometheus (opsional): file untuk textfile collector node_exporter, ditulis ulang
+# tiap METRICS_INTERVAL detik; dan/atau endpoint HTTP /metrics di 127.0.0.1:METRICS_HTTP_PORT.
+# None / 0 = nonaktif. Action "metrics" lewat socket backend selalu tersedia.
+METRICS_TEXTFILE = _setting("METRICS_TEXTFILE", None)  # mis. "/var/lib/node_exporter/textfile_collector/xray_backend.prom"
+METRICS_INTERVAL = _setting("METRICS_INTERVAL", 15)
+METRICS_HTTP_PORT = _setting("METRICS_HTTP_PORT", 0)
+
+# adapter sistem (lihat adapters.py): "systemd"/"curl"/"cli" = produksi, "fake" = in-process
+# tanpa systemctl/curl/xray, untuk load test dan soak test di mesin biasa.
+SERVICE_ADAPTER = _setting("SERVICE_ADAPTER", "systemd")
+IP_ADAPTER = _setting("IP_ADAPTER", "curl")
+XRAY_API_ADAPTER = _setting("XRAY_API_ADAPTER", "cli")
+# adapter fake: IP publik yang dilaporkan dan durasi simulasi restart service (ms)
+FAKE_PUBLIC_IP = _setting("FAKE_PUBLIC_IP", "203.0.113.1")
+FAKE_RESTART_MS = _setting("FAKE_RESTART_MS", 0)
@@ -1,15 +1,46 @@
 import json
 import re
-import subprocess
+import time
 from datetime import date, timedelta, datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 from uuid import uuid4
 
-from .constants import VALID_PROTO, USERNAME_RE, QUOTA_DIR, DETAIL_BASE
-from .xray_config import load_config, save_config_with_backup, email_exists, append_client, remove_client
-from .system import restart_xray, svc_state
-from .quota import write_quota, safe_int, quota_scan_protos, scan_quota_items
+from .constants import (
+    VALID_PROTO,
+    USERNAME_RE,
+    QUOTA_DIR,
+    DETAIL_BASE,
+    DETAIL_FILES,
+    MAX_BATCH,
+    EXPIRE_MODE,
+    EXPIRE_GRACE_DAYS,
+    NEAR_LIMIT_RATIO,
+    READ_ACTIONS,
+)
+from .xray_config import (
+    load_config,
+    config_snapshot,
+    save_config_with_backup,
+    email_exists,
+    append_client,
+    remove_client,
+    find_secret,
+    blocked_rule_update,
+    blocked_users,
+    list_backups,
+    read_backup,
+)
+from .system import units_state
+from .io_utils import atomic_write
+from .xray_api import apply_changes
+from .usage import get_usage, used_by_user
+from . import store
+from .quota import write_quota, safe_int, quota_scan_protos
+from .registry import REGISTRY
+from .facts import get_facts
+from .journal import journal_page, parse_priority
+from . import metrics
 
 
 def final_user(proto: str, username: str) -> str:
@@ -24,11 +55,8 @@ def _read_json_file(p: Path) -> Dict[str, Any]:
     return json.loads(p.read_text(encoding="utf-8"))
 
 
-def _write_json_atomic(p: Path, obj: Dict[str, Any]) -> None:
-    p.parent.mkdir(parents=True, exist_ok=True)
-    tmp = p.with_name(p.name + ".tmp")
-    tmp.write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
-    tmp.replace(p)
+def _write_json_atomic(p: Path, obj: Dict[str, Any], mode: int = 0o644) -> None:
+    atomic_write(p, (json.dumps(obj, indent=2) + "\n").encode("utf-8"), mode, 0, 0)
 
 
 def _quota_bytes_from_gb(quota_gb: float) -> int:
@@ -67,23 +95,12 @@ def _extract_secret_from_detail_txt(p: Path) -> str:
     return m.group(1).strip()
 
 
-def _calc_days_remaining(expired_at_iso: str) -> int:
-    try:
-        exp = date.fromisoformat(expired_at_iso)
-        d = (exp - date.today()).days
-        if d < 0:
-            d = 0
-        return d
-    except Exception:
-        return 0
-
-
-def _blocked_dir() -> Path:
-    return QUOTA_DIR / "_blocked"
-
+# Record blocked disimpan di account store (blocked, blocked_at, secret untuk unblock).
+# File /opt/quota/_blocked/<user>.json hanya layout lama: dibaca sebagai fallback untuk
+# akun yang belum ada di store, dan dihapus saat user di-unblock/dihapus.
 
 def _blocked_path(final_u: str) -> Path:
-    return _blocked_dir() / f"{final_u}.json"
+    return QUOTA_DIR / "_blocked" / f"{final_u}.json"
 
 
 def _blocked_get(final_u: str) -> Dict[str, Any]:
@@ -99,179 +116,628 @@ def _blocked_get(final_u: str) -> Dict[str, Any]:
         return {"blocked": True}
 
 
-def _blocked_write(final_u: str, proto: str, secret: str) -> None:
-    p = _blocked_path(final_u)
-    obj = {
-        "username": final_u,
-        "protocol": proto,
-        "secret": secret,
-        "blocked_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-    }
-    _write_json_atomic(p, obj)
+def _blocked_legacy_secret(final_u: str) -> str:
+    try:
+        obj = _read_json_file(_blocked_path(final_u))
+    except Exception:
+        return ""
+    return str(obj.get("secret") or "").strip() if isinstance(obj, dict) else ""
 
 
-def _blocked_read_secret(final_u: str) -> str:
-    p = _blocked_path(final_u)
-    if not p.exists():
-        raise FileNotFoundError("blocked record not found")
-    obj = _read_json_file(p)
-    if not isinstance(obj, dict):
-        raise ValueError("invalid blocked record")
-    s = str(obj.get("secret") or "").strip()
-    if not s:
-        raise ValueError("blocked record missing secret")
-    return s
+def _blocked_legacy_remove(usernames: Iterable[str]) -> None:
+    for u in usernames:
+        try:
+            _blocked_path(u).unlink()
+        except Exception:
+            pass
 
 
-def _blocked_remove(final_u: str) -> None:
-    p = _blocked_path(final_u)
-    try:
-        if p.exists():
-            p.unlink()
-    except Exception:
-        pass
+def _blocked_now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
 def _find_secret_in_config(cfg: Dict[str, Any], proto: str, final_u: str) -> str:
-    inbounds = cfg.get("inbounds", [])
-    if not isinstance(inbounds, list):
+    return find_secret(cfg, proto, final_u)
+
+
+def _account_secret(cfg: Dict[str, Any], proto: str, final_u: str) -> str:
+    """UUID/Pass: account store dulu, lalu config, record blocked lama, terakhir parse detail .txt lama."""
+    secret = store.get_secret(final_u)
+    if secret:
+        return secret
+    secret = _find_secret_in_config(cfg, proto, final_u)
+    if secret:
+        return secret
+    secret = _blocked_legacy_secret(final_u)
+    if secret:
+        return secret
+    try:
+        return _extract_secret_from_detail_txt(_detail_txt_path(proto, final_u))
+    except Exception:
         return ""
-    protos = ("vless", "vmess", "trojan") if proto == "allproto" else (proto,)
-    for ib in inbounds:
-        if not isinstance(ib, dict):
+
+
+def _commit_blocked(
+    cfg: Dict[str, Any],
+    block: List[Tuple[str, str, str]],
+    unblock: List[Tuple[str, str, str]],
+    readded: List[str],
+    require_rule: bool = False,
+) -> Dict[str, Any]:
+    """
+    Satu transaksi block/unblock ((proto, final_u, secret) per user): rule routing "blocked"
+    diupdate sekali, satu save + satu apply, lalu status blocked di account store dalam satu
+    transaksi SQLite. `readded` = user yang client-nya sudah ditambah ulang ke config (unblock).
+    Return {"backup_generation", "applied"[, "note"]}, atau {"error"} jika require_rule dan rule tidak ada.
+    """
+    out: Dict[str, Any] = {}
+    upd = blocked_rule_update(cfg, add=[u for _, u, _ in block], remove=[u for _, u, _ in unblock])
+    if upd is None:
+        if require_rule:
+            return {"error": "blocked routing rule not found"}
+        out["note"] = "blocked routing rule not found"
+
+    out["backup_generation"] = save_config_with_backup(cfg)
+    out["applied"] = apply_changes(cfg, added=readded, routing=True)
+
+    at = _blocked_now()
+    store.upsert_many(
+        [(u, {"protocol": p, "secret": s, "blocked": True, "blocked_at": at}) for p, u, s in block]
+        + [(u, {"protocol": p, "secret": s, "blocked": False, "blocked_at": None}) for p, u, s in unblock]
+    )
+    _blocked_legacy_remove(u for _, u, _ in unblock)
+    return out
+
+
+def _is_blocked(cfg: Dict[str, Any], final_u: str, store_blocked: Set[str]) -> bool:
+    if final_u in store_blocked or final_u in blocked_users(cfg):
+        return True
+    return store.get(final_u) is None and _blocked_path(final_u).exists()
+
+
+def _set_blocked_many(req: Dict[str, Any], blocked: bool) -> Dict[str, Any]:
+    """block_many / unblock_many: semua user dalam satu perubahan config + satu apply routing."""
+    users, err = _batch_users(req)
+    if err:
+        return {"status": "error", "error": err}
+
+    cfg = load_config()
+    store_blocked = store.blocked_usernames()
+    results: List[Dict[str, Any]] = []
+    targets: List[Tuple[str, str, str]] = []
+    readded: List[str] = []
+    seen = set()
+
+    for u in users:
+        proto, final_u, err = _batch_target(u)
+        if not err and final_u in seen:
+            err = "duplicate user in batch"
+        if err:
+            results.append({"status": "error", "error": err, "username": final_u})
             continue
-        ibp = ib.get("protocol")
-        if ibp not in protos:
+        seen.add(final_u)
+        in_config = email_exists(cfg, final_u)
+        if blocked and not in_config:
+            results.append({"status": "error", "error": "user not found in config", "username": final_u})
             continue
-        settings = ib.get("settings")
-        if not isinstance(settings, dict):
+        if not blocked and not _is_blocked(cfg, final_u, store_blocked):
+            results.append({"status": "error", "error": "user is not blocked", "username": final_u})
             continue
-        clients = settings.get("clients")
-        if not isinstance(clients, list):
+        secret = _account_secret(cfg, proto, final_u)
+        if not secret:
+            results.append({"status": "error", "error": "cannot determine UUID/Pass", "username": final_u})
             continue
-        for c in clients:
-            if not isinstance(c, dict):
-                continue
-            if c.get("email") != final_u:
+        if not blocked and not in_config:
+            # client dihapus dari config oleh tool lama saat block: tambahkan lagi
+            err = _append_user(cfg, proto, final_u, secret)
+            if err:
+                _remove_user(cfg, proto, final_u)
+                results.append({"status": "error", "error": err, "username": final_u})
                 continue
-            if ibp in ("vless", "vmess"):
-                s = c.get("id")
-            else:
-                s = c.get("password")
-            s = str(s or "").strip()
-            if s:
-                return s
-    return ""
-
-
-def _find_blocked_rule(cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    routing = cfg.get("routing")
-    if not isinstance(routing, dict):
-        return None
-    rules = routing.get("rules")
-    if not isinstance(rules, list):
-        return None
+            readded.append(final_u)
+        results.append({"status": "ok", "username": final_u, "blocked": blocked})
+        targets.append((proto, final_u, secret))
 
-    # prefer rule that is explicitly marked with dummy-block-user
-    for r in rules:
-        if not isinstance(r, dict):
+    if not targets:
+        return _batch_response(results, None)
+
+    out = _commit_blocked(cfg, targets if blocked else [], [] if blocked else targets, readded)
+    resp = _batch_response(results, out["backup_generation"], out["applied"])
+    if out.get("note"):
+        resp["note"] = out["note"]
+    return resp
+
+
+def _detail_out(cfg: Dict[str, Any], proto: str, final_u: str, secret: str, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Detail akun untuk response: detail_text dirender on-demand (cache per version akun);
+    file .txt hanya ditulis jika DETAIL_FILES (ekspor kompatibilitas).
+    """
+    from .detail import account_detail, write_detail_file
+    row = store.get(final_u)
+    if row is None:
+        # akun belum ada di store: render dari metadata quota, tanpa cache
+        meta = meta or {}
+        row = {"username": final_u, "protocol": proto, "version": None, "secret": secret,
+               **{k: meta.get(k) for k in ("quota_limit", "created_at", "expired_at")}}
+    elif not row["secret"]:
+        row = {**row, "secret": secret}
+    text = account_detail(row, cfg)
+    out: Dict[str, Any] = {"detail_text": text, "filename": f"{final_u}.txt"}
+    if DETAIL_FILES:
+        out["detail_path"] = write_detail_file(proto, final_u, text)
+    return out
+
+
+def _parse_add_params(req: Dict[str, Any]):
+    """Return (days, quota_gb, None) atau (None, None, error)."""
+    try:
+        days = int(req.get("days", 0))
+    except Exception:
+        return None, None, "days must be integer"
+
+    try:
+        quota_gb = float(req.get("quota_gb", 0))
+    except Exception:
+        return None, None, "quota_gb must be number"
+
+    if days <= 0 or days > 3650:
+        return None, None, "days out of range (1..3650)"
+    if quota_gb < 0:
+        return None, None, "quota_gb must be >= 0"
+    return days, quota_gb, None
+
+
+def _append_user(cfg: Dict[str, Any], proto: str, final_u: str, secret: str) -> Optional[str]:
+    """Tambah client ke inbound; return pesan error atau None."""
+    if proto == "allproto":
+        n1 = append_client(cfg, "vless", final_u, secret)
+        n2 = append_client(cfg, "vmess", final_u, secret)
+        n3 = append_client(cfg, "trojan", final_u, secret)
+        if min(n1, n2, n3) == 0:
+            return "missing inbound for one of vless/vmess/trojan"
+    else:
+        n = append_client(cfg, proto, final_u, secret)
+        if n == 0:
+            return "no matching inbound found"
+    return None
+
+
+def _remove_user(cfg: Dict[str, Any], proto: str, final_u: str) -> int:
+    if proto == "allproto":
+        removed = remove_client(cfg, "vless", final_u)
+        removed += remove_client(cfg, "vmess", final_u)
+        removed += remove_client(cfg, "trojan", final_u)
+        return removed
+    return remove_client(cfg, proto, final_u)
+
+
+def _new_user_row(proto: str, final_u: str, secret: str, days: int, quota_gb: float):
+    created_at = date.today().isoformat()
+    expired_at = (date.today() + timedelta(days=days)).isoformat()
+    return final_u, {
+        "protocol": proto,
+        "secret": secret,
+        "quota_limit": _quota_bytes_from_gb(quota_gb),
+        "created_at": created_at,
+        "expired_at": expired_at,
+        "blocked": False,
+        "blocked_at": None,
+        "used_up": 0,
+        "used_down": 0,
+    }
+
+
+def _store_update_from_meta(
+    cfg: Dict[str, Any], proto: str, final_u: str, meta: Dict[str, Any], secret: str, **fields: Any
+) -> None:
+    """
+    Terapkan `fields` ke baris store akun. Akun lama yang hanya ada di /opt/quota (belum
+    ter-import) mendapat baris lengkap dari metadata quota + secret, seperti jalur add,
+    bukan baris setengah jadi tanpa secret/created_at. Tanpa secret: store tidak disentuh.
+    """
+    if store.update(final_u, **fields) or not secret:
+        return
+    try:
+        quota_limit = int(meta.get("quota_limit") or 0)
+    except (TypeError, ValueError):
+        quota_limit = 0
+    store.upsert(
+        final_u,
+        protocol=proto,
+        secret=secret,
+        quota_limit=quota_limit,
+        created_at=str(meta.get("created_at") or ""),
+        expired_at=str(meta.get("expired_at") or ""),
+        blocked=final_u in blocked_users(cfg),
+        blocked_at=None,
+    )
+
+
+def _write_new_user_quota(proto: str, final_u: str, days: int, quota_gb: float, created_at: str, expired_at: str) -> str:
+    if proto == "allproto":
+        write_quota("allproto", final_u, quota_gb, days, created_at, expired_at)
+        for p in ("vless", "vmess", "trojan"):
+            try:
+                lp = _quota_path(p, final_u)
+                if lp.exists():
+                    lp.unlink()
+            except Exception:
+                pass
+    else:
+        write_quota(proto, final_u, quota_gb, days, created_at, expired_at)
+    REGISTRY.invalidate(None if proto == "allproto" else proto)
+    return expired_at
+
+
+def _remove_user_files(proto: str, final_u: str) -> None:
+    def _rm(p: Path):
+        try:
+            if p.exists():
+                p.unlink()
+        except Exception:
+            pass
+
+    if proto == "allproto":
+        _rm(_quota_path("allproto", final_u))
+        _rm(_detail_txt_path("allproto", final_u))
+        for p in ("vless", "vmess", "trojan"):
+            _rm(_quota_path(p, final_u))
+            _rm(_detail_txt_path(p, final_u))
+    else:
+        _rm(_quota_path(proto, final_u))
+        _rm(_detail_txt_path(proto, final_u))
+    _blocked_legacy_remove((final_u,))
+    REGISTRY.invalidate(None if proto == "allproto" else proto)
+
+
+def _batch_users(req: Dict[str, Any]):
+    users = req.get("users")
+    if not isinstance(users, list) or not users:
+        return None, "users must be a non-empty list"
+    if len(users) > MAX_BATCH:
+        return None, f"too many users in one batch (max {MAX_BATCH})"
+    return users, None
+
+
+def _batch_target(u: Any):
+    """Validasi protocol/username satu entry batch; return (proto, final_u, error)."""
+    if not isinstance(u, dict):
+        return None, None, "entry must be an object"
+    proto = str(u.get("protocol") or "").strip().lower()
+    username = str(u.get("username") or "").strip()
+    if proto not in VALID_PROTO:
+        return None, None, "invalid protocol"
+    if not USERNAME_RE.match(username):
+        return None, None, "invalid username"
+    return proto, final_user(proto, username), None
+
+
+def _batch_response(results: List[Dict[str, Any]], backup_generation: Optional[int], applied: Optional[str] = None) -> Dict[str, Any]:
+    ok = sum(1 for r in results if r.get("status") == "ok")
+    resp = {
+        "status": "ok" if ok else "error",
+        "count": len(results),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "results": results,
+        "backup_generation": backup_generation,
+        "applied": applied,
+    }
+    if not ok:
+        resp["error"] = "no user applied"
+    return resp
+
+
+def _add_many(req: Dict[str, Any]) -> Dict[str, Any]:
+    users, err = _batch_users(req)
+    if err:
+        return {"status": "error", "error": err}
+
+    cfg = load_config()
+    results: List[Dict[str, Any]] = []
+    applied = []  # (index, proto, final_u, secret, days, quota_gb)
+    seen = set()
+
+    # validasi semua entry + apply ke config in-memory
+    for u in users:
+        proto, final_u, err = _batch_target(u)
+        if err:
+            results.append({"status": "error", "error": err, "username": final_u})
+            continue
+        days, quota_gb, err = _parse_add_params(u)
+        if err:
+            results.append({"status": "error", "error": err, "username": final_u})
+            continue
+        if final_u in seen or email_exists(cfg, final_u):
+            results.append({"status": "error", "error": "duplicate email", "username": final_u})
             continue
-        if r.get("outboundTag") == "blocked" and isinstance(r.get("user"), list):
-            if "dummy-block-user" in r.get("user"):
-                return r
 
-    # prefer rule that already has "user": [...]
-    for r in rules:
-        if not isinstance(r, dict):
+        secret = str(uuid4())
+        err = _append_user(cfg, proto, final_u, secret)
+        if err:
+            # append_client bisa sudah menambah ke sebagian inbound (allproto)
+            _remove_user(cfg, proto, final_u)
+            results.append({"status": "error", "error": err, "username": final_u})
             continue
-        if r.get("outboundTag") == "blocked" and isinstance(r.get("user"), list):
-            return r
 
-    # fallback: any blocked rule → ensure user list
-    for r in rules:
-        if not isinstance(r, dict):
+        seen.add(final_u)
+        results.append({"status": "ok", "username": final_u, "protocol": proto})
+        applied.append((len(results) - 1, proto, final_u, secret, days, quota_gb))
+
+    if not applied:
+        return _batch_response(results, None)
+
+    # satu kali tulis config + satu kali apply (API / restart) untuk seluruh batch
+    backup_generation = save_config_with_backup(cfg)
+    applied_via = apply_changes(cfg, added=[a[2] for a in applied])
+
+    rows = [_new_user_row(proto, final_u, secret, days, quota_gb) for _, proto, final_u, secret, days, quota_gb in applied]
+    store.upsert_many(rows)
+
+    if DETAIL_FILES:
+        from .detail import node_templates, render_detail_txt, write_detail_file
+        # facts + template link di-resolve sekali untuk seluruh batch
+        facts, tpl = node_templates(cfg)
+    for (idx, proto, final_u, secret, days, quota_gb), (_, row) in zip(applied, rows):
+        r = results[idx]
+        r["uuid"] = secret if proto != "trojan" else None
+        r["password"] = secret if proto == "trojan" else None
+        r["expired_at"] = row["expired_at"]
+        try:
+            _write_new_user_quota(proto, final_u, days, quota_gb, row["created_at"], row["expired_at"])
+            if DETAIL_FILES:
+                text = render_detail_txt(facts, tpl, proto, final_u, secret, days, quota_gb, row["created_at"])
+                r["detail_path"] = write_detail_file(proto, final_u, text)
+        except Exception as e:
+            r["note"] = f"metadata write failed: {e}"
+
+    return _batch_response(results, backup_generation, applied_via)
+
+
+def _del_many(req: Dict[str, Any]) -> Dict[str, Any]:
+    users, err = _batch_users(req)
+    if err:
+        return {"status": "error", "error": err}
+
+    cfg = load_config()
+    results: List[Dict[str, Any]] = []
+    removed_users = []
+
+    for u in users:
+        proto, final_u, err = _batch_target(u)
+        if err:
+            results.append({"status": "error", "error": err, "username": final_u})
+            continue
+        removed = _remove_user(cfg, proto, final_u)
+        if removed == 0:
+            results.append({"status": "error", "error": "user not found", "username": final_u})
             continue
-        if r.get("outboundTag") == "blocked":
-            if not isinstance(r.get("user"), list):
-                r["user"] = []
-            return r
+        results.append({"status": "ok", "username": final_u, "removed": removed})
+        removed_users.append((proto, final_u))
 
-    return None
+    if not removed_users:
+        return _batch_response(results, None)
 
+    # user yang dihapus juga keluar dari rule routing "blocked"
+    unblocked = blocked_rule_update(cfg, remove=[u for _, u in removed_users])
+    backup_generation = save_config_with_backup(cfg)
+    applied_via = apply_changes(
+        cfg,
+        removed={final_u: proto for proto, final_u in removed_users},
+        routing=bool(unblocked and unblocked[1]),
+    )
 
-def _blocked_rule_add(cfg: Dict[str, Any], final_u: str) -> bool:
-    r = _find_blocked_rule(cfg)
-    if not r:
-        return False
-    users = r.get("user")
-    if not isinstance(users, list):
-        users = []
-        r["user"] = users
-    if final_u not in users:
-        users.append(final_u)
-    return True
-
-
-def _blocked_rule_remove(cfg: Dict[str, Any], final_u: str) -> bool:
-    r = _find_blocked_rule(cfg)
-    if not r:
-        return False
-    users = r.get("user")
-    if not isinstance(users, list):
-        return True
-    r["user"] = [u for u in users if u != final_u]
-    return True
-
-
-def _journal_logs(unit: str, page: int, page_size: int) -> Dict[str, Any]:
-    # pagination sederhana: page=0 paling baru, page=1 lebih lama, dst.
-    if page < 0:
-        page = 0
-    if page_size < 5:
-        page_size = 5
-    if page_size > 80:
-        page_size = 80
-
-    n = (page + 1) * page_size
-
-    cmd = [
-        "journalctl",
-        "-u",
-        unit,
-        "--no-pager",
-        "--output=short-iso",
-        "-n",
-        str(n),
-    ]
+    from .detail import detail_locks
+    with detail_locks(u for _, u in removed_users):
+        for proto, final_u in removed_users:
+            _remove_user_files(proto, final_u)
+        store.delete_many([u for _, u in removed_users])
+
+    return _batch_response(results, backup_generation, applied_via)
+
+
+def _enforce_limits(dry_run: bool) -> Dict[str, Any]:
+    """
+    Block semua user yang melewati quota (usage >= quota_limit) atau sudah expired
+    (expired_at < hari ini) dalam satu transaksi config: satu save + satu apply.
+    """
+    t0 = time.monotonic()
+    cutoff = _expiry_cutoff(EXPIRE_GRACE_DAYS)
+    items = REGISTRY.items("all")
+
+    blocked = store.blocked_usernames()
+    used_map = used_by_user()
+    violators = []
+    already_blocked = 0
+    for it in items:
+        final_u = it["username"]
+        try:
+            limit = int(it.get("quota_limit") or 0)
+        except Exception:
+            limit = 0
+        used = used_map.get(final_u, 0)
+        exp = str(it.get("expired_at") or "")
+
+        reasons = []
+        if limit > 0 and used >= limit:
+            reasons.append("quota")
+        if exp and exp < cutoff:
+            reasons.append("expired")
+        if not reasons:
+            continue
+        if final_u in blocked:
+            already_blocked += 1
+            continue
+        violators.append({"username": final_u, "protocol": it["protocol"], "reasons": reasons, "used": used, "quota_limit": limit, "expired_at": exp})
+
+    result: Dict[str, Any] = {
+        "status": "ok",
+        "dry_run": dry_run,
+        "scanned": len(items),
+        "violators": len(violators),
+        "already_blocked": already_blocked,
+        "blocked": 0,
+        "users": violators,
+    }
+
+    if violators and not dry_run:
+        _block_users(violators, result)
+
+    result["elapsed_ms"] = int((time.monotonic() - t0) * 1000)
+    return result
+
+
+def _block_users(users: List[Dict[str, Any]], result: Dict[str, Any]) -> None:
+    """
+    Block semua `users` ({"username", "protocol"}) dalam satu transaksi config:
+    satu save + satu apply routing. Mengisi result["blocked"/"backup_generation"/"applied"].
+    """
+    cfg = load_config()
+    to_block = []
+    for v in users:
+        secret = _find_secret_in_config(cfg, v["protocol"], v["username"])
+        if not secret:
+            v["note"] = "user not found in config"
+            continue
+        to_block.append((v, secret))
+
+    if to_block:
+        out = _commit_blocked(cfg, [(v["protocol"], v["username"], s) for v, s in to_block], [], [], require_rule=True)
+        if "error" in out:
+            result["status"] = "error"
+            result["error"] = out["error"]
+            return
+        result["backup_generation"] = out["backup_generation"]
+        result["applied"] = out["applied"]
+        for v, _ in to_block:
+            v["blocked"] = True
+        result["blocked"] = len(to_block)
+
+
+def _expiry_cutoff(grace_days: int) -> str:
+    """Akun dengan expired_at < cutoff sudah lewat masa aktif (+ grace)."""
+    return (date.today() - timedelta(days=grace_days)).isoformat()
+
+
+def _next_expiry_at(grace_days: int) -> Optional[float]:
+    """
+    Epoch detik batas expiry berikutnya: tengah malam (waktu lokal) setelah
+    expired_at + grace dari akun berikutnya yang jatuh tempo. None jika tidak ada.
+    """
+    nxt = REGISTRY.next_expiry(_expiry_cutoff(grace_days))
+    if not nxt:
+        return None
     try:
-        out = subprocess.check_output(cmd, text=True, errors="replace")
-    except subprocess.CalledProcessError as e:
-        return {"status": "error", "error": f"journalctl failed: {e}"}
-    except FileNotFoundError:
-        return {"status": "error", "error": "journalctl not found"}
-
-    lines = [ln for ln in out.splitlines() if ln.strip()]
-    if len(lines) <= page_size:
-        seg = lines
-    else:
-        seg = lines[:page_size]
+        due = date.fromisoformat(nxt) + timedelta(days=grace_days + 1)
+    except ValueError:
+        return None
+    return datetime.combine(due, datetime.min.time()).timestamp()
+
+
+def _expire_accounts(req: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Proses semua akun yang sudah lewat expired_at (+ grace): block atau hapus,
+    semuanya dalam satu perubahan config. Response membawa next_at untuk scheduler.
+    """
+    t0 = time.monotonic()
+    mode = str(req.get("mode") or EXPIRE_MODE).strip().lower()
+    if not req.get("mode") and mode == "off":
+        return {"status": "error", "error": "mode required (EXPIRE_MODE is off)"}
+    if mode not in ("block", "delete"):
+        return {"status": "error", "error": "mode must be block or delete"}
+    try:
+        grace = int(req.get("grace_days", EXPIRE_GRACE_DAYS))
+    except Exception:
+        return {"status": "error", "error": "grace_days must be integer"}
+    if grace < 0 or grace > 3650:
+        return {"status": "error", "error": "grace_days out of range (0..3650)"}
+    dry_run = bool(req.get("dry_run"))
+
+    cutoff = _expiry_cutoff(grace)
+    blocked = store.blocked_usernames() if mode == "block" else set()
+    due = []
+    already_blocked = 0
+    for it in REGISTRY.expiring_before(cutoff):
+        if it["username"] in blocked:
+            already_blocked += 1
+            continue
+        due.append({"username": it["username"], "protocol": it["protocol"], "expired_at": it["expired_at"]})
+
+    result: Dict[str, Any] = {
+        "status": "ok",
+        "mode": mode,
+        "dry_run": dry_run,
+        "grace_days": grace,
+        "cutoff": cutoff,
+        "due": len(due),
+        "already_blocked": already_blocked,
+        "blocked": 0,
+        "deleted": 0,
+        "users": due,
+    }
 
-    has_more = (len(lines) == n)
-    text = "\n".join(seg)
-    return {"status": "ok", "unit": unit, "page": page, "page_size": page_size, "has_more": has_more, "text": text}
+    if due and not dry_run:
+        if mode == "block":
+            _block_users(due, result)
+        else:
+            for i in range(0, len(due), MAX_BATCH):
+                part = due[i: i + MAX_BATCH]
+                resp = _del_many({"users": [
+                    {"protocol": v["protocol"], "username": v["username"].rsplit("@", 1)[0]} for v in part
+                ]})
+                for v, r in zip(part, resp["results"]):
+                    if r.get("status") == "ok":
+                        v["deleted"] = True
+                    else:
+                        v["note"] = r.get("error")
+                result["deleted"] += resp["ok"]
+                result["backup_generation"] = resp.get("backup_generation") or result.get("backup_generation")
+                result["applied"] = resp.get("applied") or result.get("applied")
+
+    result["next_at"] = _next_expiry_at(grace)
+    result["elapsed_ms"] = int((time.monotonic() - t0) * 1000)
+    return result
+
+
+ACTIONS = frozenset({
+    "add", "del", "ping", "status", "list",
+    "logs",
+    "renew",
+    "quota_get", "quota_set",
+    "block_get", "block",
+    "detail", "get_detail",  # ✅ fix /accounts: ambil ulang detail
+    "render_detail",
+    "add_many", "del_many",
+    "block_many", "unblock_many",
+    "enforce",
+    "store_import", "store_export",
+    "facts",
+    "summary",
+    "config_backups", "config_rollback",
+    "export",
+    "regen_details",
+    "expire",
+    "metrics",
+})
 
 
 def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
+    """Eksekusi satu request; count/error/latency dicatat per action di metrics."""
     action = (req.get("action") or "").strip().lower()
+    t0 = time.perf_counter()
+    resp = None
+    try:
+        resp = _handle_action(action, req)
+        return resp
+    finally:
+        label = action if action in ACTIONS else "unsupported"
+        ok = isinstance(resp, dict) and resp.get("status") == "ok"
+        metrics.observe_action(label, time.perf_counter() - t0, ok)
+
 
-    if action not in (
-        "add", "del", "ping", "status", "list",
-        "logs",
-        "renew",
-        "quota_get", "quota_set",
-        "block_get", "block",
-        "detail", "get_detail",  # ✅ fix /accounts: ambil ulang detail
-    ):
+def _handle_action(action: str, req: Dict[str, Any]) -> Dict[str, Any]:
+    if action not in ACTIONS:
         return {"status": "error", "error": "unsupported action"}
 
     # --- lightweight actions ---
@@ -279,7 +745,8 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         return {"status": "ok"}
 
     if action == "status":
-        return {"status": "ok", "xray": svc_state("xray"), "nginx": svc_state("nginx")}
+        units = units_state(("xray", "nginx"))
+        return {"status": "ok", "xray": units["xray"], "nginx": units["nginx"]}
 
     if action == "list":
         proto_filter = str(req.get("protocol") or "all").strip().lower()
@@ -297,21 +764,74 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         if offset < 0:
             offset = 0
 
-        items = scan_quota_items(proto_filter)
-        total = len(items)
-        page = items[offset: offset + limit]
-        has_more = (offset + limit) < total
+        q = str(req.get("q") or "").strip()
+        if len(q) > 64:
+            return {"status": "error", "error": "q too long (max 64)"}
+        match = str(req.get("match") or "substring").strip().lower()
+        if match not in ("prefix", "substring"):
+            return {"status": "error", "error": "match must be prefix or substring"}
+
+        status_filter = str(req.get("filter") or "").strip().lower()
+        only = None
+        expiring_days = None
+        if status_filter == "blocked":
+            only = store.blocked_usernames()
+        elif status_filter == "near_limit":
+            only = store.near_limit_usernames(NEAR_LIMIT_RATIO)
+        elif status_filter == "expiring":
+            expiring_days = safe_int(req.get("days"), 7)
+            if expiring_days < 0 or expiring_days > 3650:
+                return {"status": "error", "error": "days out of range (0..3650)"}
+        elif status_filter:
+            return {"status": "error", "error": "filter must be blocked, near_limit or expiring"}
+
+        try:
+            pg = REGISTRY.page(
+                proto_filter,
+                offset,
+                limit,
+                cursor=req.get("cursor"),
+                before=req.get("before"),
+                q=q,
+                match=match,
+                only=only,
+                expiring_days=expiring_days,
+            )
+        except ValueError as e:
+            return {"status": "error", "error": str(e)}
+        rows = store.get_many(it["username"] for it in pg["items"])
+        for it in pg["items"]:
+            row = rows.get(it["username"]) or {}
+            it["used"] = int(row.get("used") or 0)
+            it["blocked"] = bool(row.get("blocked"))
 
         return {
             "status": "ok",
             "protocol": proto_filter,
-            "offset": offset,
+            "q": q,
+            "filter": status_filter or None,
+            "offset": pg["offset"],
             "limit": limit,
-            "total": total,
-            "has_more": has_more,
-            "items": page,
+            "total": pg["total"],
+            "has_more": pg["has_more"],
+            "next_cursor": pg["next_cursor"],
+            "prev_cursor": pg["prev_cursor"],
+            "start_cursor": pg["start_cursor"],
+            "items": pg["items"],
         }
 
+    if action == "facts":
+        return {"status": "ok", **get_facts(refresh=bool(req.get("refresh")))}
+
+    if action == "summary":
+        # agregat dari tabel ringkasan account store (trigger), bukan scan semua akun
+        return {"status": "ok", "near_limit_ratio": NEAR_LIMIT_RATIO, **store.summary()}
+
+    if action == "metrics":
+        if str(req.get("format") or "").lower() == "prometheus":
+            return {"status": "ok", "format": "prometheus", "text": metrics.render_prometheus()}
+        return {"status": "ok", **metrics.snapshot()}
+
     if action == "logs":
         unit_in = str(req.get("unit") or req.get("service") or "xray").strip().lower()
         unit_map = {
@@ -324,9 +844,71 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         }
         unit = unit_map.get(unit_in, unit_in)
 
-        page = safe_int(req.get("page"), 0)
+        try:
+            priority = parse_priority(req.get("priority"))
+        except ValueError as e:
+            return {"status": "error", "error": str(e)}
+        direction = str(req.get("direction") or "latest").strip().lower()
+        cursor = str(req.get("cursor") or "")
         page_size = safe_int(req.get("page_size"), 25)
-        return _journal_logs(unit, page, page_size)
+        return journal_page(unit, direction, cursor, page_size, priority)
+
+    # --- batch add/del: satu kali save config + satu kali restart ---
+    if action == "add_many":
+        return _add_many(req)
+
+    if action == "del_many":
+        return _del_many(req)
+
+    if action in ("block_many", "unblock_many"):
+        return _set_blocked_many(req, action == "block_many")
+
+    # --- quota/expiry enforcement (juga dipanggil berkala oleh server) ---
+    if action == "enforce":
+        return _enforce_limits(bool(req.get("dry_run")))
+
+    # --- account store (SQLite) migrasi/ekspor file lama ---
+    if action == "store_import":
+        res = store.import_legacy()
+        return {"status": "ok", **res}
+
+    if action == "store_export":
+        res = store.export_legacy()
+        REGISTRY.invalidate()
+        return {"status": "ok", **res}
+
+    if action == "expire":
+        return _expire_accounts(req)
+
+    if action == "export":
+        # di-stream per chunk oleh server (export.stream_export), bukan satu response besar
+        return {"status": "error", "error": "export is a streaming action (use the socket server or CLI)"}
+
+    if action == "regen_details":
+        # server men-stream frame progress; in-process cukup frame terakhir (ringkasan/error)
+        from .regen import stream_regen
+        last: Dict[str, Any] = {"status": "error", "error": "regen produced no result"}
+        for frame in stream_regen(req):
+            last = frame
+        last.pop("done", None)
+        return last
+
+    # --- riwayat config.json ---
+    if action == "config_backups":
+        return {"status": "ok", "backups": list_backups()}
+
+    if action == "config_rollback":
+        # hanya config.json yang dikembalikan; account store/quota tidak ikut
+        gen = req.get("generation")
+        try:
+            gen, cfg = read_backup(None if gen in (None, "") else int(gen))
+        except (TypeError, ValueError) as e:
+            return {"status": "error", "error": f"invalid backup: {e}"}
+        except FileNotFoundError as e:
+            return {"status": "error", "error": str(e)}
+        backup_generation = save_config_with_backup(cfg)
+        applied = apply_changes(cfg)
+        return {"status": "ok", "generation": gen, "backup_generation": backup_generation, "applied": applied}
 
     # --- actions that need protocol/username ---
     proto = (req.get("protocol") or "").strip().lower()
@@ -340,11 +922,17 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
     final_u = final_user(proto, username)
 
     if action == "block_get":
-        st = _blocked_get(final_u)
+        acc = store.get(final_u)
+        if acc is not None:
+            st = {"blocked": acc["blocked"]}
+            if acc["blocked"]:
+                st.update({"blocked_at": acc["blocked_at"], "protocol": acc["protocol"]})
+        else:
+            st = _blocked_get(final_u)
         return {"status": "ok", "username": final_u, **st}
 
-    # load config once for remaining actions
-    cfg = load_config()
+    # load config once for remaining actions (reader: snapshot yang tidak dimutasi writer)
+    cfg = config_snapshot() if action in READ_ACTIONS else load_config()
 
     # ✅ detail/get_detail: regen detail TXT pakai quota metadata + secret
     if action in ("detail", "get_detail"):
@@ -358,75 +946,54 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         if not exp:
             return {"status": "error", "error": "expired_at missing in metadata", "username": final_u}
 
-        quota_gb = _quota_gb_from_bytes(meta.get("quota_limit"))
-        days_remaining = _calc_days_remaining(exp)
-
-        # prefer parse from existing detail txt; fallback scan config
-        try:
-            secret = _extract_secret_from_detail_txt(_detail_txt_path(proto, final_u))
-        except Exception:
-            secret = _find_secret_in_config(cfg, proto, final_u)
+        secret = _account_secret(cfg, proto, final_u)
+        if not secret:
+            return {"status": "error", "error": "cannot determine UUID/Pass", "username": final_u}
+
+        return {"status": "ok", "username": final_u, "expired_at": exp, **_detail_out(cfg, proto, final_u, secret, meta)}
+
+    # render_detail: teks detail (format=text) atau link polos untuk QR (format=links), tanpa disk
+    if action == "render_detail":
+        fmt = str(req.get("format") or "text").strip().lower()
+        if fmt not in ("text", "links"):
+            return {"status": "error", "error": "format must be text or links"}
+        row = store.get(final_u)
+        if row is None:
+            return {"status": "error", "error": "account not found", "username": final_u}
+        if not row["secret"]:
+            secret = _account_secret(cfg, proto, final_u)
             if not secret:
                 return {"status": "error", "error": "cannot determine UUID/Pass", "username": final_u}
+            row = {**row, "secret": secret}
 
-        from .detail import write_detail_txt
-        detail_txt_path = write_detail_txt(cfg, proto, final_u, secret, days_remaining, quota_gb)
-
-        return {"status": "ok", "username": final_u, "expired_at": exp, "detail_path": detail_txt_path}
+        from .detail import account_detail, account_links
+        out = {"status": "ok", "username": final_u, "protocol": row["protocol"], "version": row["version"]}
+        if fmt == "links":
+            return {**out, "links": account_links(row, cfg)}
+        return {**out, "expired_at": row["expired_at"], "detail_text": account_detail(row, cfg), "filename": f"{final_u}.txt"}
 
     # --- add ---
     if action == "add":
-        try:
-            days = int(req.get("days", 0))
-        except Exception:
-            return {"status": "error", "error": "days must be integer"}
-
-        try:
-            quota_gb = float(req.get("quota_gb", 0))
-        except Exception:
-            return {"status": "error", "error": "quota_gb must be number"}
-
-        if days <= 0 or days > 3650:
-            return {"status": "error", "error": "days out of range (1..3650)"}
-        if quota_gb < 0:
-            return {"status": "error", "error": "quota_gb must be >= 0"}
+        days, quota_gb, err = _parse_add_params(req)
+        if err:
+            return {"status": "error", "error": err}
 
         if email_exists(cfg, final_u):
             return {"status": "error", "error": "duplicate email", "username": final_u}
 
         secret = str(uuid4())
 
-        if proto == "allproto":
-            n1 = append_client(cfg, "vless", final_u, secret)
-            n2 = append_client(cfg, "vmess", final_u, secret)
-            n3 = append_client(cfg, "trojan", final_u, secret)
-            if min(n1, n2, n3) == 0:
-                return {"status": "error", "error": "missing inbound for one of vless/vmess/trojan"}
-        else:
-            n = append_client(cfg, proto, final_u, secret)
-            if n == 0:
-                return {"status": "error", "error": "no matching inbound found"}
-
-        backup_path = save_config_with_backup(cfg)
-        restart_xray()
-
-        created_at = date.today().isoformat()
-        expired_at = (date.today() + timedelta(days=days)).isoformat()
-
-        if proto == "allproto":
-            write_quota("allproto", final_u, quota_gb, days, created_at, expired_at)
-            for p in ("vless", "vmess", "trojan"):
-                try:
-                    lp = _quota_path(p, final_u)
-                    if lp.exists():
-                        lp.unlink()
-                except Exception:
-                    pass
-        else:
-            write_quota(proto, final_u, quota_gb, days, created_at, expired_at)
+        err = _append_user(cfg, proto, final_u, secret)
+        if err:
+            return {"status": "error", "error": err}
 
-        from .detail import write_detail_txt
-        detail_txt_path = write_detail_txt(cfg, proto, final_u, secret, days, quota_gb)
+        backup_generation = save_config_with_backup(cfg)
+        applied = apply_changes(cfg, added=[final_u])
+
+        _, row = _new_user_row(proto, final_u, secret, days, quota_gb)
+        store.upsert(final_u, **row)
+        expired_at = row["expired_at"]
+        _write_new_user_quota(proto, final_u, days, quota_gb, row["created_at"], expired_at)
 
         return {
             "status": "ok",
@@ -435,46 +1002,30 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
             "uuid": secret if proto != "trojan" else None,
             "password": secret if proto == "trojan" else None,
             "expired_at": expired_at,
-            "detail_path": detail_txt_path,
-            "backup_path": backup_path,
+            **_detail_out(cfg, proto, final_u, secret),
+            "backup_generation": backup_generation,
+            "applied": applied,
         }
 
     # --- del ---
     if action == "del":
-        removed = 0
-        if proto == "allproto":
-            removed += remove_client(cfg, "vless", final_u)
-            removed += remove_client(cfg, "vmess", final_u)
-            removed += remove_client(cfg, "trojan", final_u)
-        else:
-            removed = remove_client(cfg, proto, final_u)
+        removed = _remove_user(cfg, proto, final_u)
 
         if removed == 0:
             return {"status": "error", "error": "user not found", "username": final_u}
 
-        backup_path = save_config_with_backup(cfg)
-        restart_xray()
+        # user yang dihapus juga keluar dari rule routing "blocked"
+        unblocked = blocked_rule_update(cfg, remove=(final_u,))
+        backup_generation = save_config_with_backup(cfg)
+        applied = apply_changes(cfg, removed={final_u: proto}, routing=bool(unblocked and unblocked[1]))
 
-        def _rm(p: Path):
-            try:
-                if p.exists():
-                    p.unlink()
-            except Exception:
-                pass
+        from .detail import detail_lock
+        # file + baris store dihapus bersama: regen_details tidak menulis ulang file user ini
+        with detail_lock(final_u):
+            _remove_user_files(proto, final_u)
+            store.delete(final_u)
 
-        if proto == "allproto":
-            _rm(_quota_path("allproto", final_u))
-            _rm(_detail_txt_path("allproto", final_u))
-            for p in ("vless", "vmess", "trojan"):
-                _rm(_quota_path(p, final_u))
-                _rm(_detail_txt_path(p, final_u))
-            _blocked_remove(final_u)
-        else:
-            _rm(_quota_path(proto, final_u))
-            _rm(_detail_txt_path(proto, final_u))
-            _blocked_remove(final_u)
-
-        return {"status": "ok", "username": final_u, "removed": removed, "backup_path": backup_path}
+        return {"status": "ok", "username": final_u, "removed": removed, "backup_generation": backup_generation, "applied": applied}
 
     # --- renew ---
     if action == "renew":
@@ -501,15 +1052,14 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         meta["expired_at"] = new_exp
 
         _write_json_atomic(qp, meta)
+        REGISTRY.invalidate(proto)
 
-        secret = _extract_secret_from_detail_txt(_detail_txt_path(proto, final_u))
-        quota_gb = _quota_gb_from_bytes(meta.get("quota_limit"))
-        days_remaining = _calc_days_remaining(new_exp)
-
-        from .detail import write_detail_txt
-        detail_txt_path = write_detail_txt(cfg, proto, final_u, secret, days_remaining, quota_gb)
+        secret = _account_secret(cfg, proto, final_u)
+        _store_update_from_meta(cfg, proto, final_u, meta, secret, expired_at=new_exp)
+        if not secret:
+            return {"status": "error", "error": "cannot determine UUID/Pass", "username": final_u}
 
-        return {"status": "ok", "username": final_u, "expired_at": new_exp, "detail_path": detail_txt_path}
+        return {"status": "ok", "username": final_u, "expired_at": new_exp, **_detail_out(cfg, proto, final_u, secret, meta)}
 
     # --- quota_get / quota_set ---
     if action == "quota_get":
@@ -524,6 +1074,7 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
             "protocol": proto,
             "quota_limit": qb,
             "quota_gb": _quota_gb_from_bytes(qb),
+            **get_usage(final_u),
             "expired_at": meta.get("expired_at"),
             "created_at": meta.get("created_at"),
         }
@@ -543,89 +1094,34 @@ def handle_action(req: Dict[str, Any]) -> Dict[str, Any]:
         meta = _read_json_file(qp)
         meta["quota_limit"] = _quota_bytes_from_gb(quota_gb)
         _write_json_atomic(qp, meta)
+        REGISTRY.invalidate(proto)
 
-        secret = _extract_secret_from_detail_txt(_detail_txt_path(proto, final_u))
-        exp = str(meta.get("expired_at") or "").strip()
-        days_remaining = _calc_days_remaining(exp)
-
-        from .detail import write_detail_txt
-        detail_txt_path = write_detail_txt(cfg, proto, final_u, secret, days_remaining, quota_gb)
+        secret = _account_secret(cfg, proto, final_u)
+        _store_update_from_meta(cfg, proto, final_u, meta, secret, quota_limit=meta["quota_limit"])
+        if not secret:
+            return {"status": "error", "error": "cannot determine UUID/Pass", "username": final_u}
 
-        return {"status": "ok", "username": final_u, "quota_gb": quota_gb, "detail_path": detail_txt_path}
+        return {"status": "ok", "username": final_u, "quota_gb": quota_gb, **_detail_out(cfg, proto, final_u, secret, meta)}
 
-    # --- block/unblock ---
+    # --- block/unblock (satu user; jalur yang sama dengan block_many/unblock_many) ---
     if action == "block":
         op = str(req.get("op") or req.get("mode") or "").strip().lower()
         if op not in ("block", "unblock"):
             return {"status": "error", "error": "invalid op (block/unblock)"}
 
-        if op == "block":
-            if not email_exists(cfg, final_u):
-                return {"status": "error", "error": "user not found in config", "username": final_u}
-
-            # get secret for bookkeeping (prefer config, fallback detail file)
-            secret = _find_secret_in_config(cfg, proto, final_u)
-            if not secret:
-                secret = _extract_secret_from_detail_txt(_detail_txt_path(proto, final_u))
-
-            # ✅ add to routing blocked users (best-effort)
-            note = None
-            if not _blocked_rule_add(cfg, final_u):
-                note = "blocked routing rule not found"
-
-            backup_path = save_config_with_backup(cfg)
-            restart_xray()
-
-            _blocked_write(final_u, proto, secret)
-            resp = {"status": "ok", "username": final_u, "blocked": True, "backup_path": backup_path}
-            if note:
-                resp["note"] = note
-            return resp
-
-        # unblock
-        try:
-            secret = _blocked_read_secret(final_u)
-        except Exception as e:
-            return {"status": "error", "error": f"blocked record missing: {e}", "username": final_u}
-
-        if email_exists(cfg, final_u):
-            # remove from routing blocked users (best-effort)
-            note = None
-            if not _blocked_rule_remove(cfg, final_u):
-                note = "blocked routing rule not found"
-
-            backup_path = save_config_with_backup(cfg)
-            restart_xray()
-            _blocked_remove(final_u)
-
-            resp = {"status": "ok", "username": final_u, "blocked": False, "backup_path": backup_path}
-            if note:
-                resp["note"] = note
-            return resp
-
-        if proto == "allproto":
-            n1 = append_client(cfg, "vless", final_u, secret)
-            n2 = append_client(cfg, "vmess", final_u, secret)
-            n3 = append_client(cfg, "trojan", final_u, secret)
-            if min(n1, n2, n3) == 0:
-                return {"status": "error", "error": "missing inbound for one of vless/vmess/trojan"}
-        else:
-            n = append_client(cfg, proto, final_u, secret)
-            if n == 0:
-                return {"status": "error", "error": "no matching inbound found"}
-
-        # ✅ remove from routing blocked users (best-effort)
-        note = None
-        if not _blocked_rule_remove(cfg, final_u):
-            note = "blocked routing rule not found"
-
-        backup_path = save_config_with_backup(cfg)
-        restart_xray()
-        _blocked_remove(final_u)
-
-        resp = {"status": "ok", "username": final_u, "blocked": False, "backup_path": backup_path}
-        if note:
-            resp["note"] = note
+        res = _set_blocked_many({"users": [{"protocol": proto, "username": username}]}, op == "block")
+        r = res["results"][0]
+        if r.get("status") != "ok":
+            return {"status": "error", "error": r.get("error"), "username": final_u}
+        resp = {
+            "status": "ok",
+            "username": final_u,
+            "blocked": op == "block",
+            "backup_generation": res["backup_generation"],
+            "applied": res["applied"],
+        }
+        if res.get("note"):
+            resp["note"] = res["note"]
         return resp
 
     return {"status": "error", "error": "unreachable"}
\ No newline at end of file
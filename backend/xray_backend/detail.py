@@ -1,13 +1,19 @@
 import json
 import subprocess
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .constants import DETAIL_BASE
-from .nginx_conf import read_domain_from_nginx_conf, read_public_port_from_nginx_conf
-from .network import get_public_ip
-from .links import collect_inbounds, build_links_for_vless, build_links_for_vmess, build_links_for_trojan
+from .constants import DETAIL_BASE, DETAIL_CACHE_SIZE
+from .facts import get_facts
+from .io_utils import atomic_write
+from .links import SECTIONS, LinkTemplates, get_templates
+from .xray_config import config_snapshot, inbounds_key
+from .metrics import timed
 
 def fmt_quota_gb(quota_gb: float) -> str:
     if quota_gb <= 0:
@@ -20,8 +26,9 @@ def write_detail_json(proto: str, final_u: str, secret: str, days: int, quota_gb
     base = DETAIL_BASE["allproto"] if proto == "allproto" else DETAIL_BASE[proto]
     base.mkdir(parents=True, exist_ok=True)
 
-    domain = read_domain_from_nginx_conf()
-    ip = get_public_ip()
+    facts = get_facts()
+    domain = facts["domain"]
+    ip = facts["public_ip"]
 
     expired_at = (date.today() + timedelta(days=days)).isoformat()
     created_at = datetime.now().strftime("%a %b %e %H:%M:%S %Z %Y")
@@ -44,66 +51,174 @@ def write_detail_json(proto: str, final_u: str, secret: str, days: int, quota_gb
     p.write_text(json.dumps(detail, indent=2) + "\n", encoding="utf-8")
     return str(p)
 
-def write_detail_txt(cfg: Dict[str, Any], proto: str, final_user: str, secret: str, days: int, quota_gb: float) -> str:
-    domain = read_domain_from_nginx_conf()
-    ipaddr = get_public_ip()
-    public_port = read_public_port_from_nginx_conf(443)
-
-    valid_until = (date.today() + timedelta(days=days)).isoformat()
-
+def created_stamp() -> str:
     try:
         created = datetime.now().strftime("%a %b %d %H:%M:%S %Z %Y").strip()
         if not created:
             created = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
     except Exception:
         created = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-
-    quota_str = fmt_quota_gb(quota_gb)
-
-    vless_items = collect_inbounds(cfg, "vless")
-    vmess_items = collect_inbounds(cfg, "vmess")
-    trojan_items = collect_inbounds(cfg, "trojan")
+    return created
+
+def node_templates(cfg: Dict[str, Any], facts: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], LinkTemplates]:
+    """Host facts + template link node (dikompilasi sekali, dipakai ulang selama domain/port/inbound sama)."""
+    facts = facts or get_facts()
+    return facts, get_templates(facts["domain"], facts["public_port"], inbounds_key(cfg))
+
+def render_detail_txt(
+    facts: Dict[str, Any],
+    tpl: LinkTemplates,
+    proto: str,
+    final_user: str,
+    secret: str,
+    days: int,
+    quota_gb: float,
+    created: Optional[str] = None,
+) -> str:
+    valid_until = (date.today() + timedelta(days=days)).isoformat()
 
     lines: List[str] = []
     lines.append("=" * 50)
     lines.append(f"{('XRAY ACCOUNT DETAIL (' + proto + ')'):^50}")
     lines.append("=" * 50)
-    lines.append(f"Domain     : {domain}")
-    lines.append(f"IP         : {ipaddr}")
+    lines.append(f"Domain     : {facts['domain']}")
+    lines.append(f"IP         : {facts['public_ip']}")
     lines.append(f"Username   : {final_user}")
     lines.append(f"UUID/Pass  : {secret}")
-    lines.append(f"QuotaLimit : {quota_str}")
+    lines.append(f"QuotaLimit : {fmt_quota_gb(quota_gb)}")
     lines.append(f"Expired    : {days} Hari")
     lines.append(f"ValidUntil : {valid_until}")
-    lines.append(f"Created    : {created}")
+    lines.append(f"Created    : {created or created_stamp()}")
     lines.append("=" * 50)
 
-    if proto == "vless":
-        lines.append("[VLESS]")
-        lines.extend(build_links_for_vless(domain, final_user, secret, vless_items, public_port))
-    elif proto == "vmess":
-        lines.append("[VMESS]")
-        lines.extend(build_links_for_vmess(domain, final_user, secret, vmess_items, public_port))
-    elif proto == "trojan":
-        lines.append("[TROJAN]")
-        lines.extend(build_links_for_trojan(domain, final_user, secret, trojan_items, public_port))
-    else:
-        lines.append("[VLESS]")
-        lines.extend(build_links_for_vless(domain, final_user, secret, vless_items, public_port))
-        lines.append("-" * 50)
-        lines.append("[VMESS]")
-        lines.extend(build_links_for_vmess(domain, final_user, secret, vmess_items, public_port))
-        lines.append("-" * 50)
-        lines.append("[TROJAN]")
-        lines.extend(build_links_for_trojan(domain, final_user, secret, trojan_items, public_port))
+    for i, (title, links) in enumerate(tpl.sections(proto, final_user, secret)):
+        if i:
+            lines.append("-" * 50)
+        lines.append(f"[{title}]")
+        lines.extend(links)
 
     lines.append("-" * 50)
     lines.append("=" * 50)
+    return "\n".join(lines) + "\n"
+
+# File .txt ditulis writer (add/renew/quota_set, DETAIL_FILES) dan regen_details (reader
+# thread). Tulis/hapus file detail satu akun memegang lock akun tsb (lock di-stripe per
+# username), jadi regen dan writer hanya saling tunggu untuk akun yang sama.
+_detail_locks = tuple(threading.Lock() for _ in range(64))
+
+
+def _stripe(username: str) -> int:
+    return zlib.crc32(username.encode("utf-8")) % len(_detail_locks)
+
 
-    content = "\n".join(lines) + "\n"
+def detail_lock(username: str) -> threading.Lock:
+    return _detail_locks[_stripe(username)]
 
+
+@contextmanager
+def detail_locks(usernames: Iterable[str]) -> Iterator[None]:
+    """Pegang lock detail banyak akun sekaligus (diambil urut stripe: bebas deadlock)."""
+    locks = [_detail_locks[i] for i in sorted({_stripe(u) for u in usernames})]
+    for lk in locks:
+        lk.acquire()
+    try:
+        yield
+    finally:
+        for lk in reversed(locks):
+            lk.release()
+
+
+def detail_txt_path(proto: str, final_user: str) -> Path:
     base = DETAIL_BASE["allproto"] if proto == "allproto" else DETAIL_BASE[proto]
-    base.mkdir(parents=True, exist_ok=True)
-    out = base / f"{final_user}.txt"
-    out.write_text(content, encoding="utf-8")
+    return base / f"{final_user}.txt"
+
+@timed("detail_write")
+def write_detail_file(proto: str, final_user: str, content: str) -> str:
+    out = detail_txt_path(proto, final_user)
+    with detail_lock(final_user):
+        # berbagi file dengan regen_details: crash di tengah tulis tidak meninggalkan .txt terpotong
+        atomic_write(out, content.encode("utf-8"), 0o644, 0, 0)
     return str(out)
+
+def write_detail_txt(cfg: Dict[str, Any], proto: str, final_user: str, secret: str, days: int, quota_gb: float) -> str:
+    facts, tpl = node_templates(cfg)
+    return write_detail_file(proto, final_user, render_detail_txt(facts, tpl, proto, final_user, secret, days, quota_gb))
+
+
+def days_remaining(expired_at: str, today: Optional[date] = None) -> int:
+    try:
+        return max(0, (date.fromisoformat(expired_at) - (today or date.today())).days)
+    except ValueError:
+        return 0
+
+
+# --- render on-demand dari account store ---
+#
+# Isi detail hanya bergantung pada baris akun (berubah -> version naik), template node
+# (domain/port/inbound), IP publik dan tanggal hari ini (sisa hari). Semua itu masuk key
+# cache, jadi entry lama tidak pernah dipakai lagi dan cukup tergusur oleh LRU.
+# version mulai lagi dari 1 jika akun dihapus lalu dibuat ulang dengan nama sama, jadi
+# secret + created_at ikut di key agar entry akun lama tidak tertukar dengan akun baru.
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+
+
+def _cached(key: Tuple, build):
+    with _cache_lock:
+        v = _cache.get(key)
+        if v is not None:
+            _cache.move_to_end(key)
+            return v
+    v = build()
+    with _cache_lock:
+        _cache[key] = v
+        while len(_cache) > DETAIL_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return v
+
+
+@timed("detail_render")
+def account_detail(
+    row: Dict[str, Any],
+    cfg: Optional[Dict[str, Any]] = None,
+    facts: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Teks XRAY ACCOUNT DETAIL satu akun (baris account store), tanpa menyentuh disk."""
+    facts, tpl = node_templates(cfg if cfg is not None else config_snapshot(), facts)
+    today = date.today()
+    username = row["username"]
+    key = ("text", username, row.get("version"), row["secret"], row.get("created_at"), tpl.key, facts["public_ip"], today)
+
+    def build() -> str:
+        quota = int(row.get("quota_limit") or 0)
+        return render_detail_txt(
+            facts,
+            tpl,
+            row["protocol"],
+            username,
+            row["secret"],
+            days_remaining(str(row.get("expired_at") or ""), today),
+            quota / 1073741824.0 if quota > 0 else 0.0,
+            str(row.get("created_at") or "") or None,
+        )
+
+    if row.get("version") is None:
+        return build()
+    return _cached(key, build)
+
+
+def account_links(row: Dict[str, Any], cfg: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """Link polos per protokol/transport ({protocol, transport, url}), siap dijadikan QR code."""
+    _, tpl = node_templates(cfg if cfg is not None else config_snapshot())
+    username = row["username"]
+    key = ("links", username, row.get("version"), row["secret"], tpl.key)
+
+    def build() -> List[Dict[str, str]]:
+        return [
+            {"protocol": title.lower(), "transport": label, "url": url}
+            for title in SECTIONS[row["protocol"]]
+            for label, url in tpl.urls(title.lower(), username, row["secret"])
+        ]
+
+    return _cached(key, build)
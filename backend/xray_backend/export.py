@@ -0,0 +1,84 @@
+"""
+Export akun (quota, expiry, blocked, usage) dari account store sebagai JSONL/CSV.
+
+stream_export() adalah generator frame: beberapa {"status": "ok", "chunk": "..."} lalu
+satu frame akhir {"status": "ok", "done": true, "count": N}. Server mengirim tiap frame
+sebagai baris JSON terpisah; CLI in-process menulis chunk langsung ke output.
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from typing import Any, Dict, Iterator
+
+from .constants import VALID_PROTO, EXPORT_CHUNK_ROWS
+from . import store
+
+EXPORT_FIELDS = (
+    "username",
+    "protocol",
+    "quota_limit",
+    "created_at",
+    "expired_at",
+    "blocked",
+    "blocked_at",
+    "used_up",
+    "used_down",
+    "used",
+)
+
+
+def _parse_date(v: Any, name: str) -> str:
+    s = str(v or "").strip()
+    if not s:
+        return ""
+    try:
+        return date.fromisoformat(s).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+
+def _render(fmt: str, rows, header: bool) -> str:
+    if fmt == "jsonl":
+        return "".join(json.dumps({k: r.get(k) for k in EXPORT_FIELDS}, ensure_ascii=False) + "\n" for r in rows)
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    if header:
+        w.writerow(EXPORT_FIELDS)
+    for r in rows:
+        w.writerow(["" if r.get(k) is None else (int(r[k]) if k == "blocked" else r[k]) for k in EXPORT_FIELDS])
+    return buf.getvalue()
+
+
+def stream_export(req: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    fmt = str(req.get("format") or "jsonl").strip().lower()
+    if fmt not in ("jsonl", "csv"):
+        yield {"status": "error", "error": "format must be jsonl or csv"}
+        return
+
+    proto = str(req.get("protocol") or "all").strip().lower()
+    if proto != "all" and proto not in VALID_PROTO:
+        yield {"status": "error", "error": "invalid protocol"}
+        return
+
+    try:
+        expired_from = _parse_date(req.get("expired_from"), "expired_from")
+        expired_to = _parse_date(req.get("expired_to"), "expired_to")
+    except ValueError as e:
+        yield {"status": "error", "error": str(e)}
+        return
+
+    count = 0
+    batches = store.iter_batches(
+        protocol=None if proto == "all" else proto,
+        expired_from=expired_from or None,
+        expired_to=expired_to or None,
+        batch=EXPORT_CHUNK_ROWS,
+    )
+    for rows in batches:
+        yield {"status": "ok", "chunk": _render(fmt, rows, header=(count == 0))}
+        count += len(rows)
+    if count == 0 and fmt == "csv":
+        yield {"status": "ok", "chunk": _render(fmt, [], header=True)}
+    yield {"status": "ok", "done": True, "format": fmt, "count": count}
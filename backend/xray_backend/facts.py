@@ -0,0 +1,84 @@
+"""
+Cache host facts (public IP, domain, port publik nginx) untuk render detail akun.
+
+- domain/port: dibaca ulang dari nginx conf hanya jika (inode, mtime, size) berubah.
+- public IP: curl ifconfig.me hanya sekali saat cache kosong; setelah itu di-refresh
+  di background (server) tiap FACTS_IP_TTL detik. Nilai lama tetap dipakai selama refresh.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .constants import NGINX_CONF, FACTS_IP_TTL
+from .network import get_public_ip
+from .nginx_conf import parse_domain, parse_public_port
+from .metrics import timed
+
+_lock = threading.Lock()
+_nginx: Dict[str, Any] = {"sig": None, "domain": "unknown", "public_port": 443}
+_ip: Dict[str, Any] = {"value": None, "fetched_at": 0.0}
+_refreshing = threading.Event()
+
+
+def _nginx_sig() -> Optional[Tuple[int, int, int]]:
+    try:
+        st = NGINX_CONF.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _nginx_facts() -> Tuple[str, int]:
+    sig = _nginx_sig()
+    with _lock:
+        if sig == _nginx["sig"] and sig is not None:
+            return _nginx["domain"], _nginx["public_port"]
+    domain, port = "unknown", 443
+    if sig is not None:
+        try:
+            txt = NGINX_CONF.read_text(encoding="utf-8", errors="ignore")
+            domain = parse_domain(txt)
+            port = parse_public_port(txt, 443)
+        except Exception:
+            pass
+    with _lock:
+        _nginx.update({"sig": sig, "domain": domain, "public_port": port})
+    return domain, port
+
+
+@timed("public_ip")
+def refresh_public_ip() -> str:
+    """Ambil ulang public IP (blocking, bisa sampai ~5 detik)."""
+    _refreshing.set()
+    try:
+        ip = get_public_ip()
+        with _lock:
+            # jangan timpa IP valid dengan "unknown" karena curl sesaat gagal
+            if ip != "unknown" or not _ip["value"]:
+                _ip["value"] = ip
+            _ip["fetched_at"] = time.monotonic()
+        return ip
+    finally:
+        _refreshing.clear()
+
+
+def _public_ip() -> Tuple[str, float]:
+    with _lock:
+        value, fetched_at = _ip["value"], _ip["fetched_at"]
+    if value is None:
+        value = refresh_public_ip()
+        fetched_at = time.monotonic()
+    elif time.monotonic() - fetched_at >= FACTS_IP_TTL and not _refreshing.is_set():
+        threading.Thread(target=refresh_public_ip, name="facts-ip", daemon=True).start()
+    return value, time.monotonic() - fetched_at
+
+
+def get_facts(refresh: bool = False) -> Dict[str, Any]:
+    if refresh:
+        refresh_public_ip()
+        with _lock:
+            _nginx["sig"] = None
+    domain, port = _nginx_facts()
+    ip, age = _public_ip()
+    return {"domain": domain, "public_ip": ip, "public_port": port, "ip_age_s": int(age)}
@@ -0,0 +1,113 @@
+"""
+Adapter fake in-process (lihat adapters.py) untuk load test / soak test tanpa
+systemctl, curl dan Xray. State disimpan di memory dan bisa diperiksa oleh test:
+
+  FakeServiceControl.calls   ["restart xray", ...]; units[...]["NRestarts"]
+  FakeXrayApi.users          tag inbound -> set email yang "aktif" di Xray
+  FakeXrayApi.routing        rule set terakhir yang di-push (adrules)
+  FakeXrayApi.stats          counter StatsService; statsquery -reset mengosongkannya
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from .constants import FAKE_PUBLIC_IP, FAKE_RESTART_MS
+
+# Xray API fake selalu "aktif" untuk service ini
+FAKE_API_SERVICES = ("HandlerService", "RoutingService", "StatsService")
+
+
+class FakeServiceControl:
+    def __init__(self, restart_ms: int = FAKE_RESTART_MS):
+        self.restart_ms = restart_ms
+        self.calls: List[str] = []
+        self.units: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _unit(self, name: str) -> Dict[str, Any]:
+        u = self.units.get(name)
+        if u is None:
+            u = self.units[name] = {
+                "Id": f"{name}.service",
+                "LoadState": "loaded",
+                "ActiveState": "active",
+                "SubState": "running",
+                "MainPID": 1000 + len(self.units),
+                "ActiveEnterTimestampMonotonic": int(time.monotonic() * 1_000_000),
+                "MemoryCurrent": 32 * 1024 * 1024,
+                "NRestarts": 0,
+            }
+        return u
+
+    def restart(self, unit: str) -> None:
+        if self.restart_ms > 0:
+            time.sleep(self.restart_ms / 1000)
+        with self._lock:
+            self.calls.append(f"restart {unit}")
+            u = self._unit(unit)
+            u["NRestarts"] += 1
+            u["MainPID"] += 1
+            u["ActiveEnterTimestampMonotonic"] = int(time.monotonic() * 1_000_000)
+
+    def show(self, names: Sequence[str], props: Sequence[str]) -> Dict[str, Dict[str, str]]:
+        with self._lock:
+            return {n: {k: str(v) for k, v in self._unit(n).items() if k in props} for n in names}
+
+
+class FakeIpDiscovery:
+    def __init__(self, ip: str = FAKE_PUBLIC_IP):
+        self.ip = ip
+        self.calls = 0
+
+    def public_ip(self) -> str:
+        self.calls += 1
+        return self.ip
+
+
+class FakeXrayApi:
+    def __init__(self, services: Sequence[str] = FAKE_API_SERVICES):
+        self.services = set(services)
+        self.calls: List[str] = []
+        self.users: Dict[str, Set[str]] = {}
+        self.routing: Optional[Dict[str, Any]] = None
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def server(self, cfg: Dict[str, Any], service: str) -> Optional[str]:
+        return "fake:0" if service in self.services else None
+
+    def call(self, cmd: str, server: str, args: List[str], payload: Optional[Dict[str, Any]] = None) -> str:
+        with self._lock:
+            self.calls.append(cmd)
+            if cmd == "adu":
+                for ib in (payload or {}).get("inbounds", []):
+                    clients = (ib.get("settings") or {}).get("clients") or []
+                    self.users.setdefault(ib.get("tag"), set()).update(c.get("email") for c in clients)
+                return ""
+            if cmd == "rmu":
+                tag = next((a.split("=", 1)[1] for a in args if a.startswith("-tag=")), None)
+                emails = [a for a in args if not a.startswith("-")]
+                self.users.setdefault(tag, set()).difference_update(emails)
+                return ""
+            if cmd == "adrules":
+                self.routing = json.loads(json.dumps((payload or {}).get("routing")))
+                return ""
+            if cmd == "statsquery":
+                pattern = next((a.split("=", 1)[1] for a in args if a.startswith("-pattern=")), "")
+                names = [n for n in self.stats if pattern in n]
+                out = {"stat": [{"name": n, "value": self.stats[n]} for n in names]}
+                if "-reset" in args:
+                    for n in names:
+                        self.stats[n] = 0
+                return json.dumps(out)
+        from .xray_api import XrayApiError
+        raise XrayApiError(f"fake xray api: unsupported command {cmd}")
+
+    def add_traffic(self, email: str, up: int, down: int) -> None:
+        """Simulasi trafik user (dibaca collect_usage lewat statsquery)."""
+        with self._lock:
+            for d, v in (("uplink", up), ("downlink", down)):
+                k = f"user>>>{email}>>>traffic>>>{d}"
+                self.stats[k] = self.stats.get(k, 0) + v
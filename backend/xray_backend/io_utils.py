@@ -2,6 +2,19 @@ import os
 import tempfile
 from pathlib import Path
 
+def fsync_dir(path: Path) -> None:
+    """fsync direktori supaya rename/unlink di dalamnya ikut durable."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 def atomic_write(path: Path, data: bytes, mode: int, uid: int, gid: int) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     fd, tmp = tempfile.mkstemp(prefix=path.name + ".tmp-", dir=str(path.parent))
@@ -16,6 +29,7 @@ def atomic_write(path: Path, data: bytes, mode: int, uid: int, gid: int) -> None
         except PermissionError:
             pass
         os.replace(tmp, path)
+        fsync_dir(path.parent)
     finally:
         try:
             if os.path.exists(tmp):
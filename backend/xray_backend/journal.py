@@ -0,0 +1,152 @@
+"""
+Paging log journald berbasis cursor (journalctl -o json).
+
+Satu halaman = page_size entry berurutan kronologis. Navigasi memakai __CURSOR
+entry paling lama/baru dari halaman sebelumnya, jadi halaman lama tidak bergeser
+saat log baru masuk dan journalctl hanya membaca page_size+1 entry per request
+(bukan (page+1)*page_size seperti paging offset).
+
+direction:
+  latest  halaman terbaru (default)
+  older   entry sebelum `cursor` (cursor = entry paling lama yang sedang tampil)
+  newer   entry setelah `cursor` (cursor = entry paling baru yang sedang tampil)
+  tail    halaman terbaru + new_count = jumlah entry setelah `cursor` (mode follow)
+"""
+
+import json
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+PRIORITIES = ("emerg", "alert", "crit", "err", "warning", "notice", "info", "debug")
+DIRECTIONS = ("latest", "older", "newer", "tail")
+
+PAGE_SIZE_MIN = 5
+PAGE_SIZE_MAX = 80
+MAX_CURSOR_LEN = 512
+
+_FIELDS = "MESSAGE,PRIORITY,SYSLOG_IDENTIFIER,_PID,_COMM"
+
+
+def parse_priority(v: Any) -> Optional[str]:
+    """None (semua), "0".."7", atau nama (err, warning, ...) -> nama level; ValueError jika tidak valid."""
+    s = str(v if v is not None else "").strip().lower()
+    if not s or s == "all":
+        return None
+    if s.isdigit() and int(s) < len(PRIORITIES):
+        return PRIORITIES[int(s)]
+    if s == "error":
+        s = "err"
+    if s not in PRIORITIES:
+        raise ValueError("priority must be 0..7 or one of " + ", ".join(PRIORITIES))
+    return s
+
+
+def _message(v: Any) -> str:
+    # journald menyimpan MESSAGE non-UTF8 sebagai array byte
+    if isinstance(v, list):
+        try:
+            return bytes(v).decode("utf-8", errors="replace")
+        except (TypeError, ValueError):
+            return ""
+    return "" if v is None else str(v)
+
+
+def _entry(raw: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        ts = datetime.fromtimestamp(int(raw.get("__REALTIME_TIMESTAMP")) / 1_000_000)
+        ts_s = ts.strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        ts_s = "-"
+    ident = raw.get("SYSLOG_IDENTIFIER") or raw.get("_COMM") or "-"
+    pid = raw.get("_PID")
+    try:
+        prio = int(raw.get("PRIORITY"))
+    except (TypeError, ValueError):
+        prio = 6
+    return {
+        "cursor": raw.get("__CURSOR") or "",
+        "ts": ts_s,
+        "priority": prio,
+        "ident": f"{ident}[{pid}]" if pid else str(ident),
+        "message": _message(raw.get("MESSAGE")),
+    }
+
+
+def _run(unit: str, priority: Optional[str], extra: List[str]) -> List[Dict[str, Any]]:
+    cmd = ["journalctl", "-u", unit, "--no-pager", "-o", "json", f"--output-fields={_FIELDS}"]
+    if priority:
+        cmd += ["-p", priority]
+    cmd += extra
+    out = subprocess.check_output(cmd, text=True, errors="replace", stderr=subprocess.PIPE)
+    entries = []
+    for line in out.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entries.append(_entry(json.loads(line)))
+        except ValueError:
+            continue
+    return entries
+
+
+def _latest(unit: str, priority: Optional[str], n: int) -> Tuple[List[Dict[str, Any]], bool]:
+    got = _run(unit, priority, ["-n", str(n + 1)])
+    return got[-n:], len(got) > n
+
+
+def journal_page(unit: str, direction: str, cursor: str, page_size: int, priority: Optional[str]) -> Dict[str, Any]:
+    page_size = max(PAGE_SIZE_MIN, min(PAGE_SIZE_MAX, page_size))
+    if direction not in DIRECTIONS:
+        return {"status": "error", "error": "direction must be " + ", ".join(DIRECTIONS)}
+    if direction in ("older", "newer") and not cursor:
+        return {"status": "error", "error": f"cursor required for direction={direction}"}
+    if len(cursor) > MAX_CURSOR_LEN or "\n" in cursor:
+        return {"status": "error", "error": "invalid cursor"}
+
+    new_count = None
+    try:
+        if direction == "older":
+            # mundur dari cursor (cursor sendiri tidak ikut), lalu balik ke urutan kronologis
+            got = _run(unit, priority, ["--after-cursor", cursor, "-r", "-n", str(page_size + 1)])
+            entries = list(reversed(got[:page_size]))
+            has_older, has_newer = len(got) > page_size, True
+        elif direction == "newer":
+            got = _run(unit, priority, ["--after-cursor", cursor, "-n", str(page_size + 1)])
+            entries = got[:page_size]
+            has_older, has_newer = True, len(got) > page_size
+            if not entries:
+                # sudah di ujung: tampilkan halaman terbaru
+                entries, has_older = _latest(unit, priority, page_size)
+        else:
+            entries, has_older = _latest(unit, priority, page_size)
+            has_newer = False
+            if direction == "tail":
+                seen = [i for i, e in enumerate(entries) if e["cursor"] == cursor] if cursor else []
+                # cursor tidak ada di halaman terbaru -> semua entry baru (mungkin ada yang terlewat)
+                new_count = len(entries) - seen[-1] - 1 if seen else len(entries)
+    except subprocess.CalledProcessError as e:
+        err = (e.stderr or "").strip()
+        return {"status": "error", "error": f"journalctl failed: {err[:300] or e}"}
+    except FileNotFoundError:
+        return {"status": "error", "error": "journalctl not found"}
+
+    text = "\n".join(f"{e['ts']} {e['ident']}: {e['message']}" for e in entries)
+    resp = {
+        "status": "ok",
+        "unit": unit,
+        "direction": direction,
+        "priority": priority,
+        "page_size": page_size,
+        "count": len(entries),
+        "first_cursor": entries[0]["cursor"] if entries else None,
+        "last_cursor": entries[-1]["cursor"] if entries else None,
+        "has_older": has_older,
+        "has_newer": has_newer,
+        "entries": [{k: e[k] for k in ("ts", "priority", "ident", "message")} for e in entries],
+        "text": text,
+    }
+    if new_count is not None:
+        resp["new_count"] = new_count
+    return resp
@@ -1,108 +1,107 @@
+"""
+Renderer share link (vless/vmess/trojan) berbasis template yang dikompilasi per node.
+
+Semua link memakai endpoint publik nginx, jadi yang berbeda antar user hanya secret
+dan email. LinkTemplates mengompilasi semua bagian statis (domain, port, path, JSON
+vmess tanpa field per-user) sekali; render per user tinggal menyambung string, quote
+email dan satu base64 untuk vmess. Template di-cache dan dikompilasi ulang hanya jika
+domain/port (nginx, lewat facts) atau set inbound (config.json) berubah.
+"""
+
 import base64
 import json
-from typing import Any, Dict, List
+import threading
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import quote
 
+# (label, transport, path/serviceName) -> urutan baris di file detail
+TRANSPORTS = (
+    ("WebSocket", "ws", "-ws"),
+    ("HTTPUpgrade", "httpupgrade", "-hu"),
+    ("gRPC", "grpc", "-grpc"),
+)
+
+SECTIONS = {
+    "vless": ("VLESS",),
+    "vmess": ("VMESS",),
+    "trojan": ("TROJAN",),
+    "allproto": ("VLESS", "VMESS", "TROJAN"),
+}
+
+
+def _label(label: str) -> str:
+    return f"{label:10}: "
+
+
+class LinkTemplates:
+    """Template link satu node: dikompilasi dari (domain, public_port, inbound key)."""
+
+    def __init__(self, domain: str, public_port: int, inbounds_key: Tuple = ()):
+        self.key = (domain, public_port, inbounds_key)
+        hp = f"{domain}:{public_port}"
+
+        # vless/trojan: "<label>: <scheme>://" + secret + "@host:port?...#" + quote(email)
+        self.url: Dict[str, List[Tuple[str, str]]] = {}
+        for proto, extra in (("vless", "&encryption=none"), ("trojan", "")):
+            parts = []
+            for label, net, suffix in TRANSPORTS:
+                if net == "grpc":
+                    q = f"security=tls{extra}&type=grpc&serviceName={proto}{suffix}&mode=gun"
+                else:
+                    q = f"security=tls{extra}&type={net}&path=%2F{proto}{suffix}"
+                parts.append((f"{_label(label)}{proto}://", f"@{hp}?{q}#"))
+            self.url[proto] = parts
+
+        # vmess: JSON kompak dipotong di field per-user (ps, id), sisanya statis
+        self.vmess: List[Tuple[str, str, str, str]] = []
+        for label, net, suffix in TRANSPORTS:
+            path = f"vmess{suffix}" if net == "grpc" else f"/vmess{suffix}"
+            obj = {
+                "v": "2", "ps": "\0", "add": domain, "port": str(public_port), "id": "\1",
+                "aid": "0", "scy": "auto", "net": net, "type": "none",
+                "host": domain, "path": path, "tls": "tls", "sni": domain,
+            }
+            raw = json.dumps(obj, separators=(",", ":"))
+            head, rest = raw.split('"\\u0000"', 1)
+            mid, tail = rest.split('"\\u0001"', 1)
+            self.vmess.append((f"{_label(label)}vmess://", head, mid, tail))
+
+    def links(self, proto: str, email: str, secret: str) -> List[str]:
+        """Baris link satu protokol (vless/vmess/trojan) untuk satu user."""
+        if proto == "vmess":
+            ps, sid = json.dumps(email), json.dumps(secret)
+            return [
+                pre + base64.b64encode(f"{head}{ps}{mid}{sid}{tail}".encode("utf-8")).decode("ascii")
+                for pre, head, mid, tail in self.vmess
+            ]
+        q = quote(email)
+        return [f"{pre}{secret}{mid}{q}" for pre, mid in self.url[proto]]
+
+    def urls(self, proto: str, email: str, secret: str) -> List[Tuple[str, str]]:
+        """[(transport label, URL polos)] satu protokol, mis. untuk QR code."""
+        return [
+            (label, line[len(_label(label)):])
+            for (label, _, _), line in zip(TRANSPORTS, self.links(proto, email, secret))
+        ]
+
+    def sections(self, proto: str, email: str, secret: str) -> List[Tuple[str, List[str]]]:
+        """[(judul section, baris link)] sesuai urutan file detail (allproto = 3 section)."""
+        return [(title, self.links(title.lower(), email, secret)) for title in SECTIONS[proto]]
+
+
+_lock = threading.Lock()
+_cache: Dict[str, Optional[LinkTemplates]] = {"tpl": None}
+
+
+def get_templates(domain: str, public_port: int, inbounds_key: Tuple = ()) -> LinkTemplates:
+    """Template ter-cache; dikompilasi ulang jika domain, port atau set inbound berubah."""
+    key = (domain, public_port, inbounds_key)
+    tpl = _cache["tpl"]
+    if tpl is not None and tpl.key == key:
+        return tpl
+    with _lock:
+        tpl = _cache["tpl"]
+        if tpl is None or tpl.key != key:
+            tpl = _cache["tpl"] = LinkTemplates(domain, public_port, inbounds_key)
+        return tpl
 
-def _vmess_b64(obj: Dict[str, Any]) -> str:
-    # Match common CLI behaviour: standard base64 with padding
-    raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
-    return base64.b64encode(raw).decode("ascii")
-
-def collect_inbounds(cfg: Dict[str, Any], proto: str):
-    res = []
-    inbounds = cfg.get("inbounds", [])
-    if not isinstance(inbounds, list):
-        return res
-    for ib in inbounds:
-        if not isinstance(ib, dict) or ib.get("protocol") != proto:
-            continue
-        port = ib.get("port")
-        stream = ib.get("streamSettings") if isinstance(ib.get("streamSettings"), dict) else {}
-        network = stream.get("network", "tcp")
-        security = stream.get("security", "tls") or "tls"
-        res.append((port, network, security, stream))
-    return res
-
-def build_links_for_vless(domain: str, email: str, uuid: str, items, public_port: int):
-    links: List[str] = []
-    def add(label, link):
-        links.append(f"{label:10}: {link}")
-
-    # Use public endpoints (nginx) for stability/consistency
-    port = public_port
-    add("WebSocket", f"vless://{uuid}@{domain}:{port}?security=tls&encryption=none&type=ws&path=%2Fvless-ws#" + quote(email))
-    add("HTTPUpgrade", f"vless://{uuid}@{domain}:{port}?security=tls&encryption=none&type=httpupgrade&path=%2Fvless-hu#" + quote(email))
-    add("gRPC", f"vless://{uuid}@{domain}:{port}?security=tls&encryption=none&type=grpc&serviceName=vless-grpc&mode=gun#" + quote(email))
-    return links
-
-def build_links_for_trojan(domain: str, email: str, pwd: str, items, public_port: int):
-    links: List[str] = []
-    def add(label, link):
-        links.append(f"{label:10}: {link}")
-    port = public_port
-    # Use public endpoints (nginx)
-    add("WebSocket", f"trojan://{pwd}@{domain}:{port}?security=tls&type=ws&path=%2Ftrojan-ws#" + quote(email))
-    add("HTTPUpgrade", f"trojan://{pwd}@{domain}:{port}?security=tls&type=httpupgrade&path=%2Ftrojan-hu#" + quote(email))
-    add("gRPC", f"trojan://{pwd}@{domain}:{port}?security=tls&type=grpc&serviceName=trojan-grpc&mode=gun#" + quote(email))
-    return links
-
-def build_links_for_vmess(domain: str, email: str, uuid: str, items, public_port: int):
-    links: List[str] = []
-    def add(label, link):
-        links.append(f"{label:10}: {link}")
-
-    port = public_port
-
-    ws_obj = {
-        "v": "2",
-        "ps": email,
-        "add": domain,
-        "port": str(port),
-        "id": uuid,
-        "aid": "0",
-        "scy": "auto",
-        "net": "ws",
-        "type": "none",
-        "host": domain,
-        "path": "/vmess-ws",
-        "tls": "tls",
-        "sni": domain,
-    }
-    add("WebSocket", f"vmess://{_vmess_b64(ws_obj)}")
-
-    hu_obj = {
-        "v": "2",
-        "ps": email,
-        "add": domain,
-        "port": str(port),
-        "id": uuid,
-        "aid": "0",
-        "scy": "auto",
-        "net": "httpupgrade",
-        "type": "none",
-        "host": domain,
-        "path": "/vmess-hu",
-        "tls": "tls",
-        "sni": domain,
-    }
-    add("HTTPUpgrade", f"vmess://{_vmess_b64(hu_obj)}")
-
-    grpc_obj = {
-        "v": "2",
-        "ps": email,
-        "add": domain,
-        "port": str(port),
-        "id": uuid,
-        "aid": "0",
-        "scy": "auto",
-        "net": "grpc",
-        "type": "none",
-        "host": domain,
-        "path": "vmess-grpc",
-        "tls": "tls",
-        "sni": domain,
-    }
-    add("gRPC", f"vmess://{_vmess_b64(grpc_obj)}")
-
-    return links
@@ -0,0 +1,183 @@
+"""
+Metrics in-process: counter + histogram latency per action dan per tahap (span).
+
+- observe_action(): dipanggil handle_action untuk setiap request (count, error, latency)
+- timed("stage"): decorator span untuk tahap mahal (config load/save, apply, restart,
+  tulis detail, lookup IP publik) -> kelihatan di mana p99 habis
+- snapshot(): dict untuk action "metrics"; render_prometheus(): format text exposition
+
+State hanya hidup di proses server; eksekusi CLI in-process punya metrics sendiri.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+# batas atas bucket latency (detik), gaya default Prometheus + ekor panjang untuk restart xray
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_started = time.time()
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # slot terakhir = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(BUCKETS, v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimasi kuantil dari bucket (interpolasi linear, seperti histogram_quantile)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        ms = lambda v: None if v is None else round(v * 1000, 2)
+        return {
+            "count": self.count,
+            "avg_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+# nama action / stage -> {"errors": int, "hist": Histogram}
+_actions: Dict[str, Dict[str, Any]] = {}
+_stages: Dict[str, Dict[str, Any]] = {}
+
+
+def _slot(table: Dict[str, Dict[str, Any]], name: str) -> Dict[str, Any]:
+    s = table.get(name)
+    if s is None:
+        s = table[name] = {"errors": 0, "hist": Histogram()}
+    return s
+
+
+def observe_action(action: str, seconds: float, ok: bool) -> None:
+    with _lock:
+        s = _slot(_actions, action)
+        s["hist"].observe(seconds)
+        if not ok:
+            s["errors"] += 1
+
+
+def observe_stage(stage: str, seconds: float, ok: bool = True) -> None:
+    with _lock:
+        s = _slot(_stages, stage)
+        s["hist"].observe(seconds)
+        if not ok:
+            s["errors"] += 1
+
+
+def timed(stage: str) -> Callable:
+    """Decorator: catat durasi fungsi ke span `stage` (exception dihitung error)."""
+
+    def deco(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                out = fn(*args, **kwargs)
+                ok = True
+                return out
+            finally:
+                observe_stage(stage, time.perf_counter() - t0, ok)
+
+        return wrapper
+
+    return deco
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        actions = {
+            name: {"errors": s["errors"], **s["hist"].summary()} for name, s in sorted(_actions.items())
+        }
+        stages = {
+            name: {"errors": s["errors"], **s["hist"].summary()} for name, s in sorted(_stages.items())
+        }
+    return {"uptime_s": int(time.time() - _started), "actions": actions, "stages": stages}
+
+
+def _hist_lines(metric: str, label: str, name: str, h: Histogram) -> List[str]:
+    out = []
+    acc = 0
+    for le, c in zip(BUCKETS + (float("inf"),), h.counts):
+        acc += c
+        le_s = "+Inf" if le == float("inf") else repr(le)
+        out.append(f'{metric}_bucket{{{label}="{name}",le="{le_s}"}} {acc}')
+    out.append(f'{metric}_sum{{{label}="{name}"}} {h.sum:.6f}')
+    out.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+    return out
+
+
+def render_prometheus() -> str:
+    """Text exposition format 0.0.4 (untuk textfile collector node_exporter atau scrape HTTP)."""
+    with _lock:
+        actions = {k: (v["errors"], v["hist"]) for k, v in sorted(_actions.items())}
+        stages = {k: (v["errors"], v["hist"]) for k, v in sorted(_stages.items())}
+        lines = [
+            "# HELP xray_backend_uptime_seconds Seconds since the backend process started.",
+            "# TYPE xray_backend_uptime_seconds gauge",
+            f"xray_backend_uptime_seconds {int(time.time() - _started)}",
+            "# HELP xray_backend_requests_total Requests handled per action.",
+            "# TYPE xray_backend_requests_total counter",
+        ]
+        lines += [f'xray_backend_requests_total{{action="{a}"}} {h.count}' for a, (_, h) in actions.items()]
+        lines += [
+            "# HELP xray_backend_request_errors_total Requests per action that returned an error.",
+            "# TYPE xray_backend_request_errors_total counter",
+        ]
+        lines += [f'xray_backend_request_errors_total{{action="{a}"}} {e}' for a, (e, _) in actions.items()]
+        lines += [
+            "# HELP xray_backend_request_duration_seconds Request latency per action.",
+            "# TYPE xray_backend_request_duration_seconds histogram",
+        ]
+        for a, (_, h) in actions.items():
+            lines += _hist_lines("xray_backend_request_duration_seconds", "action", a, h)
+        lines += [
+            "# HELP xray_backend_stage_errors_total Failed stage spans (exception raised).",
+            "# TYPE xray_backend_stage_errors_total counter",
+        ]
+        lines += [f'xray_backend_stage_errors_total{{stage="{s}"}} {e}' for s, (e, _) in stages.items()]
+        lines += [
+            "# HELP xray_backend_stage_duration_seconds Duration of internal stages (config load/save, apply, restart, detail write).",
+            "# TYPE xray_backend_stage_duration_seconds histogram",
+        ]
+        for s, (_, h) in stages.items():
+            lines += _hist_lines("xray_backend_stage_duration_seconds", "stage", s, h)
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str) -> None:
+    """Tulis render_prometheus() ke file (rename atomik) untuk textfile collector node_exporter."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
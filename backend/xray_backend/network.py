@@ -1,23 +1,31 @@
 import subprocess
 
-def get_public_ip() -> str:
-    # public IP from ifconfig.me
-    try:
-        out = subprocess.check_output(
-            ["curl", "-s", "--max-time", "5", "ifconfig.me"],
-            text=True
-        ).strip()
-        if out and len(out) <= 64:
-            return out
-    except Exception:
-        pass
+from . import adapters
+
+class CurlIpDiscovery:
+    """Adapter IP discovery produksi: curl ifconfig.me, fallback `hostname -I`."""
+
+    def public_ip(self) -> str:
+        # public IP from ifconfig.me
+        try:
+            out = subprocess.check_output(
+                ["curl", "-s", "--max-time", "5", "ifconfig.me"],
+                text=True
+            ).strip()
+            if out and len(out) <= 64:
+                return out
+        except Exception:
+            pass
 
-    # fallback
-    try:
-        out = subprocess.check_output(["bash", "-lc", "hostname -I | awk '{print $1}'"], text=True).strip()
-        if out:
-            return out
-    except Exception:
-        pass
+        # fallback
+        try:
+            out = subprocess.check_output(["bash", "-lc", "hostname -I | awk '{print $1}'"], text=True).strip()
+            if out:
+                return out
+        except Exception:
+            pass
 
-    return "unknown"
+        return "unknown"
+
+def get_public_ip() -> str:
+    return adapters.ip_discovery().public_ip()
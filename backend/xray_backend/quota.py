@@ -1,8 +1,9 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from .constants import QUOTA_DIR, DETAIL_BASE, VALID_PROTO
+from .io_utils import atomic_write
 
 def quota_bytes_from_gb(quota_gb: float) -> int:
     if quota_gb <= 0:
@@ -10,9 +11,6 @@ def quota_bytes_from_gb(quota_gb: float) -> int:
     return int(round(quota_gb * 1073741824))
 
 def write_quota(proto: str, final_u: str, quota_gb: float, days: int, created_at: str, expired_at: str) -> str:
-    d = QUOTA_DIR / proto
-    d.mkdir(parents=True, exist_ok=True)
-
     obj = {
         "username": final_u,
         "protocol": proto,
@@ -20,8 +18,9 @@ def write_quota(proto: str, final_u: str, quota_gb: float, days: int, created_at
         "created_at": created_at,
         "expired_at": expired_at,
     }
-    p = d / f"{final_u}.json"
-    p.write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
+    p = QUOTA_DIR / proto / f"{final_u}.json"
+    # renew / quota_set membaca file ini lagi: jangan pernah tinggalkan JSON terpotong
+    atomic_write(p, (json.dumps(obj, indent=2) + "\n").encode("utf-8"), 0o644, 0, 0)
     return str(p)
 
 def safe_int(v: Any, default: int) -> int:
@@ -38,6 +37,42 @@ def quota_scan_protos(proto_filter: str) -> List[str]:
         return [pf]
     return []
 
+def read_quota_item(p: Path, proto: str) -> Optional[Dict[str, Any]]:
+    """Parse satu file quota JSON jadi item list; None jika tidak valid."""
+    try:
+        obj = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if not isinstance(obj, dict):
+        return None
+
+    username = str(obj.get("username") or "").strip()
+    pproto = str(obj.get("protocol") or proto).strip().lower()
+    expired_at = str(obj.get("expired_at") or "").strip()
+    created_at = str(obj.get("created_at") or "").strip()
+    quota_limit = obj.get("quota_limit")
+
+    if pproto not in VALID_PROTO:
+        return None
+    if not username or not username.endswith(f"@{pproto}"):
+        return None
+
+    base = DETAIL_BASE["allproto"] if pproto == "allproto" else DETAIL_BASE[pproto]
+    detail_path = str(base / f"{username}.txt")
+
+    return {
+        "username": username,
+        "protocol": pproto,
+        "expired_at": expired_at,
+        "created_at": created_at,
+        "quota_limit": quota_limit,
+        "detail_path": detail_path,
+    }
+
+def quota_sort_key(it: Dict[str, Any]) -> Tuple[str, str]:
+    exp = str(it.get("expired_at") or "").strip() or "9999-12-31"
+    return (exp, str(it.get("username") or ""))
+
 def scan_quota_items(proto_filter: str) -> List[Dict[str, Any]]:
     protos = quota_scan_protos(proto_filter)
     if not protos:
@@ -52,33 +87,10 @@ def scan_quota_items(proto_filter: str) -> List[Dict[str, Any]]:
 
         for p in d.glob("*.json"):
             try:
-                obj = json.loads(p.read_text(encoding="utf-8"))
-                if not isinstance(obj, dict):
+                item = read_quota_item(p, proto)
+                if item is None:
                     continue
-
-                username = str(obj.get("username") or "").strip()
-                pproto = str(obj.get("protocol") or proto).strip().lower()
-                expired_at = str(obj.get("expired_at") or "").strip()
-                created_at = str(obj.get("created_at") or "").strip()
-                quota_limit = obj.get("quota_limit")
-
-                if pproto not in VALID_PROTO:
-                    continue
-                if not username or not username.endswith(f"@{pproto}"):
-                    continue
-
-                base = DETAIL_BASE["allproto"] if pproto == "allproto" else DETAIL_BASE[pproto]
-                detail_path = str(base / f"{username}.txt")
-
-                item = {
-                    "username": username,
-                    "protocol": pproto,
-                    "expired_at": expired_at,
-                    "created_at": created_at,
-                    "quota_limit": quota_limit,
-                    "detail_path": detail_path,
-                }
-
+                username = item["username"]
                 mtime = p.stat().st_mtime
                 prev = by_user.get(username)
                 if prev is None or mtime >= prev[0]:
@@ -87,10 +99,5 @@ def scan_quota_items(proto_filter: str) -> List[Dict[str, Any]]:
                 continue
 
     items = [v[1] for v in by_user.values()]
-
-    def sort_key(it: Dict[str, Any]):
-        exp = str(it.get("expired_at") or "").strip() or "9999-12-31"
-        return (exp, str(it.get("username") or ""))
-
-    items.sort(key=sort_key)
+    items.sort(key=quota_sort_key)
     return items
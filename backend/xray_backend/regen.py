@@ -0,0 +1,144 @@
+"""
+Regenerasi massal file detail akun (<DETAIL_DIR>/<proto>/<user>.txt) setelah domain,
+IP publik atau port nginx berubah.
+
+Host facts dan template link di-resolve sekali; render + tulis file jalan paralel di
+thread pool (REGEN_WORKERS), tiap file ditulis atomik. Baris "Created" dari file lama
+dipertahankan, jadi file yang isinya tidak berubah (hash sama) dilewati tanpa ditulis.
+
+Regen jalan di reader thread, sejajar dengan writer yang juga menulis/menghapus file
+detail. Tiap file ditulis sambil memegang detail_lock akun tsb, dengan baris akun dibaca
+ulang dari store di dalam lock: regen tidak menimpa file yang baru ditulis writer dengan
+baris lama dan tidak membuat ulang file akun yang baru dihapus ("skipped"). Writer paling
+lama menunggu satu file, bukan satu batch.
+
+stream_regen() adalah generator frame seperti export.stream_export(): beberapa
+{"status": "ok", "progress": {...}} lalu satu frame akhir {"status": "ok", "done": true, ...}.
+"""
+
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .constants import VALID_PROTO, REGEN_WORKERS, REGEN_BATCH
+from .detail import days_remaining, detail_lock, detail_txt_path, node_templates, render_detail_txt
+from .facts import get_facts
+from .io_utils import atomic_write
+from .links import LinkTemplates
+from .xray_config import config_snapshot
+from . import store
+
+_CREATED_RE = re.compile(r"^Created\s*:\s*(.+)$", re.M)
+
+# jumlah error yang ikut dikirim di frame akhir (sisanya hanya dihitung)
+MAX_ERRORS = 20
+
+
+def _created_from(old: Optional[bytes]) -> Optional[str]:
+    if not old:
+        return None
+    m = _CREATED_RE.search(old.decode("utf-8", errors="replace"))
+    return m.group(1).strip() if m else None
+
+
+def _regen_one(
+    facts: Dict[str, Any], tpl: LinkTemplates, row: Dict[str, Any], today: date, dry_run: bool
+) -> Tuple[str, str]:
+    """Render ulang satu file detail -> (username, "written" | "unchanged" | "skipped")."""
+    username = row["username"]
+    with detail_lock(username):
+        # baris batch bisa sudah basi: writer mengubah/menghapus akun sejak batch dibaca
+        cur = store.get(username)
+        if cur is None:
+            return username, "skipped"
+        return username, _regen_file(facts, tpl, cur, today, dry_run)
+
+
+def _regen_file(facts: Dict[str, Any], tpl: LinkTemplates, row: Dict[str, Any], today: date, dry_run: bool) -> str:
+    username, proto = row["username"], row["protocol"]
+    secret = row.get("secret") or ""
+    if not secret:
+        raise ValueError("secret missing in account store")
+    path = detail_txt_path(proto, username)
+    try:
+        old = path.read_bytes()
+    except FileNotFoundError:
+        old = None
+
+    quota = int(row.get("quota_limit") or 0)
+    text = render_detail_txt(
+        facts,
+        tpl,
+        proto,
+        username,
+        secret,
+        days_remaining(str(row.get("expired_at") or ""), today),
+        quota / 1073741824.0 if quota > 0 else 0.0,
+        _created_from(old) or str(row.get("created_at") or "") or None,
+    )
+    data = text.encode("utf-8")
+    if old is not None and hashlib.sha256(old).digest() == hashlib.sha256(data).digest():
+        return "unchanged"
+    if not dry_run:
+        atomic_write(path, data, 0o644, 0, 0)
+    return "written"
+
+
+def stream_regen(req: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    proto = str(req.get("protocol") or "all").strip().lower()
+    if proto != "all" and proto not in VALID_PROTO:
+        yield {"status": "error", "error": "invalid protocol"}
+        return
+    workers = req.get("workers")
+    try:
+        workers = REGEN_WORKERS if workers is None else int(workers)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers < 1 or workers > 64:
+        yield {"status": "error", "error": "workers out of range (1..64)"}
+        return
+    dry_run = bool(req.get("dry_run"))
+
+    t0 = time.monotonic()
+    # facts sekali untuk seluruh run; refresh=true memaksa curl IP + baca ulang nginx conf
+    facts, tpl = node_templates(config_snapshot(), get_facts(refresh=bool(req.get("refresh"))))
+    today = date.today()
+    protocol = None if proto == "all" else proto
+    total = store.count(protocol)
+    counts = {"written": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    errors = []
+
+    after = ""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="regen") as pool:
+        while True:
+            rows = store.accounts_after(after, protocol, REGEN_BATCH)
+            if not rows:
+                break
+            futs = [(r["username"], pool.submit(_regen_one, facts, tpl, r, today, dry_run)) for r in rows]
+            for username, fut in futs:
+                try:
+                    counts[fut.result()[1]] += 1
+                except Exception as ex:
+                    counts["failed"] += 1
+                    if len(errors) < MAX_ERRORS:
+                        errors.append({"username": username, "error": str(ex)})
+            after = rows[-1]["username"]
+            done = sum(counts.values())
+            yield {"status": "ok", "progress": {"done": done, "total": max(total, done), **counts}}
+
+    yield {
+        "status": "ok",
+        "done": True,
+        "protocol": proto,
+        "dry_run": dry_run,
+        "domain": facts["domain"],
+        "public_ip": facts["public_ip"],
+        "public_port": facts["public_port"],
+        "total": sum(counts.values()),
+        **counts,
+        "errors": errors,
+        "elapsed_ms": int((time.monotonic() - t0) * 1000),
+    }
@@ -0,0 +1,289 @@
+import base64
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .constants import QUOTA_DIR, REGISTRY_FULL_SWEEP
+from .quota import quota_scan_protos, read_quota_item, quota_sort_key
+
+Key = Tuple[str, str]  # (expired_at, username)
+
+ALL_PROTOS = ("vless", "vmess", "trojan", "allproto")
+
+
+def encode_cursor(key: Key) -> str:
+    raw = f"{key[0]}|{key[1]}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Key]:
+    try:
+        s = str(cursor or "").strip()
+        raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4)).decode("utf-8")
+        exp, username = raw.split("|", 1)
+        return (exp, username)
+    except Exception:
+        return None
+
+
+class AccountRegistry:
+    """
+    Index in-memory dari /opt/quota/<proto>/*.json untuk proses server yang long-lived.
+
+    - Direktori hanya di-scan ulang jika mtime direktori berubah (file baru/hapus/rename)
+      atau setelah REGISTRY_FULL_SWEEP detik (menangkap edit in-place dari luar backend).
+    - File hanya di-parse ulang jika (mtime, size) berubah.
+    - Urutan (expired_at, username) dijaga per filter protocol dengan bisect,
+      jadi satu halaman list = O(log n + page).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dir_mtime: Dict[str, int] = {}
+        # path -> (mtime_ns, size, item|None)
+        self._files: Dict[str, Tuple[int, int, Optional[Dict[str, Any]]]] = {}
+        # username -> path file yang klaim username tsb
+        self._claims: Dict[str, Set[str]] = {}
+        # username -> item pemenang (mtime terbaru, sama seperti scan_quota_items)
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._order: Dict[str, List[Key]] = {p: [] for p in ("all",) + ALL_PROTOS}
+        # (username.lower(), username) urut, untuk prefix search O(log n + k)
+        self._names: List[Tuple[str, str]] = []
+        self._last_sweep = -REGISTRY_FULL_SWEEP
+        self._dirty: Set[str] = set()
+
+    def invalidate(self, proto: Optional[str] = None) -> None:
+        """
+        Dipanggil setelah backend menulis/menghapus file quota, karena mtime direktori
+        bisa sama jika dua perubahan jatuh di tick timestamp yang sama.
+        """
+        with self._lock:
+            self._dirty.update([proto] if proto in ALL_PROTOS else ALL_PROTOS)
+
+    def refresh(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            full = (now - self._last_sweep) >= REGISTRY_FULL_SWEEP
+            changed: Set[str] = set()
+            for proto in ALL_PROTOS:
+                d = QUOTA_DIR / proto
+                try:
+                    dm = d.stat().st_mtime_ns
+                except FileNotFoundError:
+                    dm = -1
+                if not full and proto not in self._dirty and self._dir_mtime.get(proto) == dm:
+                    continue
+                self._dir_mtime[proto] = dm
+                changed |= self._rescan_dir(proto)
+            self._dirty.clear()
+            if full:
+                self._last_sweep = now
+            for username in changed:
+                self._reindex_user(username)
+
+    def _rescan_dir(self, proto: str) -> Set[str]:
+        d = QUOTA_DIR / proto
+        prefix = str(d) + os.sep
+        seen: Set[str] = set()
+        changed: Set[str] = set()
+        try:
+            entries = list(os.scandir(d))
+        except (FileNotFoundError, NotADirectoryError):
+            entries = []
+
+        for e in entries:
+            if not e.name.endswith(".json"):
+                continue
+            path = e.path
+            seen.add(path)
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            prev = self._files.get(path)
+            if prev is not None and prev[0] == st.st_mtime_ns and prev[1] == st.st_size:
+                continue
+            if prev is not None and prev[2] is not None:
+                self._drop_claim(prev[2]["username"], path)
+                changed.add(prev[2]["username"])
+            item = read_quota_item(d / e.name, proto)
+            self._files[path] = (st.st_mtime_ns, st.st_size, item)
+            if item is not None:
+                self._claims.setdefault(item["username"], set()).add(path)
+                changed.add(item["username"])
+
+        for path in [p for p in self._files if p.startswith(prefix) and p not in seen]:
+            _, _, item = self._files.pop(path)
+            if item is not None:
+                self._drop_claim(item["username"], path)
+                changed.add(item["username"])
+        return changed
+
+    def _drop_claim(self, username: str, path: str) -> None:
+        paths = self._claims.get(username)
+        if paths is None:
+            return
+        paths.discard(path)
+        if not paths:
+            del self._claims[username]
+
+    def _reindex_user(self, username: str) -> None:
+        old = self._items.pop(username, None)
+        if old is not None:
+            key = quota_sort_key(old)
+            for name in ("all", old["protocol"]):
+                lst = self._order[name]
+                i = bisect_right(lst, key) - 1
+                if i >= 0 and lst[i] == key:
+                    del lst[i]
+            nk = (username.lower(), username)
+            i = bisect_left(self._names, nk)
+            if i < len(self._names) and self._names[i] == nk:
+                del self._names[i]
+
+        best = None
+        for path in self._claims.get(username, ()):
+            mtime_ns, _, item = self._files[path]
+            if item is not None and (best is None or mtime_ns >= best[0]):
+                best = (mtime_ns, item)
+        if best is None:
+            return
+
+        item = best[1]
+        self._items[username] = item
+        key = quota_sort_key(item)
+        insort(self._order["all"], key)
+        insort(self._order[item["protocol"]], key)
+        insort(self._names, (username.lower(), username))
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.refresh()
+            it = self._items.get(username)
+            return dict(it) if it else None
+
+    def items(self, proto_filter: str) -> List[Dict[str, Any]]:
+        """Semua item (urut expired_at, username); pengganti scan_quota_items."""
+        protos = quota_scan_protos(proto_filter)
+        if not protos:
+            return []
+        name = "all" if len(protos) > 1 else protos[0]
+        with self._lock:
+            self.refresh()
+            return [dict(self._items[k[1]]) for k in self._order[name]]
+
+    def expiring_before(self, cutoff: str) -> List[Dict[str, Any]]:
+        """Item dengan expired_at < cutoff (YYYY-MM-DD), urut expiry: O(log n + k)."""
+        with self._lock:
+            self.refresh()
+            order = self._order["all"]
+            end = bisect_left(order, (cutoff, ""))
+            return [dict(self._items[k[1]]) for k in order[:end] if k[0]]
+
+    def next_expiry(self, cutoff: str) -> Optional[str]:
+        """expired_at terkecil yang >= cutoff (akun berikutnya yang akan jatuh tempo)."""
+        with self._lock:
+            self.refresh()
+            order = self._order["all"]
+            i = bisect_left(order, (cutoff, ""))
+            return order[i][0] if i < len(order) else None
+
+    def _select(
+        self,
+        name: str,
+        q: str,
+        match: str,
+        only: Optional[Set[str]],
+        expiring_days: Optional[int],
+    ) -> List[Key]:
+        """Key urut (expired_at, username) yang lolos semua filter; tanpa filter = index apa adanya."""
+        order = self._order[name]
+        if not q and only is None and expiring_days is None:
+            return order
+
+        candidates: Optional[Set[str]] = None if only is None else set(only)
+        if q:
+            ql = q.lower()
+            if match == "prefix":
+                i = bisect_left(self._names, (ql, ""))
+                found = set()
+                while i < len(self._names) and self._names[i][0].startswith(ql):
+                    found.add(self._names[i][1])
+                    i += 1
+            else:
+                found = {u for lu, u in self._names if ql in lu}
+            candidates = found if candidates is None else (candidates & found)
+
+        if expiring_days is not None:
+            # expired_at di [hari ini, hari ini + N]: range pada index expiry
+            today = date.today()
+            lo = bisect_left(order, (today.isoformat(), ""))
+            hi = bisect_left(order, ((today + timedelta(days=expiring_days + 1)).isoformat(), ""))
+            if candidates is None:
+                return order[lo:hi]
+            return [k for k in order[lo:hi] if k[1] in candidates]
+
+        keys = []
+        for u in candidates:
+            it = self._items.get(u)
+            if it is None or (name != "all" and it["protocol"] != name):
+                continue
+            keys.append(quota_sort_key(it))
+        keys.sort()
+        return keys
+
+    def page(
+        self,
+        proto_filter: str,
+        offset: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        before: Optional[str] = None,
+        q: str = "",
+        match: str = "substring",
+        only: Optional[Set[str]] = None,
+        expiring_days: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Satu halaman. Posisi: `cursor` (sesudah key), `before` (halaman sebelum key),
+        atau `offset` (lama). Cursor opaque; start_cursor memuat ulang halaman yang sama.
+        """
+        protos = quota_scan_protos(proto_filter)
+        name = "all" if len(protos) > 1 else protos[0]
+        with self._lock:
+            self.refresh()
+            keys = self._select(name, q, match, only, expiring_days)
+            start = offset
+            end = None
+            if cursor:
+                key = decode_cursor(cursor)
+                if key is None:
+                    raise ValueError("invalid cursor")
+                start = bisect_right(keys, key)
+            elif before:
+                key = decode_cursor(before)
+                if key is None:
+                    raise ValueError("invalid cursor")
+                # halaman sebelum key berhenti tepat sebelum key, walau kurang dari limit
+                end = bisect_left(keys, key)
+                start = max(0, end - limit)
+            start = min(start, len(keys))
+            end = min(start + limit, len(keys)) if end is None else end
+            page_keys = keys[start:end]
+            items = [dict(self._items[k[1]]) for k in page_keys]
+            has_more = end < len(keys)
+            return {
+                "offset": start,
+                "total": len(keys),
+                "has_more": has_more,
+                "next_cursor": encode_cursor(page_keys[-1]) if (page_keys and has_more) else None,
+                "prev_cursor": encode_cursor(page_keys[0]) if (page_keys and start > 0) else None,
+                "start_cursor": encode_cursor(keys[start - 1]) if start > 0 else None,
+                "items": items,
+            }
+
+
+REGISTRY = AccountRegistry()
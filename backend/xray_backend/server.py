@@ -0,0 +1,444 @@
+"""
+Server Unix socket backend (dijalankan lewat `backend.py --serve`).
+
+Dipisah dari backend.py supaya CLI tidak perlu import asyncio/thread pool/core.
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator
+
+from .core import handle_action
+from .export import stream_export
+from .regen import stream_regen
+from . import metrics
+from .constants import (
+    SOCK_PATH,
+    MAX_REQUEST_BYTES,
+    READ_ACTIONS,
+    STREAM_ACTIONS,
+    USAGE_POLL_INTERVAL,
+    ENFORCE_INTERVAL,
+    FACTS_IP_TTL,
+    CONFIG_WRITE_COALESCE,
+    EXPIRE_MODE,
+    EXPIRE_RECHECK,
+    METRICS_TEXTFILE,
+    METRICS_INTERVAL,
+    METRICS_HTTP_PORT,
+)
+
+SOCK_GROUP = "discordbot"
+SOCK_MODE = 0o660
+
+READ_WORKERS = 8
+# frame stream yang boleh antre sebelum producer ditahan
+STREAM_QUEUE = 4
+
+# generator frame per STREAM_ACTIONS
+STREAMERS = {"export": stream_export, "regen_details": stream_regen}
+
+def setup_socket():
+    if os.path.exists(SOCK_PATH):
+        os.remove(SOCK_PATH)
+
+    os.makedirs(os.path.dirname(SOCK_PATH), exist_ok=True)
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(SOCK_PATH)
+
+    import grp
+    try:
+        gid = grp.getgrnam(SOCK_GROUP).gr_gid
+    except KeyError:
+        # bukan node produksi (benchmark/test): socket hanya untuk user pemilik proses
+        print(f"[socket] group {SOCK_GROUP} not found, socket restricted to owner", file=sys.stderr, flush=True)
+        os.chmod(SOCK_PATH, 0o600)
+    else:
+        os.chown(SOCK_PATH, 0, gid)
+        os.chmod(SOCK_PATH, SOCK_MODE)
+
+    s.listen(50)
+    return s
+
+def recv_json_line(conn) -> Dict[str, Any]:
+    buf = b""
+    while b"\n" not in buf:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > 1024 * 1024:
+            raise ValueError("Request too large")
+    line = buf.split(b"\n", 1)[0].decode("utf-8", errors="strict")
+    return json.loads(line)
+
+def send_json(conn, obj: Dict[str, Any]):
+    data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+    conn.sendall(data)
+
+def _action(req: Dict[str, Any]) -> str:
+    return str(req.get("action") or "").strip().lower()
+
+def safe_handle(req: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return handle_action(req)
+    except Exception as ex:
+        return {"status": "error", "error": str(ex)}
+
+def stream_frames(req: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Frame STREAM_ACTIONS lewat STREAMERS; exception jadi frame error terakhir.
+    Latency/status dicatat di metrics saat generator selesai atau ditutup (client putus).
+    """
+    action = _action(req)
+    t0 = time.perf_counter()
+    ok = False
+    frames = STREAMERS[action](req)
+    try:
+        for frame in frames:
+            ok = frame.get("status") == "ok"
+            yield frame
+    except Exception as ex:
+        ok = False
+        yield {"status": "error", "error": str(ex)}
+    finally:
+        frames.close()
+        metrics.observe_action(action, time.perf_counter() - t0, ok)
+
+def serve_sync():
+    # mode lama: satu koneksi dalam satu waktu, handle_action dijalankan inline;
+    # STREAM_ACTIONS dikirim frame per frame seperti di server async
+    s = setup_socket()
+    try:
+        while True:
+            conn, _ = s.accept()
+            try:
+                try:
+                    req = recv_json_line(conn)
+                    if not isinstance(req, dict):
+                        raise ValueError("Request must be a JSON object")
+                except Exception as ex:
+                    send_json(conn, {"status": "error", "error": str(ex)})
+                    continue
+                if _action(req) in STREAM_ACTIONS:
+                    for frame in stream_frames(req):
+                        send_json(conn, frame)
+                else:
+                    send_json(conn, safe_handle(req))
+            except (ConnectionError, BrokenPipeError):
+                pass
+            finally:
+                conn.close()
+    finally:
+        s.close()
+        if os.path.exists(SOCK_PATH):
+            os.remove(SOCK_PATH)
+
+class Dispatcher:
+    """
+    Read-only actions (READ_ACTIONS) jalan paralel di thread pool,
+    semua action lain diserialkan lewat satu writer queue.
+    """
+
+    def __init__(self):
+        self.readers = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="backend-read")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backend-write")
+        self.queue: "asyncio.Queue" = asyncio.Queue()
+
+    async def run_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            req, fut, queued_at = await self.queue.get()
+            # waktu antre di writer queue ikut menyumbang p99 action mutasi
+            metrics.observe_stage("writer_queue", time.perf_counter() - queued_at)
+            try:
+                resp = await loop.run_in_executor(self.writer, safe_handle, req)
+            except Exception as ex:
+                resp = {"status": "error", "error": str(ex)}
+            if not fut.done():
+                fut.set_result(resp)
+            self.queue.task_done()
+
+    async def dispatch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if _action(req) in READ_ACTIONS:
+            return await loop.run_in_executor(self.readers, safe_handle, req)
+        fut = loop.create_future()
+        await self.queue.put((req, fut, time.perf_counter()))
+        return await fut
+
+    async def stream(self, req: Dict[str, Any], emit) -> None:
+        """
+        STREAM_ACTIONS: generator frame jalan di satu reader thread (koneksi SQLite per-thread),
+        frame diserahkan lewat queue terbatas ke `emit` -> memory tetap kecil dan producer
+        tertahan jika client lambat. Jika emit gagal (client putus), producer dihentikan.
+        """
+        loop = asyncio.get_running_loop()
+        q: "asyncio.Queue" = asyncio.Queue(maxsize=STREAM_QUEUE)
+        stop = threading.Event()
+
+        def put(frame):
+            asyncio.run_coroutine_threadsafe(q.put(frame), loop).result()
+
+        def produce():
+            frames = stream_frames(req)
+            try:
+                for frame in frames:
+                    if stop.is_set():
+                        break
+                    put(frame)
+            finally:
+                frames.close()
+                put(None)
+
+        fut = loop.run_in_executor(self.readers, produce)
+        try:
+            while True:
+                frame = await q.get()
+                if frame is None:
+                    break
+                await emit(frame)
+        finally:
+            stop.set()
+            # kosongkan queue supaya producer yang sedang put() tidak menggantung
+            while not fut.done():
+                try:
+                    await asyncio.wait_for(q.get(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+
+    def shutdown(self):
+        self.readers.shutdown(wait=False)
+        self.writer.shutdown(wait=True)
+
+async def read_json_line(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    try:
+        line = await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise ValueError("Request too large")
+    req = json.loads(line.decode("utf-8", errors="strict"))
+    if not isinstance(req, dict):
+        raise ValueError("Request must be a JSON object")
+    return req
+
+async def write_json(writer: asyncio.StreamWriter, obj: Dict[str, Any]):
+    writer.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+    await writer.drain()
+
+async def handle_conn(dispatcher: Dispatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        try:
+            req = await read_json_line(reader)
+        except Exception as ex:
+            await write_json(writer, {"status": "error", "error": str(ex)})
+            return
+
+        if "id" in req:
+            await serve_multiplexed(dispatcher, req, reader, writer)
+            return
+
+        if _action(req) in STREAM_ACTIONS:
+            await dispatcher.stream(req, lambda frame: write_json(writer, frame))
+            return
+
+        # mode lama: satu request, satu response, lalu koneksi ditutup
+        resp = await dispatcher.dispatch(req)
+        await write_json(writer, resp)
+    except (ConnectionError, BrokenPipeError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+async def serve_multiplexed(dispatcher: Dispatcher, first: Dict[str, Any], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Koneksi persistent: banyak request per koneksi, masing-masing membawa "id".
+    Response dikirim begitu selesai (boleh tidak urut) dengan "id" yang sama.
+    """
+    write_lock = asyncio.Lock()
+    tasks = set()
+
+    async def run_one(req: Dict[str, Any]):
+        rid = req.get("id")
+
+        async def emit(frame: Dict[str, Any]):
+            async with write_lock:
+                await write_json(writer, {**frame, "id": rid})
+
+        if _action(req) in STREAM_ACTIONS:
+            await dispatcher.stream(req, emit)
+            return
+        await emit(await dispatcher.dispatch(req))
+
+    def spawn(req: Dict[str, Any]):
+        t = asyncio.create_task(run_one(req))
+        tasks.add(t)
+        t.add_done_callback(tasks.discard)
+
+    spawn(first)
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except (asyncio.LimitOverrunError, ValueError):
+                async with write_lock:
+                    await write_json(writer, {"status": "error", "error": "Request too large", "id": None})
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                req = json.loads(line.decode("utf-8", errors="strict"))
+            except ValueError:
+                req = None
+            if not isinstance(req, dict) or "id" not in req:
+                async with write_lock:
+                    await write_json(writer, {"status": "error", "error": "invalid request (JSON object with id expected)", "id": None})
+                continue
+            spawn(req)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_periodic(name: str, interval: float, fn):
+    # job latar belakang (di thread pool); error yang sama hanya dicatat sekali ke journal
+    loop = asyncio.get_running_loop()
+    last_err = None
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, fn)
+            last_err = None
+        except Exception as ex:
+            if str(ex) != last_err:
+                print(f"[{name}] {ex}", file=sys.stderr, flush=True)
+            last_err = str(ex)
+
+async def enforce_loop(dispatcher: Dispatcher):
+    # lewat writer queue seperti request mutasi lain, jadi tidak balapan dengan add/del dari bot
+    while True:
+        await asyncio.sleep(ENFORCE_INTERVAL)
+        resp = await dispatcher.dispatch({"action": "enforce"})
+        if resp.get("status") != "ok":
+            print(f"[enforce] {resp.get('error')}", file=sys.stderr, flush=True)
+        elif resp.get("blocked"):
+            names = ", ".join(v["username"] for v in resp.get("users", []) if v.get("blocked"))
+            print(
+                f"[enforce] scanned={resp['scanned']} blocked={resp['blocked']} elapsed_ms={resp['elapsed_ms']}: {names}",
+                file=sys.stderr,
+                flush=True,
+            )
+
+async def expire_loop(dispatcher: Dispatcher):
+    """
+    Auto-expiry: jalankan "expire" sekarang, lalu tidur sampai batas expiry berikutnya
+    (next_at dari response), maksimal EXPIRE_RECHECK detik.
+    """
+    while True:
+        resp = await dispatcher.dispatch({"action": "expire"})
+        if resp.get("status") != "ok":
+            print(f"[expire] {resp.get('error')}", file=sys.stderr, flush=True)
+        elif resp.get("blocked") or resp.get("deleted"):
+            names = ", ".join(v["username"] for v in resp.get("users", []) if v.get("blocked") or v.get("deleted"))
+            print(
+                f"[expire] mode={resp['mode']} blocked={resp['blocked']} deleted={resp['deleted']} "
+                f"elapsed_ms={resp['elapsed_ms']}: {names}",
+                file=sys.stderr,
+                flush=True,
+            )
+        delay = EXPIRE_RECHECK
+        next_at = resp.get("next_at")
+        if next_at:
+            # +1 detik: pastikan date.today() sudah berganti saat bangun
+            delay = min(delay, max(1.0, next_at - time.time() + 1))
+        await asyncio.sleep(delay)
+
+async def handle_metrics_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Endpoint scrape minimal: GET /metrics -> text exposition Prometheus, selain itu 404."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # buang header request
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] == "/metrics":
+            status, ctype, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", metrics.render_prometheus()
+        else:
+            status, ctype, body = "404 Not Found", "text/plain; charset=utf-8", "not found\n"
+        data = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+            + data
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve_async():
+    from .usage import collect_usage
+    from .facts import get_facts, refresh_public_ip
+    from .xray_config import set_write_coalesce, flush_config
+
+    s = setup_socket()
+    set_write_coalesce(CONFIG_WRITE_COALESCE)
+    loop = asyncio.get_running_loop()
+    # warm-up cache host facts supaya add pertama tidak menunggu curl
+    loop.run_in_executor(None, get_facts)
+    dispatcher = Dispatcher()
+    writer_task = asyncio.create_task(dispatcher.run_writer())
+    usage_task = asyncio.create_task(run_periodic("usage", USAGE_POLL_INTERVAL, collect_usage))
+    enforce_task = asyncio.create_task(enforce_loop(dispatcher)) if ENFORCE_INTERVAL > 0 else None
+    expire_task = asyncio.create_task(expire_loop(dispatcher)) if EXPIRE_MODE != "off" else None
+    facts_task = asyncio.create_task(run_periodic("facts", FACTS_IP_TTL, refresh_public_ip))
+    metrics_task = None
+    if METRICS_TEXTFILE:
+        metrics_task = asyncio.create_task(
+            run_periodic("metrics", METRICS_INTERVAL, lambda: metrics.write_textfile(METRICS_TEXTFILE))
+        )
+    metrics_http = None
+    if METRICS_HTTP_PORT:
+        metrics_http = await asyncio.start_server(handle_metrics_http, "127.0.0.1", METRICS_HTTP_PORT)
+    server = await asyncio.start_unix_server(
+        lambda r, w: handle_conn(dispatcher, r, w),
+        sock=s,
+        limit=MAX_REQUEST_BYTES,
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        usage_task.cancel()
+        facts_task.cancel()
+        if metrics_task:
+            metrics_task.cancel()
+        if metrics_http:
+            metrics_http.close()
+        if enforce_task:
+            enforce_task.cancel()
+        if expire_task:
+            expire_task.cancel()
+        writer_task.cancel()
+        dispatcher.shutdown()
+        flush_config()
+
+def serve():
+    try:
+        asyncio.run(serve_async())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(SOCK_PATH):
+            os.remove(SOCK_PATH)
@@ -0,0 +1,691 @@
+"""
+Satu store SQLite (WAL) untuk state akun: username, protocol, secret, quota,
+expiry, blocked dan usage. File lama (/opt/quota/<proto>/*.json, _blocked/*.json,
+/opt/<proto>/*.txt, _usage.json) bisa di-import sekali dengan import_legacy(),
+dan file quota/blocked bisa ditulis ulang dari DB dengan export_legacy()
+untuk autoscript.
+"""
+
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .constants import ACCOUNT_DB, QUOTA_DIR, DETAIL_BASE, USAGE_FILE, USAGE_PENDING_TTL, CONFIG, NEAR_LIMIT_RATIO
+from .io_utils import atomic_write
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    username    TEXT PRIMARY KEY,
+    protocol    TEXT NOT NULL,
+    secret      TEXT NOT NULL DEFAULT '',
+    quota_limit INTEGER NOT NULL DEFAULT 0,
+    created_at  TEXT NOT NULL DEFAULT '',
+    expired_at  TEXT NOT NULL DEFAULT '',
+    blocked     INTEGER NOT NULL DEFAULT 0,
+    blocked_at  TEXT,
+    used_up     INTEGER NOT NULL DEFAULT 0,
+    used_down   INTEGER NOT NULL DEFAULT 0,
+    version     INTEGER NOT NULL DEFAULT 1,
+    updated_at  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS accounts_expiry ON accounts (expired_at, username);
+CREATE INDEX IF NOT EXISTS accounts_proto_expiry ON accounts (protocol, expired_at, username);
+CREATE INDEX IF NOT EXISTS accounts_blocked ON accounts (blocked) WHERE blocked = 1;
+CREATE TABLE IF NOT EXISTS usage_pending (
+    username   TEXT PRIMARY KEY,
+    used_up    INTEGER NOT NULL DEFAULT 0,
+    used_down  INTEGER NOT NULL DEFAULT 0,
+    first_seen INTEGER NOT NULL
+);
+"""
+
+# Ringkasan armada (action summary) dipelihara inkremental oleh trigger: setiap insert/
+# update/delete di accounts menggeser counter di account_stats (per protocol, blocked,
+# quota_state) dan account_expiry (per protocol, blocked, tanggal expiry). Karena jalan
+# di dalam transaksi yang sama, ringkasan selalu konsisten, juga untuk proses lain (CLI).
+# quota_state memakai NEAR_LIMIT_RATIO saat trigger dibuat; jika setting berubah,
+# trigger dibuat ulang dan tabel ringkasan dihitung ulang sekali (_init_summary).
+SUMMARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS account_stats (
+    protocol    TEXT NOT NULL,
+    blocked     INTEGER NOT NULL,
+    quota_state TEXT NOT NULL,
+    n           INTEGER NOT NULL DEFAULT 0,
+    quota_total INTEGER NOT NULL DEFAULT 0,
+    used_total  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (protocol, blocked, quota_state)
+);
+CREATE TABLE IF NOT EXISTS account_expiry (
+    protocol   TEXT NOT NULL,
+    blocked    INTEGER NOT NULL,
+    expired_at TEXT NOT NULL,
+    n          INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (protocol, blocked, expired_at)
+);
+"""
+
+SUMMARY_VERSION = "1"
+QUOTA_STATES = ("unlimited", "ok", "near", "over")
+
+
+def _quota_state_sql(r: str, ratio: float) -> str:
+    used = f"{r}.used_up + {r}.used_down"
+    return (
+        f"CASE WHEN {r}.quota_limit <= 0 THEN 'unlimited' "
+        f"WHEN {used} >= {r}.quota_limit THEN 'over' "
+        f"WHEN {used} >= {r}.quota_limit * {float(ratio)!r} THEN 'near' ELSE 'ok' END"
+    )
+
+
+def _summary_triggers(ratio: float) -> List[str]:
+    def stats_add(r: str) -> str:
+        return f"""
+    INSERT INTO account_stats (protocol, blocked, quota_state, n, quota_total, used_total)
+    VALUES ({r}.protocol, {r}.blocked, {_quota_state_sql(r, ratio)}, 1, {r}.quota_limit, {r}.used_up + {r}.used_down)
+    ON CONFLICT (protocol, blocked, quota_state) DO UPDATE SET
+        n = n + 1, quota_total = quota_total + excluded.quota_total, used_total = used_total + excluded.used_total;"""
+
+    def stats_sub(r: str) -> str:
+        return f"""
+    UPDATE account_stats SET
+        n = n - 1, quota_total = quota_total - {r}.quota_limit, used_total = used_total - ({r}.used_up + {r}.used_down)
+    WHERE protocol = {r}.protocol AND blocked = {r}.blocked AND quota_state = {_quota_state_sql(r, ratio)};"""
+
+    def expiry_add(r: str) -> str:
+        return f"""
+    INSERT INTO account_expiry (protocol, blocked, expired_at, n) VALUES ({r}.protocol, {r}.blocked, {r}.expired_at, 1)
+    ON CONFLICT (protocol, blocked, expired_at) DO UPDATE SET n = n + 1;"""
+
+    def expiry_sub(r: str) -> str:
+        return f"""
+    UPDATE account_expiry SET n = n - 1
+    WHERE protocol = {r}.protocol AND blocked = {r}.blocked AND expired_at = {r}.expired_at;"""
+
+    return [
+        f"CREATE TRIGGER accounts_summary_ins AFTER INSERT ON accounts BEGIN{stats_add('NEW')}{expiry_add('NEW')}\nEND",
+        f"CREATE TRIGGER accounts_summary_del AFTER DELETE ON accounts BEGIN{stats_sub('OLD')}{expiry_sub('OLD')}\nEND",
+        "CREATE TRIGGER accounts_stats_upd AFTER UPDATE OF protocol, quota_limit, used_up, used_down, blocked ON accounts"
+        f" BEGIN{stats_sub('OLD')}{stats_add('NEW')}\nEND",
+        "CREATE TRIGGER accounts_expiry_upd AFTER UPDATE OF protocol, blocked, expired_at ON accounts"
+        f" BEGIN{expiry_sub('OLD')}{expiry_add('NEW')}\nEND",
+    ]
+
+
+SUMMARY_TRIGGERS = ("accounts_summary_ins", "accounts_summary_del", "accounts_stats_upd", "accounts_expiry_upd")
+
+
+def _init_summary(conn: sqlite3.Connection) -> None:
+    """Pasang trigger ringkasan; hitung ulang tabel ringkasan jika versi/rasio berubah (DB lama)."""
+    conn.executescript(SUMMARY_SCHEMA)
+    want = f"{SUMMARY_VERSION}:{float(NEAR_LIMIT_RATIO)!r}"
+    r = conn.execute("SELECT value FROM meta WHERE key = 'summary'").fetchone()
+    if r is not None and r[0] == want:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        r = conn.execute("SELECT value FROM meta WHERE key = 'summary'").fetchone()
+        if r is None or r[0] != want:
+            for t in SUMMARY_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {t}")
+            for stmt in _summary_triggers(NEAR_LIMIT_RATIO):
+                conn.execute(stmt)
+            conn.execute("DELETE FROM account_stats")
+            conn.execute("DELETE FROM account_expiry")
+            conn.execute(
+                f"""INSERT INTO account_stats (protocol, blocked, quota_state, n, quota_total, used_total)
+                SELECT protocol, blocked, {_quota_state_sql("a", NEAR_LIMIT_RATIO)} AS st,
+                       COUNT(*), SUM(quota_limit), SUM(used_up + used_down)
+                FROM accounts a GROUP BY protocol, blocked, st"""
+            )
+            conn.execute(
+                """INSERT INTO account_expiry (protocol, blocked, expired_at, n)
+                SELECT protocol, blocked, expired_at, COUNT(*) FROM accounts GROUP BY protocol, blocked, expired_at"""
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('summary', ?)", (want,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+FIELDS = ("protocol", "secret", "quota_limit", "created_at", "expired_at", "blocked", "blocked_at", "used_up", "used_down")
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    ACCOUNT_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(ACCOUNT_DB), timeout=10, isolation_level=None, check_same_thread=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=10000")
+    return conn
+
+
+def db() -> sqlite3.Connection:
+    """Koneksi per-thread (reader pool + writer thread masing-masing punya koneksi sendiri)."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    with _init_lock:
+        fresh = not ACCOUNT_DB.exists()
+        conn = _connect()
+        if not _initialized:
+            conn.executescript(SCHEMA)
+            _init_summary(conn)
+            try:
+                ACCOUNT_DB.chmod(0o600)
+            except Exception:
+                pass
+            _local.conn = conn
+            if _legacy_import_pending(conn, fresh):
+                try:
+                    import_legacy()
+                except Exception as e:
+                    # penanda tetap "pending" dan _initialized tetap False: koneksi
+                    # berikutnya (thread lain / proses berikutnya) mencoba import lagi
+                    print(f"[store] legacy import failed, will retry: {e}", file=sys.stderr, flush=True)
+                    return conn
+            _initialized = True
+    _local.conn = conn
+    return conn
+
+
+def _legacy_import_pending(conn: sqlite3.Connection, fresh: bool) -> bool:
+    """
+    Status import sekali dari layout file lama (meta 'legacy_import': pending/done).
+    DB baru dimulai pending; DB dari versi tanpa penanda dianggap sudah di-import
+    kecuali tabel accounts masih kosong (import pertamanya gagal).
+    """
+    r = conn.execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()
+    if r is not None:
+        return r[0] != "done"
+    if fresh or conn.execute("SELECT 1 FROM accounts LIMIT 1").fetchone() is None:
+        state = "pending"
+    else:
+        state = "done"
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_import', ?)", (state,))
+    return state != "done"
+
+
+class _tx:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK."""
+
+    def __init__(self):
+        self.conn = db()
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _row(r: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+    if r is None:
+        return None
+    d = dict(r)
+    d["blocked"] = bool(d.get("blocked"))
+    d["used"] = int(d.get("used_up") or 0) + int(d.get("used_down") or 0)
+    return d
+
+
+def get(username: str) -> Optional[Dict[str, Any]]:
+    return _row(db().execute("SELECT * FROM accounts WHERE username = ?", (username,)).fetchone())
+
+
+def get_secret(username: str) -> str:
+    r = db().execute("SELECT secret FROM accounts WHERE username = ?", (username,)).fetchone()
+    return str(r["secret"] or "") if r else ""
+
+
+def _fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    fields = {k: v for k, v in fields.items() if k in FIELDS}
+    if "blocked" in fields:
+        fields["blocked"] = 1 if fields["blocked"] else 0
+    return fields
+
+
+def _upsert(conn: sqlite3.Connection, username: str, fields: Dict[str, Any]) -> None:
+    fields = _fields(fields)
+    now = int(time.time())
+    cur = conn.execute("SELECT 1 FROM accounts WHERE username = ?", (username,)).fetchone()
+    if cur is None:
+        cols = ["username", "updated_at", *fields.keys()]
+        vals = [username, now, *fields.values()]
+        conn.execute(
+            f"INSERT INTO accounts ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})",
+            vals,
+        )
+    elif fields:
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        conn.execute(
+            f"UPDATE accounts SET {sets}, version = version + 1, updated_at = ? WHERE username = ?",
+            [*fields.values(), now, username],
+        )
+
+
+def upsert(username: str, **fields: Any) -> None:
+    with _tx() as conn:
+        _upsert(conn, username, fields)
+
+
+def update(username: str, **fields: Any) -> bool:
+    """Ubah kolom baris yang sudah ada (tanpa insert). False jika akun belum ada di store."""
+    fields = _fields(fields)
+    if not fields:
+        return get(username) is not None
+    sets = ", ".join(f"{k} = ?" for k in fields)
+    with _tx() as conn:
+        cur = conn.execute(
+            f"UPDATE accounts SET {sets}, version = version + 1, updated_at = ? WHERE username = ?",
+            [*fields.values(), int(time.time()), username],
+        )
+        return cur.rowcount > 0
+
+
+def upsert_many(rows: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+    with _tx() as conn:
+        for username, fields in rows:
+            _upsert(conn, username, fields)
+
+
+def set_blocked(username: str, blocked: bool, blocked_at: Optional[str] = None) -> None:
+    set_blocked_many([username], blocked, blocked_at)
+
+
+def set_blocked_many(usernames: Iterable[str], blocked: bool, blocked_at: Optional[str] = None) -> None:
+    now = int(time.time())
+    with _tx() as conn:
+        conn.executemany(
+            "UPDATE accounts SET blocked = ?, blocked_at = ?, version = version + 1, updated_at = ? WHERE username = ?",
+            [(1 if blocked else 0, blocked_at if blocked else None, now, u) for u in usernames],
+        )
+
+
+def delete(username: str) -> None:
+    delete_many([username])
+
+
+def delete_many(usernames: Iterable[str]) -> None:
+    with _tx() as conn:
+        conn.executemany("DELETE FROM accounts WHERE username = ?", [(u,) for u in usernames])
+
+
+def add_usage(deltas: Dict[str, Tuple[int, int]]) -> Dict[str, List[str]]:
+    """
+    Tambah delta (uplink, downlink) untuk banyak user dalam satu transaksi.
+
+    Counter Xray sudah di-reset saat delta dibaca, jadi delta untuk email yang belum
+    punya baris (sebelum import_legacy, atau add/del yang balapan dengan poll) tidak
+    dibuang: ditahan di usage_pending dan diterapkan di panggilan berikutnya setelah
+    akunnya ada. Tahanan yang lebih tua dari USAGE_PENDING_TTL dibuang.
+    Return {"pending": email yang baru ditahan, "dropped": email yang tahanannya dibuang}.
+    """
+    out: Dict[str, List[str]] = {"pending": [], "dropped": []}
+    conn = db()
+    if not deltas and conn.execute("SELECT 1 FROM usage_pending LIMIT 1").fetchone() is None:
+        return out
+    now = int(time.time())
+    with _tx() as conn:
+        held = {r[0]: (int(r[1]), int(r[2]), int(r[3])) for r in conn.execute("SELECT * FROM usage_pending")}
+        merged = {u: [int(up), int(down)] for u, (up, down) in deltas.items()}
+        for u, (up, down, _) in held.items():
+            v = merged.setdefault(u, [0, 0])
+            v[0] += up
+            v[1] += down
+
+        missing = []
+        for u, (up, down) in merged.items():
+            cur = conn.execute(
+                "UPDATE accounts SET used_up = used_up + ?, used_down = used_down + ?, updated_at = ? WHERE username = ?",
+                (up, down, now, u),
+            )
+            if cur.rowcount == 0:
+                missing.append(u)
+
+        conn.execute("DELETE FROM usage_pending")
+        keep = []
+        for u in missing:
+            first_seen = held[u][2] if u in held else now
+            if now - first_seen > USAGE_PENDING_TTL:
+                out["dropped"].append(u)
+                continue
+            if u not in held:
+                out["pending"].append(u)
+            keep.append((u, merged[u][0], merged[u][1], first_seen))
+        conn.executemany("INSERT INTO usage_pending (username, used_up, used_down, first_seen) VALUES (?, ?, ?, ?)", keep)
+    return out
+
+
+def pending_usage() -> Dict[str, Tuple[int, int]]:
+    """Delta usage yang masih ditahan (email tanpa baris di accounts)."""
+    return {r[0]: (int(r[1]), int(r[2])) for r in db().execute("SELECT username, used_up, used_down FROM usage_pending")}
+
+
+def get_usage(username: str) -> Tuple[int, int]:
+    r = db().execute("SELECT used_up, used_down FROM accounts WHERE username = ?", (username,)).fetchone()
+    return (int(r["used_up"]), int(r["used_down"])) if r else (0, 0)
+
+
+def usage_totals() -> Dict[str, int]:
+    """Total usage (up + down) semua akun dalam satu query: username -> byte."""
+    return {r[0]: int(r[1]) for r in db().execute("SELECT username, used_up + used_down FROM accounts")}
+
+
+def get_many(usernames: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    usernames = list(usernames)
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(usernames), 500):
+        part = usernames[i: i + 500]
+        rows = db().execute(
+            f"SELECT * FROM accounts WHERE username IN ({', '.join('?' for _ in part)})", part
+        ).fetchall()
+        for r in rows:
+            out[r["username"]] = _row(r)
+    return out
+
+
+def blocked_usernames() -> Set[str]:
+    return {r[0] for r in db().execute("SELECT username FROM accounts WHERE blocked = 1")}
+
+
+def near_limit_usernames(ratio: float) -> Set[str]:
+    """Akun dengan quota (> 0) yang pemakaiannya >= ratio * quota_limit."""
+    rows = db().execute(
+        "SELECT username FROM accounts WHERE quota_limit > 0 AND used_up + used_down >= quota_limit * ?",
+        (ratio,),
+    )
+    return {r[0] for r in rows}
+
+
+def count(protocol: Optional[str] = None) -> int:
+    if protocol:
+        return int(db().execute("SELECT COUNT(*) FROM accounts WHERE protocol = ?", (protocol,)).fetchone()[0])
+    return int(db().execute("SELECT COUNT(*) FROM accounts").fetchone()[0])
+
+
+# bucket sisa hari (akun tidak di-block): (nama, min, max) inklusif, None = tanpa batas
+EXPIRY_BUCKETS = (("expired", None, -1), ("0-3d", 0, 3), ("4-7d", 4, 7), ("8-30d", 8, 30), ("31d+", 31, None))
+SUMMARY_PROTOS = ("vless", "vmess", "trojan", "allproto")
+
+
+def _expiry_bucket(expired_at: str, today: date) -> str:
+    try:
+        days = (date.fromisoformat(expired_at) - today).days
+    except ValueError:
+        return "none"
+    for name, lo, hi in EXPIRY_BUCKETS:
+        if (lo is None or days >= lo) and (hi is None or days <= hi):
+            return name
+    return "none"
+
+
+def summary(today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Agregat armada dari tabel ringkasan (dipelihara trigger), tanpa scan tabel accounts.
+    Status per akun: blocked; selain itu expired (expired_at < hari ini) atau active.
+    near_limit/over_quota dan bucket expiry hanya menghitung akun yang tidak di-block.
+    """
+    today = today or date.today()
+    conn = db()
+    keys = ("total", "active", "blocked", "expired", "near_limit", "over_quota", "unlimited", "quota_total", "used_total")
+    protos: Dict[str, Dict[str, int]] = {p: dict.fromkeys(keys, 0) for p in SUMMARY_PROTOS}
+    expiry = dict.fromkeys([b[0] for b in EXPIRY_BUCKETS] + ["none"], 0)
+
+    rows = conn.execute(
+        "SELECT protocol, blocked, quota_state, n, quota_total, used_total FROM account_stats WHERE n > 0"
+    ).fetchall()
+    for proto, blocked, state, n, quota_total, used_total in rows:
+        d = protos.setdefault(proto, dict.fromkeys(keys, 0))
+        d["total"] += n
+        d["quota_total"] += quota_total
+        d["used_total"] += used_total
+        if state == "unlimited":
+            d["unlimited"] += n
+        if blocked:
+            d["blocked"] += n
+        elif state == "near":
+            d["near_limit"] += n
+        elif state == "over":
+            d["over_quota"] += n
+
+    for proto, blocked, expired_at, n in conn.execute(
+        "SELECT protocol, blocked, expired_at, n FROM account_expiry WHERE n > 0 AND blocked = 0"
+    ).fetchall():
+        bucket = _expiry_bucket(expired_at, today)
+        expiry[bucket] += n
+        if bucket == "expired":
+            protos.setdefault(proto, dict.fromkeys(keys, 0))["expired"] += n
+
+    totals = dict.fromkeys(keys, 0)
+    for d in protos.values():
+        d["active"] = d["total"] - d["blocked"] - d["expired"]
+        for k in keys:
+            totals[k] += d[k]
+    return {"as_of": today.isoformat(), **totals, "protocols": protos, "expiry": expiry}
+
+
+def iter_accounts(protocol: Optional[str] = None) -> List[Dict[str, Any]]:
+    if protocol:
+        rows = db().execute(
+            "SELECT * FROM accounts WHERE protocol = ? ORDER BY expired_at, username", (protocol,)
+        ).fetchall()
+    else:
+        rows = db().execute("SELECT * FROM accounts ORDER BY expired_at, username").fetchall()
+    return [_row(r) for r in rows]
+
+
+def accounts_after(after: str = "", protocol: Optional[str] = None, limit: int = 500) -> List[Dict[str, Any]]:
+    """
+    Maksimal `limit` akun dengan username > `after` (urut username, keyset lewat primary key).
+    Tiap panggilan query tersendiri, jadi batch berikutnya melihat perubahan terbaru
+    (beda dengan iter_batches yang membaca satu snapshot selama cursor terbuka).
+    """
+    sql = "SELECT * FROM accounts WHERE username > ?"
+    args: List[Any] = [after]
+    if protocol:
+        sql += " AND protocol = ?"
+        args.append(protocol)
+    sql += " ORDER BY username LIMIT ?"
+    args.append(limit)
+    return [_row(r) for r in db().execute(sql, args).fetchall()]
+
+
+def iter_batches(
+    protocol: Optional[str] = None,
+    expired_from: Optional[str] = None,
+    expired_to: Optional[str] = None,
+    batch: int = 500,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Semua akun (urut expired_at, username) per batch `batch` baris lewat satu cursor,
+    jadi memory tetap kecil berapa pun jumlah akun. Filter expiry inklusif (YYYY-MM-DD).
+    Harus dikonsumsi di thread yang sama (koneksi per-thread).
+    """
+    where, args = [], []
+    if protocol:
+        where.append("protocol = ?")
+        args.append(protocol)
+    if expired_from:
+        where.append("expired_at >= ?")
+        args.append(expired_from)
+    if expired_to:
+        where.append("expired_at <= ?")
+        args.append(expired_to)
+    sql = "SELECT * FROM accounts"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY expired_at, username"
+    cur = db().execute(sql, args)
+    try:
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            yield [_row(r) for r in rows]
+    finally:
+        cur.close()
+
+
+# ---------------------------------------------------------------------------
+# migrasi dari layout file lama
+# ---------------------------------------------------------------------------
+
+_SECRET_RE = re.compile(r"UUID/Pass\s*:\s*([A-Za-z0-9-]{8,})")
+
+
+def _read_json(p: Path) -> Any:
+    return json.loads(p.read_text(encoding="utf-8"))
+
+
+def _config_secrets() -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    try:
+        cfg = _read_json(CONFIG)
+    except Exception:
+        return out
+    for ib in cfg.get("inbounds", []) if isinstance(cfg, dict) else []:
+        if not isinstance(ib, dict) or ib.get("protocol") not in ("vless", "vmess", "trojan"):
+            continue
+        clients = (ib.get("settings") or {}).get("clients")
+        for c in clients if isinstance(clients, list) else []:
+            if not isinstance(c, dict) or not c.get("email"):
+                continue
+            s = c.get("password") if ib.get("protocol") == "trojan" else c.get("id")
+            if s:
+                out.setdefault(str(c["email"]), str(s))
+    return out
+
+
+def import_legacy() -> Dict[str, int]:
+    """
+    Import sekali dari /opt/quota + detail .txt + config.json + _usage.json.
+    Aman dijalankan ulang: baris yang sudah ada di-update dengan nilai dari file.
+    """
+    from .quota import read_quota_item
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    mtimes: Dict[str, float] = {}
+    for proto in ("vless", "vmess", "trojan", "allproto"):
+        d = QUOTA_DIR / proto
+        if not d.is_dir():
+            continue
+        for p in d.glob("*.json"):
+            item = read_quota_item(p, proto)
+            if item is None:
+                continue
+            try:
+                mtime = p.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            u = item["username"]
+            if u in mtimes and mtime < mtimes[u]:
+                continue
+            mtimes[u] = mtime
+            try:
+                ql = int(item.get("quota_limit") or 0)
+            except Exception:
+                ql = 0
+            rows[u] = {
+                "protocol": item["protocol"],
+                "quota_limit": ql,
+                "created_at": item["created_at"],
+                "expired_at": item["expired_at"],
+                "blocked": False,
+                "blocked_at": None,
+            }
+
+    cfg_secrets = _config_secrets()
+    for u, r in rows.items():
+        secret = cfg_secrets.get(u, "")
+        if not secret:
+            base = DETAIL_BASE["allproto"] if r["protocol"] == "allproto" else DETAIL_BASE[r["protocol"]]
+            try:
+                m = _SECRET_RE.search((base / f"{u}.txt").read_text(encoding="utf-8", errors="replace"))
+                secret = m.group(1).strip() if m else ""
+            except Exception:
+                secret = ""
+        r["secret"] = secret
+
+    blocked = 0
+    bdir = QUOTA_DIR / "_blocked"
+    if bdir.is_dir():
+        for p in bdir.glob("*.json"):
+            try:
+                obj = _read_json(p)
+            except Exception:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            u = str(obj.get("username") or p.stem)
+            r = rows.get(u)
+            if r is None:
+                proto = str(obj.get("protocol") or u.rsplit("@", 1)[-1])
+                r = rows[u] = {"protocol": proto}
+            r["blocked"] = True
+            r["blocked_at"] = obj.get("blocked_at")
+            if obj.get("secret"):
+                r["secret"] = str(obj["secret"])
+            blocked += 1
+
+    existing = {r["username"] for r in db().execute("SELECT username FROM accounts")}
+
+    usage = 0
+    try:
+        users = _read_json(USAGE_FILE).get("users") or {}
+        for u, v in users.items():
+            # usage di DB lebih baru dari _usage.json; hanya isi untuk akun baru
+            if u in rows and u not in existing and isinstance(v, list) and len(v) == 2:
+                rows[u]["used_up"] = int(v[0] or 0)
+                rows[u]["used_down"] = int(v[1] or 0)
+                usage += 1
+    except Exception:
+        pass
+
+    for u in existing.intersection(rows):
+        if not rows[u].get("secret"):
+            rows[u].pop("secret", None)
+
+    # baris + penanda selesai dalam satu transaksi: import yang gagal dicoba lagi utuh
+    with _tx() as conn:
+        for username, fields in rows.items():
+            _upsert(conn, username, fields)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_import', 'done')")
+    return {"accounts": len(rows), "blocked": blocked, "usage": usage}
+
+
+def export_legacy() -> Dict[str, int]:
+    """Tulis ulang /opt/quota/<proto>/*.json dan _blocked/*.json dari DB (kompatibilitas autoscript)."""
+    quota = 0
+    blocked = 0
+    for a in iter_accounts():
+        u = a["username"]
+        qobj = {
+            "username": u,
+            "protocol": a["protocol"],
+            "quota_limit": int(a["quota_limit"] or 0),
+            "created_at": a["created_at"],
+            "expired_at": a["expired_at"],
+        }
+        atomic_write(QUOTA_DIR / a["protocol"] / f"{u}.json", (json.dumps(qobj, indent=2) + "\n").encode("utf-8"), 0o644, 0, 0)
+        quota += 1
+        if a["blocked"]:
+            bobj = {"username": u, "protocol": a["protocol"], "secret": a["secret"], "blocked_at": a["blocked_at"]}
+            atomic_write(QUOTA_DIR / "_blocked" / f"{u}.json", (json.dumps(bobj, indent=2) + "\n").encode("utf-8"), 0o600, 0, 0)
+            blocked += 1
+    return {"quota_files": quota, "blocked_files": blocked}
@@ -1,28 +1,130 @@
 import subprocess
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
 
-def restart_xray() -> None:
-    subprocess.check_call(["systemctl", "restart", "xray"])
+from .constants import STATUS_CACHE_TTL
+from . import adapters
+from .metrics import timed
 
-def svc_state(name: str) -> dict:
-    try:
+# satu `systemctl show` untuk semua unit: state + uptime + memory + restart count
+SHOW_PROPS = (
+    "Id",
+    "LoadState",
+    "ActiveState",
+    "SubState",
+    "MainPID",
+    "ActiveEnterTimestampMonotonic",
+    "MemoryCurrent",
+    "NRestarts",
+)
+
+_lock = threading.Lock()
+# nama unit -> (waktu query monotonic, state)
+_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+class SystemdControl:
+    """Adapter service control produksi: systemctl."""
+
+    def restart(self, unit: str) -> None:
+        subprocess.check_call(["systemctl", "restart", unit])
+
+    def show(self, names: Sequence[str], props: Sequence[str]) -> Dict[str, Dict[str, str]]:
         p = subprocess.run(
-            ["systemctl", "is-active", name],
+            ["systemctl", "show", "--no-pager", f"--property={','.join(props)}", "--", *names],
             capture_output=True,
-            text=True
+            text=True,
         )
-        state = (p.stdout or "").strip()
-        err = (p.stderr or "").strip()
+        # output: satu blok "Key=Value" per unit, dipisah baris kosong, urut sesuai argumen
+        blocks = [b for b in (p.stdout or "").split("\n\n") if b.strip()]
+        if not blocks:
+            raise RuntimeError((p.stderr or "").strip() or "no systemctl output")
+        return {
+            name: dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+            for name, block in zip(names, blocks)
+        }
 
-        # systemctl is-active: returncode 0 only when active
-        active = (state == "active")
 
-        out = {
-            "name": name,
-            "active": bool(active),
-            "state": state or "unknown",
-        }
-        if err:
-            out["error"] = err[:300]
-        return out
-    except Exception as e:
-        return {"name": name, "active": False, "state": "unknown", "error": str(e)[:300]}
\ No newline at end of file
+@timed("restart")
+def restart_xray() -> None:
+    try:
+        adapters.service().restart("xray")
+    finally:
+        invalidate_units()
+
+
+def invalidate_units() -> None:
+    """Buang cache state unit (dipanggil setelah backend sendiri mengubah state service)."""
+    with _lock:
+        _cache.clear()
+
+
+def _int_prop(v: str) -> Optional[int]:
+    try:
+        n = int(v)
+    except (TypeError, ValueError):
+        return None
+    # systemd memakai UINT64_MAX untuk "tidak diketahui" (mis. MemoryCurrent tanpa accounting)
+    return None if n < 0 or n >= 2 ** 64 - 1 else n
+
+
+def _unit_from_props(name: str, props: Dict[str, str], now_mono: float) -> Dict[str, Any]:
+    state = props.get("ActiveState") or "unknown"
+    out: Dict[str, Any] = {
+        "name": name,
+        "active": state == "active",
+        "state": state,
+        "sub_state": props.get("SubState") or None,
+        "pid": _int_prop(props.get("MainPID", "")) or None,
+        "uptime_s": None,
+        "memory_bytes": _int_prop(props.get("MemoryCurrent", "")),
+        "restarts": _int_prop(props.get("NRestarts", "")),
+    }
+    if props.get("LoadState") == "not-found":
+        out["error"] = f"unit {name} not found"
+    since = _int_prop(props.get("ActiveEnterTimestampMonotonic", ""))
+    if state == "active" and since:
+        # timestamp systemd = CLOCK_MONOTONIC (us), sama dengan time.monotonic() di Linux
+        out["uptime_s"] = max(0, int(now_mono - since / 1_000_000))
+    return out
+
+
+@timed("systemctl_show")
+def _query_units(names: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+    try:
+        props = adapters.service().show(names, SHOW_PROPS)
+        err = ""
+    except (OSError, RuntimeError) as e:
+        props, err = {}, str(e)
+    now_mono = time.monotonic()
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in names:
+        if name in props:
+            out[name] = _unit_from_props(name, props[name], now_mono)
+        else:
+            out[name] = {"name": name, "active": False, "state": "unknown", "error": (err or "no systemctl output")[:300]}
+    return out
+
+
+def units_state(names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    State beberapa unit dari satu `systemctl show`, di-cache STATUS_CACHE_TTL detik.
+    Pemanggil paralel menunggu satu query yang sama (tidak fork berulang).
+    """
+    names = tuple(dict.fromkeys(names))
+    with _lock:
+        now = time.monotonic()
+        stale = tuple(n for n in names if n not in _cache or now - _cache[n][0] >= STATUS_CACHE_TTL)
+        if stale:
+            try:
+                fresh = _query_units(stale)
+            except Exception as e:
+                fresh = {n: {"name": n, "active": False, "state": "unknown", "error": str(e)[:300]} for n in stale}
+            for n, st in fresh.items():
+                _cache[n] = (now, st)
+        return {n: dict(_cache[n][1]) for n in names}
+
+
+def svc_state(name: str) -> dict:
+    return units_state((name,))[name]
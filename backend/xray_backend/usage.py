@@ -0,0 +1,92 @@
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from . import store
+
+
+def get_used(email: str) -> int:
+    up, down = store.get_usage(email)
+    return up + down
+
+
+def used_by_user() -> Dict[str, int]:
+    """Usage semua akun sekaligus (satu query store), untuk scan seperti enforce."""
+    return store.usage_totals()
+
+
+def get_usage(email: str) -> Dict[str, int]:
+    up, down = store.get_usage(email)
+    return {"uplink": up, "downlink": down, "used": up + down}
+
+
+# delta yang sudah di-reset di Xray tapi gagal masuk store (mis. "database is locked"):
+# ditahan di memory dan digabung ke tick berikutnya supaya trafik tidak hilang
+_unsaved_lock = threading.Lock()
+_unsaved: Dict[str, List[int]] = {}
+
+
+def _parse_deltas(stats: Dict[str, int]) -> Dict[str, List[int]]:
+    deltas: Dict[str, List[int]] = {}
+    for name, value in stats.items():
+        parts = name.split(">>>")
+        if len(parts) != 4 or parts[0] != "user" or parts[2] != "traffic":
+            continue
+        if value <= 0:
+            continue
+        idx = 0 if parts[3] == "uplink" else 1 if parts[3] == "downlink" else -1
+        if idx < 0:
+            continue
+        v = deltas.setdefault(parts[1], [0, 0])
+        v[idx] += value
+    return deltas
+
+
+def unsaved_usage() -> Dict[str, Tuple[int, int]]:
+    """Delta yang menunggu dicoba lagi karena tulis ke store gagal."""
+    with _unsaved_lock:
+        return {u: (v[0], v[1]) for u, v in _unsaved.items()}
+
+
+def add_deltas(stats: Dict[str, int]) -> int:
+    """
+    Tambahkan delta counter "user>>>EMAIL>>>traffic>>>uplink|downlink" ke account store
+    (satu transaksi untuk semua user). Return jumlah user yang berubah.
+
+    Counter Xray sudah di-reset saat delta ini dibaca, jadi jika tulis ke store gagal,
+    delta ditahan di memory dan ikut ditulis di panggilan berikutnya (exception diteruskan).
+    """
+    deltas = _parse_deltas(stats)
+    with _unsaved_lock:
+        for u, (up, down) in _unsaved.items():
+            v = deltas.setdefault(u, [0, 0])
+            v[0] += up
+            v[1] += down
+        _unsaved.clear()
+        try:
+            res = store.add_usage({u: (v[0], v[1]) for u, v in deltas.items()})
+        except Exception:
+            _unsaved.update(deltas)
+            raise
+    if res["pending"]:
+        print(f"[usage] holding usage for {len(res['pending'])} unknown user(s): {', '.join(res['pending'][:20])}",
+              file=sys.stderr, flush=True)
+    if res["dropped"]:
+        print(f"[usage] dropped held usage for {len(res['dropped'])} user(s): {', '.join(res['dropped'][:20])}",
+              file=sys.stderr, flush=True)
+    return len(deltas)
+
+
+def collect_usage() -> Dict[str, Any]:
+    """
+    Satu tick collector: satu QueryStats (reset) untuk semua user, berapapun jumlahnya.
+    Delta tick yang gagal disimpan dicoba lagi di tick berikutnya (lihat add_deltas).
+    """
+    from .xray_config import config_snapshot
+    from .xray_api import query_stats
+
+    t0 = time.monotonic()
+    stats = query_stats(config_snapshot(), "user>>>", reset=True)
+    changed = add_deltas(stats)
+    return {"counters": len(stats), "users_changed": changed, "elapsed_ms": int((time.monotonic() - t0) * 1000)}
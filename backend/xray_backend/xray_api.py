@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from .constants import XRAY_BIN, XRAY_API_SERVER, XRAY_API_TIMEOUT, HOT_APPLY
+from .system import restart_xray
+from .xray_config import flush_config
+from .metrics import timed
+from . import adapters
+
+
+class XrayApiError(Exception):
+    pass
+
+
+def _xray_bin() -> str:
+    return XRAY_BIN or shutil.which("xray") or "/usr/local/bin/xray"
+
+
+class XrayCliApi:
+    """Adapter Xray API produksi: `xray api <cmd> --server=...` (gRPC lewat CLI xray)."""
+
+    def server(self, cfg: Dict[str, Any], service: str) -> Optional[str]:
+        """
+        Alamat gRPC API Xray ("host:port") dari section "api" + inbound dengan tag yang sama.
+        None jika API tidak aktif atau service yang dibutuhkan tidak di-enable.
+        """
+        override = str(XRAY_API_SERVER or "").strip()
+        if override:
+            return override
+
+        api = cfg.get("api")
+        if not isinstance(api, dict):
+            return None
+        services = api.get("services")
+        if not isinstance(services, list) or service not in services:
+            return None
+
+        listen = str(api.get("listen") or "").strip()
+        if listen:
+            return listen
+
+        tag = api.get("tag")
+        inbounds = cfg.get("inbounds", [])
+        if not tag or not isinstance(inbounds, list):
+            return None
+        for ib in inbounds:
+            if not isinstance(ib, dict) or ib.get("tag") != tag:
+                continue
+            port = ib.get("port")
+            if not port:
+                return None
+            host = str(ib.get("listen") or "127.0.0.1")
+            if host in ("0.0.0.0", "::"):
+                host = "127.0.0.1"
+            return f"{host}:{port}"
+        return None
+
+    def call(self, cmd: str, server: str, args: List[str], payload: Optional[Dict[str, Any]] = None) -> str:
+        if payload is None:
+            return self._run(cmd, server, args)
+        fd, tmp = tempfile.mkstemp(prefix=f"xray-api-{cmd}-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            return self._run(cmd, server, [*args, tmp])
+        finally:
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+
+    def _run(self, cmd: str, server: str, args: List[str]) -> str:
+        argv = [_xray_bin(), "api", cmd, f"--server={server}", *args]
+        try:
+            p = subprocess.run(argv, capture_output=True, text=True, timeout=XRAY_API_TIMEOUT)
+        except FileNotFoundError:
+            raise XrayApiError("xray binary not found")
+        except subprocess.TimeoutExpired:
+            raise XrayApiError(f"xray api {cmd} timeout")
+        if p.returncode != 0:
+            err = (p.stderr or p.stdout or "").strip()
+            raise XrayApiError(f"xray api {cmd} failed: {err[:300]}")
+        return p.stdout or ""
+
+
+def api_server(cfg: Dict[str, Any], service: str) -> Optional[str]:
+    return adapters.xray_api().server(cfg, service)
+
+
+def _run_api(cmd: str, server: str, args: List[str]) -> str:
+    return adapters.xray_api().call(cmd, server, args)
+
+
+def _run_api_with_json(cmd: str, server: str, obj: Dict[str, Any], extra: Iterable[str] = ()) -> str:
+    return adapters.xray_api().call(cmd, server, list(extra), payload=obj)
+
+
+def _proto_inbounds(cfg: Dict[str, Any], protos: Iterable[str]) -> List[Dict[str, Any]]:
+    protos = set(protos)
+    inbounds = cfg.get("inbounds", [])
+    if not isinstance(inbounds, list):
+        return []
+    out = []
+    for ib in inbounds:
+        if isinstance(ib, dict) and ib.get("protocol") in protos:
+            out.append(ib)
+    return out
+
+
+def add_users(cfg: Dict[str, Any], server: str, emails: Iterable[str]) -> None:
+    """
+    HandlerService AlterInbound (AddUserOperation) untuk semua client dengan email tsb,
+    satu panggilan `xray api adu` untuk seluruh inbound yang terdampak.
+    Client diambil dari cfg yang sudah dimodifikasi, jadi bentuknya sama persis dengan config.json.
+    """
+    emails = set(emails)
+    if not emails:
+        return
+    partial = []
+    for ib in _proto_inbounds(cfg, ("vless", "vmess", "trojan")):
+        clients = (ib.get("settings") or {}).get("clients")
+        if not isinstance(clients, list):
+            continue
+        picked = [c for c in clients if isinstance(c, dict) and c.get("email") in emails]
+        if not picked:
+            continue
+        if not ib.get("tag"):
+            raise XrayApiError("inbound without tag cannot be altered via API")
+        ib_part = {k: v for k, v in ib.items() if k != "settings"}
+        ib_part["settings"] = {**ib["settings"], "clients": picked}
+        partial.append(ib_part)
+    if partial:
+        _run_api_with_json("adu", server, {"inbounds": partial})
+
+
+def remove_users(cfg: Dict[str, Any], server: str, users: Dict[str, str]) -> None:
+    """
+    HandlerService AlterInbound (RemoveUserOperation).
+    users: email -> protocol ("allproto" = vless+vmess+trojan). Satu `xray api rmu` per inbound tag.
+    """
+    by_tag: Dict[str, List[str]] = {}
+    for email, proto in users.items():
+        protos = ("vless", "vmess", "trojan") if proto == "allproto" else (proto,)
+        for ib in _proto_inbounds(cfg, protos):
+            tag = ib.get("tag")
+            if not tag:
+                raise XrayApiError("inbound without tag cannot be altered via API")
+            by_tag.setdefault(tag, []).append(email)
+    for tag, emails in by_tag.items():
+        _run_api("rmu", server, [f"-tag={tag}", *emails])
+
+
+def push_routing(cfg: Dict[str, Any], server: str) -> None:
+    """RoutingService: ganti seluruh rule set runtime dengan routing dari cfg (urutan rule tetap)."""
+    routing = cfg.get("routing")
+    if not isinstance(routing, dict):
+        raise XrayApiError("config has no routing section")
+    obj = {"routing": {k: routing[k] for k in ("rules", "balancers") if k in routing}}
+    _run_api_with_json("adrules", server, obj)
+
+
+def query_stats(cfg: Dict[str, Any], pattern: str, reset: bool = False) -> Dict[str, int]:
+    """
+    StatsService QueryStats: satu RPC untuk semua counter yang cocok dengan pattern.
+    Dengan reset=True counter di Xray di-nol-kan, jadi nilai yang didapat adalah delta.
+    """
+    server = api_server(cfg, "StatsService")
+    if not server:
+        raise XrayApiError("StatsService not enabled")
+    args = [f"-pattern={pattern}"]
+    if reset:
+        args.append("-reset")
+    out = _run_api("statsquery", server, args)
+    try:
+        obj = json.loads(out or "{}")
+    except ValueError:
+        raise XrayApiError("invalid statsquery output")
+
+    stats: Dict[str, int] = {}
+    for st in obj.get("stat") or []:
+        if not isinstance(st, dict) or not st.get("name"):
+            continue
+        try:
+            stats[str(st["name"])] = int(st.get("value") or 0)
+        except (TypeError, ValueError):
+            continue
+    return stats
+
+
+@timed("apply")
+def apply_changes(
+    cfg: Dict[str, Any],
+    added: Iterable[str] = (),
+    removed: Optional[Dict[str, str]] = None,
+    routing: bool = False,
+) -> str:
+    """
+    Terapkan perubahan (yang sudah disimpan ke config.json) ke Xray yang sedang jalan.
+    Coba lewat API dulu; jika API tidak tersedia/gagal, fallback `systemctl restart xray`.
+    Return "api" atau "restart".
+    """
+    added = list(added)
+    removed = dict(removed or {})
+
+    if HOT_APPLY and (added or removed or routing):
+        try:
+            if added or removed:
+                server = api_server(cfg, "HandlerService")
+                if not server:
+                    raise XrayApiError("HandlerService not enabled")
+                if removed:
+                    remove_users(cfg, server, removed)
+                if added:
+                    add_users(cfg, server, added)
+            if routing:
+                server = api_server(cfg, "RoutingService")
+                if not server:
+                    raise XrayApiError("RoutingService not enabled")
+                push_routing(cfg, server)
+            return "api"
+        except XrayApiError:
+            pass
+
+    flush_config()
+    restart_xray()
+    return "restart"
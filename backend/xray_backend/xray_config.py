@@ -0,0 +1,462 @@
+"""
+Model in-memory config.json Xray.
+
+config.json di-parse sekali dan di-cache berdasarkan (inode, mtime, size); selama file
+tidak berubah, load_config() mengembalikan objek yang sama beserta index-nya:
+
+- email -> [(inbound, client), ...]   untuk email_exists / find_secret / remove_client
+- protocol -> [inbound, ...]          untuk append_client
+- rule routing "blocked" + set user   untuk blocked_rule_update (add/remove banyak user
+                                      sekaligus; set = index, list rule = cerminannya)
+
+Mutasi hanya dilakukan oleh writer (satu thread) lewat fungsi di modul ini supaya
+index tetap sinkron. Objek yang dimutasi tapi tidak disimpan (request gagal di tengah)
+ditandai dirty dan dibuang: load_config() berikutnya membaca ulang dari disk.
+
+Objek load_config() dimutasi in-place oleh writer, jadi reader di thread lain (reader
+pool server, collector usage, regen) memakai config_snapshot(): salinan terpisah dari
+versi tersimpan terakhir yang tidak pernah dimutasi, di-parse ulang hanya setelah save
+atau perubahan file.
+
+Persistensi: setiap save memindahkan versi lama ke ring backup gzip bernomor di
+CONFIG_BACKUP_DIR (CONFIG_BACKUP_KEEP terakhir). Di server, save yang berdekatan
+digabung (set_write_coalesce) dan flush_config() wajib dipanggil sebelum Xray
+membaca config dari disk (restart).
+"""
+
+import atexit
+import gzip
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .constants import CONFIG, CONFIG_BACKUP_DIR, CONFIG_BACKUP_KEEP
+from .io_utils import atomic_write, fsync_dir
+from .metrics import timed
+
+SECRET_FIELD = {"vless": "id", "vmess": "id", "trojan": "password"}
+
+
+class ConfigIndex:
+    def __init__(self, cfg: Dict[str, Any]):
+        self.clients: Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        self.inbounds: Dict[str, List[Dict[str, Any]]] = {}
+        self.blocked_rule: Optional[Dict[str, Any]] = None
+        self.blocked_users: Set[str] = set()
+
+        inbounds = cfg.get("inbounds", [])
+        for ib in inbounds if isinstance(inbounds, list) else []:
+            if not isinstance(ib, dict):
+                continue
+            proto = ib.get("protocol")
+            if proto not in SECRET_FIELD:
+                continue
+            self.inbounds.setdefault(proto, []).append(ib)
+            settings = ib.get("settings")
+            clients = settings.get("clients") if isinstance(settings, dict) else None
+            for c in clients if isinstance(clients, list) else []:
+                if isinstance(c, dict) and c.get("email"):
+                    self.clients.setdefault(c["email"], []).append((ib, c))
+
+        # identitas set inbound (tanpa client) untuk cache template link
+        self.inbounds_key: Tuple = tuple(
+            (proto, ib.get("tag"), ib.get("port"), json.dumps(ib.get("streamSettings"), sort_keys=True))
+            for proto in sorted(self.inbounds)
+            for ib in self.inbounds[proto]
+        )
+
+        self.blocked_rule = _find_blocked_rule(cfg)
+        if self.blocked_rule is not None:
+            self.blocked_users = {u for u in self.blocked_rule.get("user", []) if isinstance(u, str)}
+
+
+def _find_blocked_rule(cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    routing = cfg.get("routing")
+    if not isinstance(routing, dict):
+        return None
+    rules = routing.get("rules")
+    if not isinstance(rules, list):
+        return None
+
+    # satu pass; prioritas: rule bertanda dummy-block-user, lalu rule yang sudah punya
+    # "user": [...], lalu rule blocked apa pun (user list dibuat saat pertama kali dipakai)
+    with_users = first = None
+    for r in rules:
+        if not isinstance(r, dict) or r.get("outboundTag") != "blocked":
+            continue
+        users = r.get("user")
+        if isinstance(users, list):
+            if "dummy-block-user" in users:
+                return r
+            if with_users is None:
+                with_users = r
+        if first is None:
+            first = r
+    return with_users or first
+
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_state: Dict[str, Any] = {"sig": None, "cfg": None, "index": None, "dirty": False, "saves": 0}
+# index cfg lain (bukan milik load_config/config_snapshot): satu entry (cfg, index), ditukar atomik
+_foreign: Dict[str, Any] = {"entry": None}
+# salinan read-only untuk reader; key = ("save", nomor save) atau ("file", sig config.json)
+_snap_lock = threading.Lock()
+_snap: Dict[str, Any] = {"key": None, "entry": None}
+# save yang belum ditulis ke disk: bytes JSON + generasi backup yang akan menyimpan versi lama.
+# "inflight" = (data, gen) yang sedang ditulis flush_config; save yang datang selama itu
+# masuk ke data/gen baru (generasi berikutnya), tidak menimpa backup milik flush tsb.
+_pending: Dict[str, Any] = {"data": None, "gen": None, "timer": None, "inflight": None}
+_coalesce = {"window": 0.0}
+
+
+def _sig_of(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _file_sig() -> Tuple[int, int, int]:
+    return _sig_of(CONFIG.stat())
+
+
+def _unflushed() -> Optional[bytes]:
+    """Save terakhir yang belum selesai ditulis ke disk (tertunda atau sedang di-flush). Panggil dengan _lock."""
+    if _pending["data"] is not None:
+        return _pending["data"]
+    inflight = _pending["inflight"]
+    return inflight[0] if inflight is not None else None
+
+
+@timed("config_load")
+def load_config() -> Dict[str, Any]:
+    with _lock:
+        data = _unflushed()
+        if data is not None:
+            # disk tertinggal dari memory sampai flush; sumber kebenaran = save terakhir
+            if _state["cfg"] is not None and not _state["dirty"]:
+                return _state["cfg"]
+            cfg = json.loads(data)
+            _state.update({"cfg": cfg, "index": ConfigIndex(cfg), "dirty": False})
+            return cfg
+        sig = _file_sig()
+        if _state["cfg"] is not None and _state["sig"] == sig and not _state["dirty"]:
+            return _state["cfg"]
+        cfg = json.loads(CONFIG.read_text(encoding="utf-8"))
+        _state.update({"sig": sig, "cfg": cfg, "index": ConfigIndex(cfg), "dirty": False})
+        return cfg
+
+
+def config_snapshot() -> Dict[str, Any]:
+    """
+    Config read-only untuk reader: objek terpisah dari milik writer, tidak pernah dimutasi,
+    jadi aman diiterasi dari thread mana pun tanpa lock. Jangan dimutasi / disimpan.
+    """
+    with _lock:
+        data = _unflushed()
+        key = ("save", _state["saves"]) if data is not None else None
+    with _snap_lock:
+        if key is None:
+            sig = _file_sig()
+            if _snap["key"] == ("file", sig):
+                return _snap["entry"][0]
+            with open(CONFIG, "rb") as f:
+                key = ("file", _sig_of(os.fstat(f.fileno())))
+                data = f.read()
+        elif _snap["key"] == key:
+            return _snap["entry"][0]
+        cfg = json.loads(data)
+        _snap.update({"key": key, "entry": (cfg, ConfigIndex(cfg))})
+        return cfg
+
+
+def _index(cfg: Dict[str, Any]) -> ConfigIndex:
+    if cfg is _state["cfg"]:
+        return _state["index"]
+    # cfg snapshot, atau yang tidak berasal dari load_config (atau sudah digantikan): index sendiri
+    for entry in (_snap["entry"], _foreign["entry"]):
+        if entry is not None and entry[0] is cfg:
+            return entry[1]
+    index = ConfigIndex(cfg)
+    _foreign["entry"] = (cfg, index)
+    return index
+
+
+def _mark_dirty(cfg: Dict[str, Any]) -> None:
+    if cfg is _state["cfg"]:
+        _state["dirty"] = True
+
+
+# ---------- backup ring ----------
+
+_BACKUP_RE = re.compile(r"^config\.json\.(\d+)\.gz$")
+
+
+def _backup_path(gen: int) -> Path:
+    return CONFIG_BACKUP_DIR / f"config.json.{gen:06d}.gz"
+
+
+def _backup_gens() -> List[int]:
+    try:
+        names = os.listdir(CONFIG_BACKUP_DIR)
+    except FileNotFoundError:
+        return []
+    gens = []
+    for name in names:
+        m = _BACKUP_RE.match(name)
+        if m:
+            gens.append(int(m.group(1)))
+    return sorted(gens)
+
+
+def list_backups() -> List[Dict[str, Any]]:
+    """Backup yang ada, terbaru dulu."""
+    out = []
+    for gen in reversed(_backup_gens()):
+        p = _backup_path(gen)
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        out.append({"generation": gen, "path": str(p), "size": st.st_size, "mtime": int(st.st_mtime)})
+    return out
+
+
+def read_backup(gen: Optional[int] = None) -> Tuple[int, Dict[str, Any]]:
+    """Return (generation, cfg) dari backup `gen` (default: terbaru)."""
+    gens = _backup_gens()
+    if gen is None:
+        if not gens:
+            raise FileNotFoundError("no config backup available")
+        gen = gens[-1]
+    elif gen not in gens:
+        raise FileNotFoundError(f"config backup {gen} not found")
+    with gzip.open(_backup_path(gen), "rb") as f:
+        cfg = json.loads(f.read().decode("utf-8"))
+    if not isinstance(cfg, dict):
+        raise ValueError("invalid config backup")
+    return gen, cfg
+
+
+def _write_backup(gen: int) -> None:
+    """Simpan config.json yang ada di disk sebagai backup `gen`, lalu buang yang terlama."""
+    try:
+        raw = CONFIG.read_bytes()
+    except FileNotFoundError:
+        return
+    atomic_write(_backup_path(gen), gzip.compress(raw, 6), 0o600, 0, 0)
+    gens = _backup_gens()
+    for old in gens[:-CONFIG_BACKUP_KEEP] if CONFIG_BACKUP_KEEP > 0 else []:
+        try:
+            _backup_path(old).unlink()
+        except FileNotFoundError:
+            pass
+    fsync_dir(CONFIG_BACKUP_DIR)
+
+
+# ---------- save / flush ----------
+
+def set_write_coalesce(window: float) -> None:
+    """
+    Server long-lived: save dalam `window` detik digabung jadi satu tulis + satu backup.
+    0 (default, dipakai CLI one-shot) = tulis langsung di save_config_with_backup.
+    """
+    _coalesce["window"] = max(0.0, float(window))
+
+
+@timed("config_flush")
+def flush_config() -> None:
+    """Tulis save yang tertunda ke disk (no-op jika tidak ada). Aman dipanggil dari thread mana pun."""
+    with _flush_lock:
+        with _lock:
+            data, gen = _pending["data"], _pending["gen"]
+            timer, _pending["timer"] = _pending["timer"], None
+            if data is not None:
+                # data + generasi diambil bersama: save berikutnya membuka jendela (dan backup) baru
+                _pending.update({"data": None, "gen": None, "inflight": (data, gen)})
+        if timer is not None:
+            timer.cancel()
+        if data is None:
+            return
+
+        try:
+            mode, uid, gid = 0o644, 0, 0
+            if CONFIG.exists():
+                st = CONFIG.stat()
+                mode, uid, gid = st.st_mode & 0o7777, st.st_uid, st.st_gid
+                _write_backup(gen)
+            atomic_write(CONFIG, data, mode, uid, gid)
+        except BaseException:
+            with _lock:
+                _pending["inflight"] = None
+                if _pending["data"] is None:
+                    # tulis gagal: kembalikan ke pending supaya flush berikutnya mencoba lagi
+                    _pending.update({"data": data, "gen": gen})
+            raise
+
+        flushed = None
+        with _lock:
+            _pending["inflight"] = None
+            if _pending["data"] is None:
+                _state["sig"] = _file_sig()
+                flushed = (("save", _state["saves"]), ("file", _state["sig"]))
+        if flushed is not None:
+            with _snap_lock:
+                # isi file = save yang sudah di-snapshot: tidak perlu parse ulang
+                if _snap["key"] == flushed[0]:
+                    _snap["key"] = flushed[1]
+
+
+@timed("config_save")
+def save_config_with_backup(cfg: Dict[str, Any]) -> int:
+    """
+    Simpan cfg; versi sebelumnya masuk ring backup. Return nomor generasi backup tsb.
+    Save yang digabung dalam satu jendela berbagi satu backup (state sebelum jendela).
+
+    Dengan set_write_coalesce(window) > 0, config.json dan file backup baru ditulis saat
+    flush (paling lambat `window` detik kemudian, atau sebelum restart Xray), jadi
+    durability config.json tertinggal dari account store sampai selama jendela itu dan
+    file generasi ini belum ada di list_backups() sebelum flush. Proses yang di-kill
+    sebelum flush kehilangan save tsb (Xray yang sudah di-update lewat API tetap jalan).
+    """
+    data = (json.dumps(cfg, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+    with _lock:
+        index = _index(cfg)
+        _state.update({"cfg": cfg, "index": index, "dirty": False})
+        if _foreign["entry"] is not None and _foreign["entry"][0] is cfg:
+            _foreign["entry"] = None
+        if _pending["gen"] is None:
+            # generasi flush yang sedang jalan belum tentu sudah ada filenya di disk
+            gens = _backup_gens()
+            top = gens[-1] if gens else 0
+            if _pending["inflight"] is not None:
+                top = max(top, _pending["inflight"][1])
+            _pending["gen"] = top + 1
+        _pending["data"] = data
+        _state["saves"] += 1
+        gen = _pending["gen"]
+        window = _coalesce["window"]
+        if window > 0 and _pending["timer"] is None:
+            t = threading.Timer(window, flush_config)
+            t.daemon = True
+            _pending["timer"] = t
+            t.start()
+
+    if window <= 0:
+        flush_config()
+    return gen
+
+
+atexit.register(flush_config)
+
+
+def email_exists(cfg: Dict[str, Any], email: str) -> bool:
+    return bool(_index(cfg).clients.get(email))
+
+
+def find_secret(cfg: Dict[str, Any], proto: str, email: str) -> str:
+    protos = ("vless", "vmess", "trojan") if proto == "allproto" else (proto,)
+    for ib, c in _index(cfg).clients.get(email, ()):
+        ibp = ib.get("protocol")
+        if ibp not in protos:
+            continue
+        s = str(c.get(SECRET_FIELD[ibp]) or "").strip()
+        if s:
+            return s
+    return ""
+
+
+def append_client(cfg: Dict[str, Any], proto: str, email: str, secret: str) -> int:
+    """Tambah client ke semua inbound protocol tsb; return jumlah inbound yang ditambah."""
+    idx = _index(cfg)
+    n = 0
+    for ib in idx.inbounds.get(proto, ()):
+        settings = ib.get("settings")
+        if not isinstance(settings, dict):
+            settings = ib["settings"] = {}
+        clients = settings.get("clients")
+        if not isinstance(clients, list):
+            clients = settings["clients"] = []
+        c = {SECRET_FIELD[proto]: secret, "email": email}
+        clients.append(c)
+        idx.clients.setdefault(email, []).append((ib, c))
+        n += 1
+    if n:
+        _mark_dirty(cfg)
+    return n
+
+
+def remove_client(cfg: Dict[str, Any], proto: str, email: str) -> int:
+    idx = _index(cfg)
+    entries = idx.clients.get(email)
+    if not entries:
+        return 0
+    keep = []
+    n = 0
+    for ib, c in entries:
+        if ib.get("protocol") != proto:
+            keep.append((ib, c))
+            continue
+        clients = ib["settings"]["clients"]
+        for i, cc in enumerate(clients):
+            if cc is c:
+                del clients[i]
+                n += 1
+                break
+    if keep:
+        idx.clients[email] = keep
+    else:
+        del idx.clients[email]
+    if n:
+        _mark_dirty(cfg)
+    return n
+
+
+def blocked_rule_update(
+    cfg: Dict[str, Any], add: Iterable[str] = (), remove: Iterable[str] = ()
+) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Tambah/hapus banyak user di rule routing "blocked" sekaligus. Membership dicek lewat
+    set index (O(1) per user); list rule disusun ulang paling banyak sekali per panggilan.
+    Return (user yang benar-benar ditambah, yang benar-benar dihapus), None jika rule tidak ada.
+    """
+    idx = _index(cfg)
+    r = idx.blocked_rule
+    if r is None:
+        return None
+    users = r.get("user")
+    if not isinstance(users, list):
+        users = r["user"] = []
+
+    gone = {e for e in remove if e in idx.blocked_users}
+    if gone:
+        r["user"] = users = [u for u in users if u not in gone]
+        idx.blocked_users -= gone
+    added = []
+    for e in add:
+        if e not in idx.blocked_users:
+            users.append(e)
+            idx.blocked_users.add(e)
+            added.append(e)
+    if gone or added:
+        _mark_dirty(cfg)
+    return added, sorted(gone)
+
+
+def blocked_rule_add(cfg: Dict[str, Any], email: str) -> bool:
+    return blocked_rule_update(cfg, add=(email,)) is not None
+
+
+def blocked_rule_remove(cfg: Dict[str, Any], email: str) -> bool:
+    return blocked_rule_update(cfg, remove=(email,)) is not None
+
+
+def inbounds_key(cfg: Dict[str, Any]) -> Tuple:
+    """Kunci set inbound vless/vmess/trojan (berubah jika inbound/transport berubah, bukan client)."""
+    return _index(cfg).inbounds_key
+
+
+def blocked_users(cfg: Dict[str, Any]) -> Set[str]:
+    return set(_index(cfg).blocked_users)
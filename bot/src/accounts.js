@@ -1,8 +1,8 @@
 const { EmbedBuilder, ActionRowBuilder, StringSelectMenuBuilder, ButtonBuilder, ButtonStyle } = require("discord.js");
 const { PAGE_SIZE, LIST_PROTOCOLS } = require("./config");
 const { callBackend } = require("./ipc");
-const { clampInt } = require("./util");
 const { formatAccountsTable } = require("./tables");
+const { fitCustomId } = require("./views");
 
 function buildProtocolFilterRow(prefix, active) {
   active = String(active || "all").toLowerCase().trim();
@@ -26,19 +26,28 @@ function buildProtocolFilterRow(prefix, active) {
   );
 }
 
-async function buildListMessage(kind, protoFilter, offset) {
+function listNavButton(id, label, emoji, enabled) {
+  const cid = enabled ? fitCustomId(id) : null;
+  return new ButtonBuilder()
+    .setCustomId(cid || `${id.split(":").slice(0, 2).join(":")}:x`)
+    .setLabel(label)
+    .setStyle(ButtonStyle.Secondary)
+    .setEmoji(emoji)
+    .setDisabled(!cid);
+}
+
+// pos: { cursor } = halaman sesudah key, { before } = halaman sebelum key, kosong = halaman pertama
+async function buildListMessage(kind, protoFilter, pos) {
   const prefix = kind === "del" ? "del" : "acct";
   protoFilter = String(protoFilter || "all").toLowerCase().trim();
   if (!LIST_PROTOCOLS.includes(protoFilter)) protoFilter = "all";
+  pos = pos && typeof pos === "object" ? pos : {};
 
-  offset = clampInt(Number(offset || 0), 0, 10_000_000);
+  const req = { action: "list", protocol: protoFilter, limit: PAGE_SIZE };
+  if (pos.before) req.before = pos.before;
+  else if (pos.cursor) req.cursor = pos.cursor;
 
-  const resp = await callBackend({
-    action: "list",
-    protocol: protoFilter,
-    offset,
-    limit: PAGE_SIZE
-  });
+  const resp = await callBackend(req);
 
   if (!resp || resp.status !== "ok") {
     const embed = new EmbedBuilder()
@@ -49,7 +58,7 @@ async function buildListMessage(kind, protoFilter, offset) {
 
   const items = Array.isArray(resp.items) ? resp.items : [];
   const total = Number.isFinite(resp.total) ? resp.total : items.length;
-  const hasMore = !!resp.has_more;
+  const start = Number.isFinite(resp.offset) ? resp.offset : 0;
 
   const title = kind === "del" ? "🗑️ Delete Accounts" : "📚 XRAY Accounts";
   const headerLine =
@@ -62,23 +71,13 @@ async function buildListMessage(kind, protoFilter, offset) {
   const embed = new EmbedBuilder()
     .setTitle(title)
     .setDescription(`${headerLine}\n\n${tableBlock}`)
-    .setFooter({ text: `Filter: ${protoFilter} | Showing ${items.length} of ${total} | Offset ${offset}` });
+    .setFooter({ text: `Filter: ${protoFilter} | ${items.length ? `${start + 1}-${start + items.length}` : 0} of ${total}` });
 
   const filterRow = buildProtocolFilterRow(prefix, protoFilter);
 
   const nav = new ActionRowBuilder().addComponents(
-    new ButtonBuilder()
-      .setCustomId(`${prefix}:prev:${protoFilter}:${offset}`)
-      .setLabel("Prev")
-      .setStyle(ButtonStyle.Secondary)
-      .setEmoji("⬅️")
-      .setDisabled(offset <= 0),
-    new ButtonBuilder()
-      .setCustomId(`${prefix}:next:${protoFilter}:${offset}`)
-      .setLabel("Next")
-      .setStyle(ButtonStyle.Secondary)
-      .setEmoji("➡️")
-      .setDisabled(!hasMore),
+    listNavButton(`${prefix}:prev:${protoFilter}:${resp.prev_cursor || ""}`, "Prev", "⬅️", !!resp.prev_cursor),
+    listNavButton(`${prefix}:next:${protoFilter}:${resp.next_cursor || ""}`, "Next", "➡️", !!resp.next_cursor),
   );
 
   const components = [filterRow, nav];
@@ -89,7 +88,7 @@ async function buildListMessage(kind, protoFilter, offset) {
       : "Pilih akun untuk ambil ulang XRAY ACCOUNT DETAIL (.txt)";
 
     const menu = new StringSelectMenuBuilder()
-      .setCustomId(`${prefix}:sel:${protoFilter}:${offset}`)
+      .setCustomId(`${prefix}:sel:${protoFilter}`)
       .setPlaceholder(placeholder)
       .addOptions(
         items.slice(0, PAGE_SIZE).map((it, idx) => {
@@ -97,7 +96,7 @@ async function buildListMessage(kind, protoFilter, offset) {
           const p = String(it.protocol || "-");
           const e = String(it.expired_at || "-");
           return {
-            label: `${idx + 1}. ${u}`.slice(0, 100),
+            label: `${start + idx + 1}. ${u}`.slice(0, 100),
             description: `${p} | exp ${e}`.slice(0, 100),
             value: u.slice(0, 100)
           };
@@ -110,4 +109,16 @@ async function buildListMessage(kind, protoFilter, offset) {
   return { embeds: [embed], components, ephemeral: true };
 }
 
-module.exports = { buildProtocolFilterRow, buildListMessage };
+// tombol list akun/delete: "<acct|del>:<prev|next>:<proto>:<cursor>" dan "filt:<acct|del>:<proto>"
+async function handleListButton(customId) {
+  const parts = String(customId || "").split(":");
+  if (parts[0] === "filt") {
+    return buildListMessage(parts[1] === "del" ? "del" : "acct", parts[2] || "all");
+  }
+  const kind = parts[0] === "del" ? "del" : "acct";
+  const cursor = parts.slice(3).join(":");
+  const pos = parts[1] === "prev" ? { before: cursor } : { cursor };
+  return buildListMessage(kind, parts[2] || "all", pos);
+}
+
+module.exports = { buildProtocolFilterRow, buildListMessage, handleListButton };
@@ -9,64 +9,97 @@ function mapBackendError(err) {
   return err.message || "unknown error";
 }
 
+/*
+ * Satu koneksi Unix socket persistent ke backend (multiplexed).
+ * Setiap request diberi "id"; response dicocokkan lewat "id" dan boleh datang tidak urut.
+ * Koneksi dibuat ulang otomatis saat request berikutnya jika tertutup/error.
+ */
+let conn = null;
+let connBuf = "";
+let nextId = 1;
+const pending = new Map();
+
+function failPending(c, err) {
+  for (const [id, p] of pending) {
+    if (p.conn !== c) continue;
+    pending.delete(id);
+    clearTimeout(p.timer);
+    p.reject(err);
+  }
+}
+
+function onLine(line) {
+  if (!line.trim()) return;
+
+  let obj;
+  try {
+    obj = JSON.parse(line);
+  } catch (_) {
+    return;
+  }
+
+  const id = obj ? obj.id : null;
+  const p = pending.get(id);
+  if (!p) return;
+
+  pending.delete(id);
+  clearTimeout(p.timer);
+  delete obj.id;
+  p.resolve(obj);
+}
+
+function getConn() {
+  if (conn && !conn.destroyed) return conn;
+
+  const c = net.createConnection(SOCK_PATH);
+  connBuf = "";
+
+  c.on("data", (data) => {
+    connBuf += data.toString("utf8");
+    let idx;
+    while ((idx = connBuf.indexOf("\n")) !== -1) {
+      const line = connBuf.slice(0, idx);
+      connBuf = connBuf.slice(idx + 1);
+      onLine(line);
+    }
+  });
+
+  c.on("error", (err) => {
+    if (conn === c) conn = null;
+    failPending(c, err);
+  });
+
+  c.on("close", () => {
+    if (conn === c) conn = null;
+    failPending(c, new Error("Backend closed connection before sending a full response"));
+  });
+
+  conn = c;
+  return c;
+}
+
 function callBackend(req) {
   return new Promise((resolve, reject) => {
-    const client = net.createConnection(SOCK_PATH);
-    let buf = "";
-    let done = false;
+    const id = nextId++;
+    if (nextId > Number.MAX_SAFE_INTEGER) nextId = 1;
 
     const timer = setTimeout(() => {
-      if (done) return;
-      done = true;
+      if (!pending.has(id)) return;
+      pending.delete(id);
       const e = new Error("Backend timeout");
       e.code = "ETIMEDOUT";
-      try { client.destroy(e); } catch (_) {}
       reject(e);
     }, BACKEND_TIMEOUT_MS);
 
-    const finishReject = (err) => {
-      if (done) return;
-      done = true;
+    try {
+      const c = getConn();
+      pending.set(id, { resolve, reject, timer, conn: c });
+      c.write(JSON.stringify({ ...req, id }) + "\n");
+    } catch (e) {
+      pending.delete(id);
       clearTimeout(timer);
-      reject(err);
-    };
-
-    const finishResolve = (obj) => {
-      if (done) return;
-      done = true;
-      clearTimeout(timer);
-      resolve(obj);
-    };
-
-    client.on("connect", () => {
-      try {
-        client.write(JSON.stringify(req) + "\n");
-      } catch (e) {
-        finishReject(e);
-      }
-    });
-
-    client.on("data", (data) => {
-      buf += data.toString("utf8");
-      const idx = buf.indexOf("\n");
-      if (idx !== -1) {
-        client.end();
-        const line = buf.slice(0, idx);
-        try {
-          finishResolve(JSON.parse(line));
-        } catch (_) {
-          finishReject(new Error("Invalid JSON response from backend"));
-        }
-      }
-    });
-
-    client.on("error", finishReject);
-
-    client.on("close", () => {
-      if (!done && buf.length > 0 && !buf.includes("\n")) {
-        finishReject(new Error("Backend closed connection before sending a full response"));
-      }
-    });
+      reject(e);
+    }
   });
 }
 
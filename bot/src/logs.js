@@ -6,6 +6,7 @@ const {
   ButtonStyle,
 } = require("discord.js");
 const { callBackend } = require("./ipc");
+const { saveView, getView } = require("./views");
 
 const SERVICES = [
   { label: "XRAY", value: "xray", emoji: "🧿" },
@@ -14,83 +15,136 @@ const SERVICES = [
   { label: "BOT", value: "bot", emoji: "🤖" },
 ];
 
+const PRIORITIES = [
+  { label: "Semua level", value: "all" },
+  { label: "warning ke atas", value: "warning" },
+  { label: "error ke atas", value: "err" },
+];
+
+const PAGE_SIZE = 25;
+
+// cursor journald terlalu panjang untuk customId -> disimpan di views.js, tombol cukup bawa id pendek
+const DEFAULT_VIEW = { service: "xray", priority: "all", first: null, last: null };
+
 function _clipCode(s, max = 3800) {
   s = String(s || "");
   if (s.length <= max) return s;
   return s.slice(-max);
 }
 
-async function buildLogsPanel(service = "xray", page = 0) {
-  const resp = await callBackend({
+function _errorPanel(resp) {
+  const embed = new EmbedBuilder()
+    .setTitle("❌ Failed")
+    .setDescription(resp && resp.error ? String(resp.error) : "unknown error");
+  return { embeds: [embed], components: [], ephemeral: true };
+}
+
+/**
+ * direction: latest | older | newer | tail (lihat backend xray_backend/journal.py).
+ * older/newer/tail memakai cursor dari view halaman sebelumnya.
+ */
+async function buildLogsPanel(view, direction = "latest") {
+  view = { ...DEFAULT_VIEW, ...view };
+  const req = {
     action: "logs",
-    unit: service,
-    page,
-    page_size: 25,
+    unit: view.service,
+    priority: view.priority,
+    page_size: PAGE_SIZE,
+    direction,
+  };
+  if (direction === "older") req.cursor = view.first;
+  else if (direction === "newer" || direction === "tail") req.cursor = view.last;
+  if ((direction === "older" || direction === "newer") && !req.cursor) req.direction = "latest";
+
+  const resp = await callBackend(req);
+  if (!resp || resp.status !== "ok") return _errorPanel(resp);
+
+  const vid = saveView({
+    service: view.service,
+    priority: view.priority,
+    first: resp.first_cursor || view.first,
+    last: resp.last_cursor || view.last,
   });
 
-  if (!resp || resp.status !== "ok") {
-    const embed = new EmbedBuilder()
-      .setTitle("❌ Failed")
-      .setDescription(resp && resp.error ? String(resp.error) : "unknown error");
-    return { embeds: [embed], components: [], ephemeral: true };
-  }
-
   const text = _clipCode(resp.text || "(empty)");
+  const footer = [`unit=${resp.unit}`, `level=${resp.priority || "all"}`, `${resp.count} baris`];
+  if (resp.new_count != null) footer.push(`${resp.new_count} baru sejak refresh terakhir`);
+  if (!resp.has_newer) footer.push("terbaru");
+
   const embed = new EmbedBuilder()
     .setTitle(`📜 Logs: ${resp.unit}`)
     .setDescription("```text\n" + text + "\n```")
-    .setFooter({ text: `Page: ${resp.page} | unit=${resp.unit}` });
+    .setFooter({ text: footer.join(" | ") });
 
   const svcRow = new ActionRowBuilder().addComponents(
     new StringSelectMenuBuilder()
-      .setCustomId(`logs:svc:${resp.page}`)
+      .setCustomId(`logs:svc:${vid}`)
       .setPlaceholder("Pilih service logs...")
       .addOptions(
         SERVICES.map((s) => ({
           label: s.label,
           value: s.value,
           emoji: s.emoji,
-          default: s.value === service,
+          default: s.value === view.service,
+        }))
+      )
+  );
+
+  const prioRow = new ActionRowBuilder().addComponents(
+    new StringSelectMenuBuilder()
+      .setCustomId(`logs:prio:${vid}`)
+      .setPlaceholder("Filter level...")
+      .addOptions(
+        PRIORITIES.map((p) => ({
+          label: p.label,
+          value: p.value,
+          default: p.value === (view.priority || "all"),
         }))
       )
   );
 
   const navRow = new ActionRowBuilder().addComponents(
     new ButtonBuilder()
-      .setCustomId(`logs:prev:${service}:${resp.page}`)
-      .setLabel("Prev")
+      .setCustomId(`logs:older:${vid}`)
+      .setLabel("Older")
       .setStyle(ButtonStyle.Secondary)
       .setEmoji("⬅️")
-      .setDisabled(resp.page <= 0),
+      .setDisabled(!resp.has_older || !resp.first_cursor),
     new ButtonBuilder()
-      .setCustomId(`logs:next:${service}:${resp.page}`)
-      .setLabel("Next")
+      .setCustomId(`logs:newer:${vid}`)
+      .setLabel("Newer")
       .setStyle(ButtonStyle.Secondary)
       .setEmoji("➡️")
-      .setDisabled(!resp.has_more),
+      .setDisabled(!resp.has_newer || !resp.last_cursor),
     new ButtonBuilder()
-      .setCustomId(`logs:refresh:${service}:${resp.page}`)
-      .setLabel("Refresh")
+      .setCustomId(`logs:tail:${vid}`)
+      .setLabel("Latest")
       .setStyle(ButtonStyle.Primary)
       .setEmoji("🔄")
   );
 
-  return { embeds: [embed], components: [svcRow, navRow], ephemeral: true };
+  return { embeds: [embed], components: [svcRow, prioRow, navRow], ephemeral: true };
 }
 
 async function handleSlash(interaction) {
-  const msg = await buildLogsPanel("xray", 0);
+  const msg = await buildLogsPanel(DEFAULT_VIEW, "latest");
   return interaction.reply(msg);
 }
 
 async function handleSelect(interaction) {
   const cid = interaction.customId || "";
-  if (!cid.startsWith("logs:svc:")) return;
+  const parts = cid.split(":");
+  const kind = parts[1] || "";
+  if (kind !== "svc" && kind !== "prio") return;
 
-  const page = Number(String(cid.split(":")[2] || "0")) || 0;
-  const service = (interaction.values && interaction.values[0]) || "xray";
+  const view = getView(parts[2], DEFAULT_VIEW);
+  const value = (interaction.values && interaction.values[0]) || "";
+  // ganti service / level -> cursor lama tidak berlaku, mulai dari halaman terbaru
+  const next = kind === "svc"
+    ? { service: value || "xray", priority: view.priority }
+    : { service: view.service, priority: value || "all" };
 
-  const msg = await buildLogsPanel(service, page);
+  const msg = await buildLogsPanel(next, "latest");
   return interaction.update(msg);
 }
 
@@ -100,21 +154,11 @@ async function handleButton(interaction) {
 
   const parts = cid.split(":");
   const kind = parts[1] || "";
-  const service = parts[2] || "xray";
-  const page = Number(parts[3] || "0") || 0;
-
-  if (kind === "prev") {
-    const msg = await buildLogsPanel(service, Math.max(0, page - 1));
-    return interaction.update(msg);
-  }
-  if (kind === "next") {
-    const msg = await buildLogsPanel(service, page + 1);
-    return interaction.update(msg);
-  }
-  if (kind === "refresh") {
-    const msg = await buildLogsPanel(service, page);
-    return interaction.update(msg);
-  }
+  if (kind !== "older" && kind !== "newer" && kind !== "tail") return;
+
+  const view = getView(parts[2], DEFAULT_VIEW);
+  const msg = await buildLogsPanel(view, kind);
+  return interaction.update(msg);
 }
 
-module.exports = { handleSlash, handleSelect, handleButton };
\ No newline at end of file
+module.exports = { handleSlash, handleSelect, handleButton };
@@ -1,10 +1,8 @@
 const fs = require("fs");
-const path = require("path");
 
 const {
   Client,
   GatewayIntentBits,
-  AttachmentBuilder,
   EmbedBuilder,
   ActionRowBuilder,
   ButtonBuilder,
@@ -15,9 +13,9 @@ const cfg = require("./config");
 cfg.assertEnv();
 
 const { callBackend, mapBackendError } = require("./ipc");
-const { isAdmin, badge, parseFinalEmail } = require("./util");
+const { isAdmin, badge, parseFinalEmail, fmtUnitStats, detailFile } = require("./util");
 const { buildHelpPanel } = require("./help");
-const { buildListMessage } = require("./accounts");
+const { buildListMessage, handleListButton } = require("./accounts");
 const { buildAddProtocolButtons, buildAddModal } = require("./add_ui");
 const {
   getNotifyCfg,
@@ -102,12 +100,14 @@ function buildStatusText(xray, nginx, ipcMs) {
   const ns = nginx ? `${badge(nginx.active ? "active" : "inactive")} (${nginx.state || "-"})` : "unknown";
   const xerr = xray && xray.error ? `\nXray error : ${String(xray.error).slice(0, 140)}` : "";
   const nerr = nginx && nginx.error ? `\nNginx error: ${String(nginx.error).slice(0, 140)}` : "";
+  const xst = fmtUnitStats(xray) ? `\n        ${fmtUnitStats(xray)}` : "";
+  const nst = fmtUnitStats(nginx) ? `\n        ${fmtUnitStats(nginx)}` : "";
 
   return (
     "🧩 STATUS\n" +
     "```\n" +
-    `Xray  : ${xs}${xerr}\n` +
-    `Nginx : ${ns}${nerr}\n` +
+    `Xray  : ${xs}${xst}${xerr}\n` +
+    `Nginx : ${ns}${nst}${nerr}\n` +
     `IPC   : ${ipcMs} ms\n` +
     "```"
   );
@@ -280,15 +280,11 @@ if (!cid.startsWith("addmodal:")) return;
       }
 
       // Attachment: XRAY ACCOUNT DETAIL .txt (from backend)
-      const txtPath = resp && (resp.detail_path || resp.detail_txt)
-        ? String(resp.detail_path || resp.detail_txt)
-        : null;
-      if (!txtPath || !fs.existsSync(txtPath)) {
-        return interaction.editReply(`✅ Created: ${resp.username} (UUID/Pass: ${resp.uuid || "-"})\n⚠️ Detail file not found: ${txtPath || "-"}`);
+      const file = detailFile(resp);
+      if (!file) {
+        return interaction.editReply(`✅ Created: ${resp.username} (UUID/Pass: ${resp.uuid || "-"})\n⚠️ Detail not available: ${resp.detail_path || "-"}`);
       }
 
-      const file = new AttachmentBuilder(txtPath, { name: path.basename(txtPath) });
-
       const protoVal = String(resp.protocol || v.protocol || "-");
 
       const embed = new EmbedBuilder()
@@ -434,22 +430,19 @@ if (customId.startsWith("block:")) return await dispatchModule(blockMod, "block"
         const parsed = parseFinalEmail(selected);
         if (!parsed) return interaction.reply({ content: "❌ Invalid selection", ephemeral: true });
 
-        // Ask backend to get detail file path again
+        // Render detail on-demand di backend (tanpa tulis/baca file)
         await interaction.deferUpdate();
-        const resp = await callBackend({ action: "get_detail", protocol: parsed.proto, username: parsed.base });
+        const resp = await callBackend({ action: "render_detail", protocol: parsed.proto, username: parsed.base });
 
         if (resp.status !== "ok") {
           return interaction.followUp({ content: `❌ Failed: ${resp.error || "unknown error"}`, ephemeral: true });
         }
 
-        const txtPath = resp && (resp.detail_path || resp.detail_txt)
-        ? String(resp.detail_path || resp.detail_txt)
-        : null;
-        if (!txtPath || !fs.existsSync(txtPath)) {
-          return interaction.followUp({ content: `❌ File not found: ${txtPath}`, ephemeral: true });
+        const file = detailFile(resp);
+        if (!file) {
+          return interaction.followUp({ content: "❌ Detail not available", ephemeral: true });
         }
 
-        const file = new AttachmentBuilder(txtPath, { name: path.basename(txtPath) });
         const embed = new EmbedBuilder()
           .setTitle("📄 XRAY ACCOUNT DETAIL")
           .addFields(
@@ -806,26 +799,11 @@ if (customId.startsWith("block:") || customId.startsWith("filt:block:")) {
         return interaction.reply({ content: "❌ Unknown notify action", ephemeral: true });
       }
 
-      // Accounts paging/filter buttons
-      if (customId.startsWith("acct:")) {
+      // Accounts/delete list paging + protocol filter buttons
+      if (/^(acct|del):(prev|next):/.test(customId) || /^filt:(acct|del):/.test(customId)) {
         await interaction.deferUpdate();
-        const [_, action, proto, pageStr] = customId.split(":");
-        let page = parseInt(pageStr || "0", 10);
-        if (!Number.isFinite(page) || page < 0) page = 0;
-
-        const nextProto = (proto && LIST_PROTOCOLS.includes(proto)) ? proto : "all";
-
-        if (action === "page") {
-          const payload = await buildListMessage("acct", nextProto, page);
-          return interaction.editReply({ content: null, embeds: payload.embeds, components: payload.components });
-        }
-
-        if (action === "filter") {
-          const payload = await buildListMessage("acct", nextProto, 0);
-          return interaction.editReply({ content: null, embeds: payload.embeds, components: payload.components });
-        }
-
-        return interaction.reply({ content: "❌ Unknown accounts action", ephemeral: true });
+        const payload = await handleListButton(customId);
+        return interaction.editReply({ content: null, embeds: payload.embeds, components: payload.components });
       }
 
       // Add protocol buttons
@@ -988,7 +966,7 @@ if (customId.startsWith("block:") || customId.startsWith("filt:block:")) {
   if (cmd === "accounts") {
     try {
       await interaction.deferReply({ ephemeral: true });
-      const payload = await buildListMessage("acct", "all", 0);
+      const payload = await buildListMessage("acct", "all");
       return interaction.editReply({ content: null, embeds: payload.embeds, components: payload.components });
     } catch (e) {
       console.error(e);
@@ -1057,7 +1035,7 @@ if (customId.startsWith("block:") || customId.startsWith("filt:block:")) {
 
       // else: list mode (reuse accounts list builder but del list logic from accounts module)
       await interaction.deferReply({ ephemeral: true });
-      const payload = await buildListMessage("del", proto, 0);
+      const payload = await buildListMessage("del", proto);
       return interaction.editReply({ content: null, embeds: payload.embeds, components: payload.components });
     } catch (e) {
       console.error(e);
@@ -10,7 +10,7 @@ const {
 } = require("./config");
 
 const { callBackend, mapBackendError } = require("./ipc");
-const { safeMkdirp, clampInt, fmtDateTimeJakarta, badge } = require("./util");
+const { safeMkdirp, clampInt, fmtDateTimeJakarta, badge, fmtUnitStats, fmtBytes } = require("./util");
 
 let notifyCfg = {
   enabled: false,
@@ -99,7 +99,19 @@ function startNotifyScheduler(client) {
   scheduleNotifyLoop(client);
 }
 
-function buildNotifyMessageText({ wsMs, ipcMs, xrayState, nginxState, error }) {
+// ringkasan armada dari action "summary" (agregat backend, tanpa list penuh)
+function fmtFleetLines(summary) {
+  if (!summary || summary.status !== "ok") return [];
+  const e = summary.expiry || {};
+  const lines = [];
+  lines.push("📊 Akun");
+  lines.push(`Total: ${summary.total} | Aktif: ${summary.active} | Blocked: ${summary.blocked} | Expired: ${summary.expired}`);
+  lines.push(`Near limit: ${summary.near_limit} | Over quota: ${summary.over_quota} | Exp ≤3 hari: ${e["0-3d"] || 0} | 4-7 hari: ${e["4-7d"] || 0}`);
+  lines.push(`Usage: ${fmtBytes(summary.used_total)} / ${fmtBytes(summary.quota_total)} (unlimited: ${summary.unlimited})`);
+  return lines;
+}
+
+function buildNotifyMessageText({ wsMs, ipcMs, xrayState, nginxState, summary, error }) {
   const ts = fmtDateTimeJakarta(new Date());
 
   const lines = [];
@@ -127,7 +139,14 @@ function buildNotifyMessageText({ wsMs, ipcMs, xrayState, nginxState, error }) {
     ? (nginxState.state || (nginxState.active ? "active" : "inactive"))
     : nginxState;
   lines.push(`Xray : ${badge(xs)}`);
+  if (fmtUnitStats(xrayState)) lines.push(`       ${fmtUnitStats(xrayState)}`);
   lines.push(`Nginx: ${badge(ns)}`);
+  if (fmtUnitStats(nginxState)) lines.push(`       ${fmtUnitStats(nginxState)}`);
+  const fleet = fmtFleetLines(summary);
+  if (fleet.length) {
+    lines.push("");
+    lines.push(...fleet);
+  }
   lines.push("```");
   return lines.join("\n");
 }
@@ -148,18 +167,11 @@ async function sendNotifyTick(client, { force = false } = {}) {
   const t0 = Date.now();
 
   try {
-    const pingResp = await callBackend({ action: "ping" });
+    // satu round-trip: response status sekaligus membuktikan backend hidup (pengganti ping terpisah)
     const statusResp = await callBackend({ action: "status" });
     const ipcMs = Date.now() - t0;
-
-    if (!pingResp || pingResp.status !== "ok") {
-      const msg = pingResp && pingResp.error ? pingResp.error : "backend ping failed";
-      notifyCfg.last_error = msg;
-      notifyCfg.last_run_at = new Date().toISOString();
-      saveNotifyCfg();
-      await ch.send({ content: buildNotifyMessageText({ wsMs, ipcMs, error: msg }) });
-      return;
-    }
+    // agregat akun murah (tabel ringkasan backend); gagal -> section dilewati saja
+    const summary = await callBackend({ action: "summary" }).catch(() => null);
 
     if (!statusResp || statusResp.status !== "ok") {
       const msg = statusResp && statusResp.error ? statusResp.error : "backend status failed";
@@ -179,7 +191,8 @@ async function sendNotifyTick(client, { force = false } = {}) {
         wsMs,
         ipcMs,
         xrayState: statusResp.xray,
-        nginxState: statusResp.nginx
+        nginxState: statusResp.nginx,
+        summary
       })
     });
   } catch (e) {
@@ -8,14 +8,14 @@ const {
   ModalBuilder,
   TextInputBuilder,
   TextInputStyle,
-  AttachmentBuilder,
 } = require("discord.js");
 
 const { PAGE_SIZE, LIST_PROTOCOLS } = require("./config");
 const { callBackend } = require("./ipc");
-const { clampInt } = require("./util");
+const { detailFile } = require("./util");
 const { formatAccountsTable } = require("./tables");
 const { buildProtocolFilterRow } = require("./accounts");
+const { saveView, getView, fitCustomId } = require("./views");
 
 /* =========================
    Helper (UI only)
@@ -51,17 +51,48 @@ function _parseFinal(u) {
 /* =========================
    List quota + indicator
    ========================= */
-async function buildQuotaList(protoFilter, offset) {
-  protoFilter = String(protoFilter || "all").toLowerCase().trim();
-  if (!LIST_PROTOCOLS.includes(protoFilter)) protoFilter = "all";
-  offset = clampInt(Number(offset || 0), 0, 10_000_000);
-
-  const resp = await callBackend({
-    action: "list",
-    protocol: protoFilter,
-    offset,
-    limit: PAGE_SIZE,
-  });
+const STATUS_FILTERS = {
+  all: { label: "Semua status", emoji: "📋" },
+  blocked: { label: "Blocked", emoji: "🔴" },
+  near_limit: { label: "Near limit (>= 80%)", emoji: "🟡" },
+  expiring: { label: "Expiring <= 7 hari", emoji: "⏳" },
+};
+
+function normView(view) {
+  const v = { proto: "all", q: "", filter: "all", cursor: "", ...(view || {}) };
+  v.proto = String(v.proto || "all").toLowerCase().trim();
+  if (!LIST_PROTOCOLS.includes(v.proto)) v.proto = "all";
+  if (!STATUS_FILTERS[v.filter]) v.filter = "all";
+  v.q = String(v.q || "").trim().slice(0, 32);
+  v.cursor = String(v.cursor || "");
+  return v;
+}
+
+function navButton(id, label, emoji, enabled) {
+  const cid = enabled ? fitCustomId(id) : null;
+  return new ButtonBuilder()
+    .setCustomId(cid || `${id.split(":").slice(0, 3).join(":")}:x`)
+    .setLabel(label)
+    .setStyle(ButtonStyle.Secondary)
+    .setEmoji(emoji)
+    .setDisabled(!cid);
+}
+
+// pos: { cursor } = halaman sesudah key, { before } = halaman sebelum key, kosong = view.cursor
+async function buildQuotaList(view, pos) {
+  view = normView(view);
+  pos = pos || { cursor: view.cursor };
+
+  const req = { action: "list", protocol: view.proto, limit: PAGE_SIZE };
+  if (pos.before) req.before = pos.before;
+  else if (pos.cursor) req.cursor = pos.cursor;
+  if (view.q) req.q = view.q;
+  if (view.filter !== "all") {
+    req.filter = view.filter;
+    if (view.filter === "expiring") req.days = 7;
+  }
+
+  const resp = await callBackend(req);
 
   if (!resp || resp.status !== "ok") {
     const embed = new EmbedBuilder()
@@ -72,23 +103,33 @@ async function buildQuotaList(protoFilter, offset) {
 
   const items = Array.isArray(resp.items) ? resp.items : [];
   const total = Number.isFinite(resp.total) ? resp.total : items.length;
-  const hasMore = !!resp.has_more;
+  const start = Number.isFinite(resp.offset) ? resp.offset : 0;
+
+  // id halaman ini: dipakai tombol refresh/back & panel set quota untuk kembali ke sini
+  view.cursor = resp.start_cursor || "";
+  const vid = saveView(view);
 
   let color = 0x00cc66;
 
   const lines = items.map((it, idx) => {
     const used = Number(it.used || 0);
-    const limit = Number(it.limit || 0);
+    const limit = Number(it.quota_limit || it.limit || 0);
     const blocked = Boolean(it.blocked);
     const st = quotaStatus(used, limit, blocked);
     color = st.color;
     return (
-      `${String(idx + 1).padEnd(3)} ${st.emoji} ` +
+      `${String(start + idx + 1).padEnd(4)} ${st.emoji} ` +
       `${String(it.username || "-").padEnd(18)} ` +
       `${progressBar(used, limit)}`
     );
   });
 
+  const filterText = [
+    `Filter: ${view.proto}`,
+    view.filter !== "all" ? `Status: ${STATUS_FILTERS[view.filter].label}` : null,
+    view.q ? `Cari: "${view.q}"` : null,
+  ].filter(Boolean).join(" | ");
+
   const embed = new EmbedBuilder()
     .setTitle("📊 Quota Monitor")
     .setDescription(
@@ -96,53 +137,64 @@ async function buildQuotaList(protoFilter, offset) {
       (lines.length ? "```\n" + lines.join("\n") + "\n```" : "_Tidak ada akun ditemukan._")
     )
     .setColor(color)
-    .setFooter({ text: `Filter: ${protoFilter} | Showing ${items.length} of ${total} | Offset ${offset}` });
-
-  const filterRow = buildProtocolFilterRow("quota", protoFilter);
+    .setFooter({ text: `${filterText} | ${items.length ? `${start + 1}-${start + items.length}` : 0} of ${total}` });
+
+  const filterRow = buildProtocolFilterRow("quota", view.proto);
+
+  const statusMenu = new StringSelectMenuBuilder()
+    .setCustomId(`quota:flt:${vid}`)
+    .setPlaceholder("Filter status...")
+    .addOptions(
+      Object.entries(STATUS_FILTERS).map(([value, f]) => ({
+        label: f.label,
+        value,
+        emoji: f.emoji,
+        default: value === view.filter,
+      }))
+    );
 
   const navRow = new ActionRowBuilder().addComponents(
+    navButton(`quota:prev:${vid}:${resp.prev_cursor || ""}`, "Prev", "⬅️", !!resp.prev_cursor),
+    navButton(`quota:next:${vid}:${resp.next_cursor || ""}`, "Next", "➡️", !!resp.next_cursor),
     new ButtonBuilder()
-      .setCustomId(`quota:prev:${protoFilter}:${offset}`)
-      .setLabel("Prev")
-      .setStyle(ButtonStyle.Secondary)
-      .setEmoji("⬅️")
-      .setDisabled(offset <= 0),
-    new ButtonBuilder()
-      .setCustomId(`quota:next:${protoFilter}:${offset}`)
-      .setLabel("Next")
-      .setStyle(ButtonStyle.Secondary)
-      .setEmoji("➡️")
-      .setDisabled(!hasMore),
-    new ButtonBuilder()
-      .setCustomId(`quota:refresh:${protoFilter}:${offset}`)
+      .setCustomId(`quota:refresh:${vid}`)
       .setLabel("Refresh")
       .setStyle(ButtonStyle.Secondary)
-      .setEmoji("🔄")
+      .setEmoji("🔄"),
+    new ButtonBuilder()
+      .setCustomId(`quota:search:${vid}`)
+      .setLabel(view.q ? "Ubah Cari" : "Cari")
+      .setStyle(view.q ? ButtonStyle.Primary : ButtonStyle.Secondary)
+      .setEmoji("🔎")
   );
 
-  const components = [filterRow, navRow];
+  const components = [filterRow, new ActionRowBuilder().addComponents(statusMenu), navRow];
 
   if (items.length > 0) {
     const menu = new StringSelectMenuBuilder()
-      .setCustomId(`quota:sel:${protoFilter}:${offset}`)
+      .setCustomId(`quota:sel:${vid}`)
       .setPlaceholder("Pilih akun untuk set quota...")
       .addOptions(
         items.slice(0, PAGE_SIZE).map((it, idx) => {
           const u = String(it.username || "-");
-          return { label: `${idx + 1}. ${u}`.slice(0, 100), value: u.slice(0, 100) };
+          return { label: `${start + idx + 1}. ${u}`.slice(0, 100), value: u.slice(0, 100) };
         })
       );
 
-    components.splice(1, 0, new ActionRowBuilder().addComponents(menu));
+    components.splice(2, 0, new ActionRowBuilder().addComponents(menu));
   }
 
   return { embeds: [embed], components, ephemeral: true };
 }
 
+function viewOf(vid) {
+  return normView(getView(vid, {}));
+}
+
 /* =========================
    Panel set quota (existing)
    ========================= */
-async function buildQuotaPanel(finalU, protoFilter, offset) {
+async function buildQuotaPanel(finalU, vid) {
   const p = _parseFinal(finalU);
   if (!p) {
     const embed = new EmbedBuilder().setTitle("❌ Failed").setDescription("invalid username selection");
@@ -152,6 +204,7 @@ async function buildQuotaPanel(finalU, protoFilter, offset) {
   const q = await callBackend({ action: "quota_get", protocol: p.proto, username: p.base });
   const exp = q && q.status === "ok" ? (q.expired_at || "-") : "-";
   const quotaGb = q && q.status === "ok" ? (q.quota_gb || 0) : 0;
+  const view = viewOf(vid);
 
   const embed = new EmbedBuilder()
     .setTitle("📦 Quota")
@@ -162,53 +215,66 @@ async function buildQuotaPanel(finalU, protoFilter, offset) {
       `**Quota**: \`${quotaGb} GB\`\n\n` +
       "Pilih quota preset atau custom:"
     )
-    .setFooter({ text: `Filter=${protoFilter} | Offset=${offset}` });
+    .setFooter({ text: `Filter=${view.proto}${view.q ? ` | Cari="${view.q}"` : ""}` });
 
   const row1 = new ActionRowBuilder().addComponents(
-    new ButtonBuilder().setCustomId(`quota:set:0:${protoFilter}:${offset}:${p.proto}:${p.base}`).setLabel("Unlimited").setStyle(ButtonStyle.Primary).setEmoji("♾️"),
-    new ButtonBuilder().setCustomId(`quota:set:1:${protoFilter}:${offset}:${p.proto}:${p.base}`).setLabel("1 GB").setStyle(ButtonStyle.Secondary),
-    new ButtonBuilder().setCustomId(`quota:set:5:${protoFilter}:${offset}:${p.proto}:${p.base}`).setLabel("5 GB").setStyle(ButtonStyle.Secondary),
-    new ButtonBuilder().setCustomId(`quota:set:10:${protoFilter}:${offset}:${p.proto}:${p.base}`).setLabel("10 GB").setStyle(ButtonStyle.Secondary),
+    new ButtonBuilder().setCustomId(`quota:set:0:${vid}:${p.proto}:${p.base}`).setLabel("Unlimited").setStyle(ButtonStyle.Primary).setEmoji("♾️"),
+    new ButtonBuilder().setCustomId(`quota:set:1:${vid}:${p.proto}:${p.base}`).setLabel("1 GB").setStyle(ButtonStyle.Secondary),
+    new ButtonBuilder().setCustomId(`quota:set:5:${vid}:${p.proto}:${p.base}`).setLabel("5 GB").setStyle(ButtonStyle.Secondary),
+    new ButtonBuilder().setCustomId(`quota:set:10:${vid}:${p.proto}:${p.base}`).setLabel("10 GB").setStyle(ButtonStyle.Secondary),
   );
 
   const row2 = new ActionRowBuilder().addComponents(
-    new ButtonBuilder().setCustomId(`quota:custom:${protoFilter}:${offset}:${p.proto}:${p.base}`).setLabel("Custom").setStyle(ButtonStyle.Secondary).setEmoji("✍️"),
-    new ButtonBuilder().setCustomId(`quota:back:${protoFilter}:${offset}`).setLabel("Back").setStyle(ButtonStyle.Secondary).setEmoji("↩️")
+    new ButtonBuilder().setCustomId(`quota:custom:${vid}:${p.proto}:${p.base}`).setLabel("Custom").setStyle(ButtonStyle.Secondary).setEmoji("✍️"),
+    new ButtonBuilder().setCustomId(`quota:back:${vid}`).setLabel("Back").setStyle(ButtonStyle.Secondary).setEmoji("↩️")
   );
 
   return { embeds: [embed], components: [row1, row2], ephemeral: true };
 }
 
 /* =========================
-   Handlers (unchanged flow)
+   Handlers
    ========================= */
 async function handleSlash(interaction) {
-  const msg = await buildQuotaList("all", 0);
+  const msg = await buildQuotaList({ proto: "all" });
   return interaction.reply(msg);
 }
 
 async function handleSelect(interaction) {
   const cid = interaction.customId || "";
-  if (!cid.startsWith("quota:sel:")) return;
 
-  const parts = cid.split(":");
-  const protoFilter = parts[2] || "all";
-  const offset = Number(parts[3] || "0") || 0;
+  if (cid.startsWith("quota:flt:")) {
+    const view = viewOf(cid.split(":")[2]);
+    const value = interaction.values && interaction.values[0];
+    const msg = await buildQuotaList({ ...view, filter: value, cursor: "" });
+    return interaction.update(msg);
+  }
 
+  if (!cid.startsWith("quota:sel:")) return;
+
+  const vid = cid.split(":")[2] || "";
   const finalU = interaction.values && interaction.values[0];
-  const panel = await buildQuotaPanel(finalU, protoFilter, offset);
+  const panel = await buildQuotaPanel(finalU, vid);
   return interaction.update(panel);
 }
 
 async function handleModal(interaction) {
   const cid = interaction.customId || "";
+
+  if (cid.startsWith("quota:smodal:")) {
+    const view = viewOf(cid.split(":")[2]);
+    const q = String(interaction.fields.getTextInputValue("q") || "").trim();
+    const msg = await buildQuotaList({ ...view, q, cursor: "" });
+    if (interaction.isFromMessage()) return interaction.update(msg);
+    return interaction.reply(msg);
+  }
+
   if (!cid.startsWith("quota:modal:")) return;
 
   const parts = cid.split(":");
-  const protoFilter = parts[2] || "all";
-  const offset = Number(parts[3] || "0") || 0;
-  const proto = parts[4] || "";
-  const base = parts[5] || "";
+  const vid = parts[2] || "";
+  const proto = parts[3] || "";
+  const base = parts[4] || "";
 
   const gbStr = interaction.fields.getTextInputValue("quota_gb");
   const quotaGb = Number(gbStr);
@@ -229,13 +295,12 @@ async function handleModal(interaction) {
     .setDescription(`**User**: \`${resp.username}\`\n**Quota**: \`${resp.quota_gb} GB\``);
 
   const files = [];
-  try {
-    if (resp.detail_path) files.push(new AttachmentBuilder(resp.detail_path));
-  } catch (_) {}
+  const detail = detailFile(resp);
+  if (detail) files.push(detail);
 
   await interaction.reply({ embeds: [okEmbed], files, ephemeral: true });
 
-  const panel = await buildQuotaPanel(resp.username, protoFilter, offset);
+  const panel = await buildQuotaPanel(resp.username, vid);
   return interaction.message.edit(panel);
 }
 
@@ -243,8 +308,8 @@ async function handleButton(interaction) {
   const cid = interaction.customId || "";
 
   if (cid.startsWith("filt:quota:")) {
-    const protoFilter = cid.split(":")[2] || "all";
-    const msg = await buildQuotaList(protoFilter, 0);
+    const proto = cid.split(":")[2] || "all";
+    const msg = await buildQuotaList({ proto });
     return interaction.update(msg);
   }
 
@@ -254,35 +319,42 @@ async function handleButton(interaction) {
   const kind = parts[1] || "";
 
   if (kind === "prev" || kind === "next") {
-    const protoFilter = parts[2] || "all";
-    const offset = Number(parts[3] || "0") || 0;
-    const nextOffset = kind === "prev" ? Math.max(0, offset - PAGE_SIZE) : offset + PAGE_SIZE;
-    const msg = await buildQuotaList(protoFilter, nextOffset);
+    const view = viewOf(parts[2]);
+    const cursor = parts.slice(3).join(":");
+    const msg = await buildQuotaList(view, kind === "prev" ? { before: cursor } : { cursor });
     return interaction.update(msg);
   }
 
-  if (kind === "refresh") {
-    const protoFilter = parts[2] || "all";
-    const offset = Number(parts[3] || "0") || 0;
-    const msg = await buildQuotaList(protoFilter, offset);
+  if (kind === "refresh" || kind === "back") {
+    const msg = await buildQuotaList(viewOf(parts[2]));
     return interaction.update(msg);
   }
 
-  if (kind === "back") {
-    const protoFilter = parts[2] || "all";
-    const offset = Number(parts[3] || "0") || 0;
-    const msg = await buildQuotaList(protoFilter, offset);
-    return interaction.update(msg);
+  if (kind === "search") {
+    const view = viewOf(parts[2]);
+    const modal = new ModalBuilder()
+      .setCustomId(`quota:smodal:${parts[2] || ""}`)
+      .setTitle("Cari Akun");
+
+    const q = new TextInputBuilder()
+      .setCustomId("q")
+      .setLabel("Username (sebagian), kosong = tampilkan semua")
+      .setStyle(TextInputStyle.Short)
+      .setMaxLength(32)
+      .setRequired(false);
+    if (view.q) q.setValue(view.q);
+
+    modal.addComponents(new ActionRowBuilder().addComponents(q));
+    return interaction.showModal(modal);
   }
 
   if (kind === "custom") {
-    const protoFilter = parts[2] || "all";
-    const offset = Number(parts[3] || "0") || 0;
-    const proto = parts[4] || "";
-    const base = parts[5] || "";
+    const vid = parts[2] || "";
+    const proto = parts[3] || "";
+    const base = parts[4] || "";
 
     const modal = new ModalBuilder()
-      .setCustomId(`quota:modal:${protoFilter}:${offset}:${proto}:${base}`)
+      .setCustomId(`quota:modal:${vid}:${proto}:${base}`)
       .setTitle("Quota (Custom GB)");
 
     const quota = new TextInputBuilder()
@@ -297,10 +369,9 @@ async function handleButton(interaction) {
 
   if (kind === "set") {
     const quotaGb = Number(parts[2] || "0") || 0;
-    const protoFilter = parts[3] || "all";
-    const offset = Number(parts[4] || "0") || 0;
-    const proto = parts[5] || "";
-    const base = parts[6] || "";
+    const vid = parts[3] || "";
+    const proto = parts[4] || "";
+    const base = parts[5] || "";
 
     await interaction.deferReply({ ephemeral: true });
 
@@ -315,14 +386,13 @@ async function handleButton(interaction) {
       .setDescription(`**User**: \`${resp.username}\`\n**Quota**: \`${resp.quota_gb} GB\``);
 
     const files = [];
-    try {
-      if (resp.detail_path) files.push(new AttachmentBuilder(resp.detail_path));
-    } catch (_) {}
+    const detail = detailFile(resp);
+    if (detail) files.push(detail);
 
     await interaction.editReply({ embeds: [okEmbed], files });
 
     try {
-      const panel = await buildQuotaPanel(resp.username, protoFilter, offset);
+      const panel = await buildQuotaPanel(resp.username, vid);
       await interaction.message.edit(panel);
     } catch (_) {}
 
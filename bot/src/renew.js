@@ -7,12 +7,11 @@ const {
   ModalBuilder,
   TextInputBuilder,
   TextInputStyle,
-  AttachmentBuilder,
 } = require("discord.js");
 
 const { PAGE_SIZE, LIST_PROTOCOLS } = require("./config");
 const { callBackend } = require("./ipc");
-const { clampInt } = require("./util");
+const { clampInt, detailFile } = require("./util");
 const { formatAccountsTable } = require("./tables");
 const { buildProtocolFilterRow } = require("./accounts");
 
@@ -176,9 +175,8 @@ async function handleModal(interaction) {
 
   // attach detail txt (kalau ada)
   const files = [];
-  try {
-    if (resp.detail_path) files.push(new AttachmentBuilder(resp.detail_path));
-  } catch (_) {}
+  const detail = detailFile(resp);
+  if (detail) files.push(detail);
 
   await interaction.reply({ embeds: [okEmbed], files, ephemeral: true });
 
@@ -257,9 +255,8 @@ async function handleButton(interaction) {
       .setDescription(`**User**: \`${resp.username}\`\n**Expired**: \`${resp.expired_at}\``);
 
     const files = [];
-    try {
-      if (resp.detail_path) files.push(new AttachmentBuilder(resp.detail_path));
-    } catch (_) {}
+    const detail = detailFile(resp);
+    if (detail) files.push(detail);
 
     await interaction.editReply({ embeds: [okEmbed], files });
 
@@ -1,4 +1,5 @@
 const fs = require("fs");
+const path = require("path");
 
 const JAKARTA_TZ = "Asia/Jakarta";
 
@@ -59,6 +60,41 @@ function fmtDateTimeJakarta(dateOrIso) {
   }
 }
 
+function fmtDuration(sec) {
+  sec = Math.max(0, Math.trunc(Number(sec) || 0));
+  const d = Math.floor(sec / 86400);
+  const h = Math.floor((sec % 86400) / 3600);
+  const m = Math.floor((sec % 3600) / 60);
+  if (d) return `${d}h ${h}j`;
+  if (h) return `${h}j ${m}m`;
+  return `${m}m ${sec % 60}d`;
+}
+
+function fmtBytes(n) {
+  n = Number(n);
+  if (!Number.isFinite(n) || n < 0) return "-";
+  const units = ["B", "KB", "MB", "GB", "TB"];
+  let i = 0;
+  while (n >= 1024 && i < units.length - 1) {
+    n /= 1024;
+    i++;
+  }
+  return `${n.toFixed(i ? 1 : 0)} ${units[i]}`;
+}
+
+/**
+ * Ringkasan unit dari action status: "up 2h 3j | mem 41.2 MB | restart 0"
+ * (field yang tidak tersedia dilewati; string kosong jika tidak ada sama sekali).
+ */
+function fmtUnitStats(u) {
+  if (!u || typeof u !== "object") return "";
+  const parts = [];
+  if (u.uptime_s != null) parts.push(`up ${fmtDuration(u.uptime_s)}`);
+  if (u.memory_bytes != null) parts.push(`mem ${fmtBytes(u.memory_bytes)}`);
+  if (u.restarts != null) parts.push(`restart ${u.restarts}`);
+  return parts.join(" | ");
+}
+
 function isAdmin(member, adminRoleId) {
   try {
     return member && member.roles && member.roles.cache && member.roles.cache.has(String(adminRoleId));
@@ -73,11 +109,31 @@ function parseFinalEmail(finalEmail) {
   return { base: m[1], proto: m[2], final: `${m[1]}@${m[2]}` };
 }
 
+/**
+ * File detail akun untuk `files` discord.js ({ attachment, name }).
+ * Backend baru mengirim detail_text (render on-demand); detail_path hanya jika
+ * backend menulis file .txt (DETAIL_FILES) atau versi lama.
+ */
+function detailFile(resp) {
+  if (!resp) return null;
+  if (resp.detail_text) {
+    const name = String(resp.filename || `${resp.username || "detail"}.txt`);
+    return { attachment: Buffer.from(String(resp.detail_text), "utf8"), name };
+  }
+  const p = resp.detail_path || resp.detail_txt;
+  if (p && fs.existsSync(String(p))) return { attachment: String(p), name: path.basename(String(p)) };
+  return null;
+}
+
 module.exports = {
   badge,
   clampInt,
   safeMkdirp,
   fmtDateTimeJakarta,
+  fmtDuration,
+  fmtBytes,
+  fmtUnitStats,
+  detailFile,
   isAdmin,
   parseFinalEmail,
 };
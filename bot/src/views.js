@@ -0,0 +1,27 @@
+const crypto = require("crypto");
+
+// State list (protocol, search, filter, posisi cursor) disimpan di memory dengan id pendek,
+// karena customId Discord maksimal 100 karakter. Jika bot restart, id lama jatuh ke default.
+const MAX_VIEWS = 2000;
+const CUSTOM_ID_MAX = 100;
+
+const views = new Map();
+
+function saveView(view) {
+  const id = crypto.randomBytes(4).toString("hex");
+  views.set(id, { ...view });
+  if (views.size > MAX_VIEWS) views.delete(views.keys().next().value);
+  return id;
+}
+
+function getView(id, fallback) {
+  const v = views.get(String(id || ""));
+  return v ? { ...v } : { ...fallback };
+}
+
+// customId yang melebihi batas Discord -> null (tombol dibuat disabled oleh pemanggil)
+function fitCustomId(id) {
+  return id.length <= CUSTOM_ID_MAX ? id : null;
+}
+
+module.exports = { saveView, getView, fitCustomId };